@@ -7,5 +7,5 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_instructor', 'is_staff')
     list_filter = ('is_instructor', 'is_staff', 'is_superuser')
     fieldsets = UserAdmin.fieldsets + (
-        (None, {'fields': ('is_instructor', 'profile_picture', 'background_picture', 'bio')}),
+        (None, {'fields': ('is_instructor', 'profile_picture', 'background_picture', 'bio', 'preferred_language')}),
     )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='preferred_language',
+            field=models.CharField(blank=True, help_text='ISO language code chat messages are translated into', max_length=10),
+        ),
+    ]
@@ -6,6 +6,9 @@ class User(AbstractUser):
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     background_picture = models.ImageField(upload_to='background_pics/', blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
+    preferred_language = models.CharField(
+        max_length=10, blank=True, help_text="ISO language code chat messages are translated into"
+    )
 
     def __str__(self):
         return self.username
@@ -8,7 +8,7 @@ from django.db.models import Q
 class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     model = User
     template_name = 'accounts/profile_edit.html'
-    fields = ['first_name', 'last_name', 'profile_picture', 'background_picture', 'bio']
+    fields = ['first_name', 'last_name', 'profile_picture', 'background_picture', 'bio', 'preferred_language']
     success_url = reverse_lazy('dashboard:dashboard')
 
     def get_object(self):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Thread, Message, MessageReaction, ChatbotTopic, ChatbotQuestionAnswer
+from .models import Thread, Message, MessageReaction, ChatbotTopic, ChatbotQuestionAnswer, ThreadReadCursor, TranslationCache, BannedTerm
 
 class MessageInline(admin.TabularInline):
     model = Message
@@ -25,7 +25,9 @@ class MessageAdmin(admin.ModelAdmin):
 
     @admin.display(boolean=True, description="Read?")
     def has_been_read(self, obj):
-        return obj.read_by.exists()
+        return ThreadReadCursor.objects.filter(
+            thread_id=obj.thread_id, last_read_message_id__gte=obj.pk,
+        ).exclude(user_id=obj.sender_id).exists() or obj.read_by.exists()
 
 @admin.register(MessageReaction)
 class MessageReactionAdmin(admin.ModelAdmin):
@@ -33,6 +35,19 @@ class MessageReactionAdmin(admin.ModelAdmin):
     list_filter = ('emoji', 'created_at')
     search_fields = ('user__username', 'message__content')
 
+@admin.register(TranslationCache)
+class TranslationCacheAdmin(admin.ModelAdmin):
+    list_display = ('source_language', 'target_language', 'translated_text', 'created_at')
+    list_filter = ('source_language', 'target_language')
+    search_fields = ('translated_text', 'key')
+
+@admin.register(BannedTerm)
+class BannedTermAdmin(admin.ModelAdmin):
+    list_display = ('term', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    list_editable = ('is_active',)
+    search_fields = ('term',)
+
 @admin.register(ChatbotTopic)
 class ChatbotTopicAdmin(admin.ModelAdmin):
     list_display = ('name', 'is_active', 'created_at', 'updated_at')
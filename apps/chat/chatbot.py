@@ -0,0 +1,172 @@
+"""
+Matching user questions to ChatbotQuestionAnswer entries.
+
+Active entries are compiled into an in-memory inverted index over their
+question text and keywords, scored with BM25. Each posting stores its
+precomputed BM25 weight, so a query only adds up weights. Query terms are
+visited from the most to the least selective. Once the best scores so far
+cannot be overtaken by an entry that only matches the remaining terms,
+those terms only top up entries already found instead of walking their
+postings. Only the strongest POSTINGS_PER_TERM postings of a term are kept,
+which bounds the cost of very common words. Equal scores are broken by
+priority.
+
+The index is rebuilt whenever an entry or topic changes. As with the
+moderation automaton, the version is read from the database (row counts and
+latest updated_at of entries and topics) at most once every
+VERSION_CHECK_INTERVAL seconds per process.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter, namedtuple
+from time import monotonic
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import ChatbotQuestionAnswer, ChatbotTopic
+
+VERSION_CHECK_INTERVAL = 5
+TOKEN_PATTERN = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are can do does for how i in is it me my of on or the to what when where which who why with you'.split()
+)
+# Keywords are curated, so they count as this many occurrences in the question
+KEYWORD_WEIGHT = 2
+POSTINGS_PER_TERM = 2000
+# Below this a match is usually one incidental shared word
+MIN_MATCH_SCORE = 0.5
+K1 = 1.2
+B = 0.75
+
+ChatbotEntry = namedtuple('ChatbotEntry', ['id', 'question', 'keywords', 'priority', 'answer'])
+ChatbotMatch = namedtuple('ChatbotMatch', ['id', 'answer', 'score'])
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower()) if token not in STOP_WORDS]
+
+
+class ChatbotIndex:
+    """BM25 inverted index over question text and keywords."""
+
+    def __init__(self, entries):
+        self._ids = []
+        self._answers = []
+        self._priorities = []
+        term_counts = []
+        for entry in entries:
+            counts = Counter(tokenize(entry.question))
+            for keyword in (entry.keywords or '').split(','):
+                for token in tokenize(keyword):
+                    counts[token] += KEYWORD_WEIGHT
+            self._ids.append(entry.id)
+            self._answers.append(entry.answer)
+            self._priorities.append(entry.priority)
+            term_counts.append(counts)
+
+        document_count = len(term_counts)
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = (sum(lengths) / document_count) if document_count else 0
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+
+        self._postings = {}
+        for position, counts in enumerate(term_counts):
+            norm = K1 * (1 - B + B * lengths[position] / average_length) if average_length else K1
+            for term, frequency in counts.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (document_count - df + 0.5) / (df + 0.5))
+                self._postings.setdefault(term, []).append((idf * frequency * (K1 + 1) / (frequency + norm), position))
+        self._weights = {}
+        for term, postings in self._postings.items():
+            postings.sort(reverse=True)
+            del postings[POSTINGS_PER_TERM:]
+            self._weights[term] = {position: weight for weight, position in postings}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def search(self, query, limit=1, min_score=0.0):
+        """Return up to `limit` ChatbotMatch tuples, best first."""
+        terms = sorted(
+            (term for term in set(tokenize(query)) if term in self._postings),
+            key=lambda term: self._postings[term][0][0],
+            reverse=True,
+        )
+        # The most a not-yet-seen entry could still score from the terms left
+        reachable = sum(self._postings[term][0][0] for term in terms)
+        scores = {}
+        for term in terms:
+            bar = min_score
+            if len(scores) >= limit:
+                bar = max(bar, heapq.nlargest(limit, scores.values())[-1])
+            if reachable < bar:
+                weights = self._weights[term]
+                for position in scores:
+                    scores[position] += weights.get(position, 0.0)
+            else:
+                for weight, position in self._postings[term]:
+                    scores[position] = scores.get(position, 0.0) + weight
+            reachable -= self._postings[term][0][0]
+
+        ranked = heapq.nlargest(
+            limit,
+            (position for position, score in scores.items() if score > min_score),
+            key=lambda position: (round(scores[position], 9), self._priorities[position], -self._ids[position]),
+        )
+        return [ChatbotMatch(self._ids[position], self._answers[position], scores[position]) for position in ranked]
+
+
+_compiled = (None, ChatbotIndex(()))
+_compile_lock = threading.Lock()
+_checked_at = None
+
+
+def index_version():
+    """The entries' version: row counts and latest changes of entries and topics."""
+    entries = ChatbotQuestionAnswer.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    topics = ChatbotTopic.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    return entries['count'], entries['changed'], topics['count'], topics['changed']
+
+
+def recheck_chatbot_index():
+    """Make this process check the index version on its next search."""
+    global _checked_at
+    _checked_at = None
+
+
+def invalidate_chatbot_index():
+    """Re-check the index in this process once the current transaction commits."""
+    transaction.on_commit(recheck_chatbot_index)
+
+
+def load_entries():
+    rows = ChatbotQuestionAnswer.objects.filter(is_active=True, topic__is_active=True).values_list(
+        'id', 'question_text', 'keywords', 'priority', 'answer_text',
+    )
+    return [ChatbotEntry(*row) for row in rows.iterator()]
+
+
+def get_index():
+    """The index for the current entries, rebuilt if any entry changed."""
+    global _compiled, _checked_at
+    now = monotonic()
+    if _checked_at is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _compiled[1]
+    version = index_version()
+    _checked_at = now
+    compiled_version, index = _compiled
+    if version == compiled_version:
+        return index
+    with _compile_lock:
+        if _compiled[0] != version:
+            _compiled = (version, ChatbotIndex(load_entries()))
+        return _compiled[1]
+
+
+def find_answer(question, min_score=MIN_MATCH_SCORE):
+    """The best matching ChatbotMatch for a question, or None if nothing scores above min_score."""
+    matches = get_index().search(question, limit=1, min_score=min_score)
+    return matches[0] if matches else None
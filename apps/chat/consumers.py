@@ -0,0 +1,105 @@
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from . import presence
+from .models import Thread
+from .services import MAX_MESSAGE_LENGTH, create_message, mark_thread_read, serialize_message, thread_group_name
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One socket per open thread. Clients send {"type": "message", "content": "..."};
+    every participant connected to the thread receives
+    {"type": "message", "message": {...}}. Clients acknowledge messages they
+    have displayed with {"type": "read", "message_id": N}. Translations
+    arrive after the message as
+    {"type": "translation", "message_id": N, "translations": {lang: text}}.
+
+    Clients send {"type": "heartbeat"} every presence.HEARTBEAT_INTERVAL
+    seconds and get back {"type": "presence", "online": [user ids]} for the
+    thread's participants. {"type": "typing"} is relayed to the other
+    participants as {"type": "typing", "user_id": N, "username": "..."},
+    at most once per presence.TYPING_MIN_INTERVAL per user.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.thread_id = self.scope['url_route']['kwargs']['thread_id']
+        self.thread = await self.get_thread()
+        if self.thread is None:
+            await self.close(code=4403)
+            return
+        self.group_name = thread_group_name(self.thread_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await sync_to_async(presence.heartbeat)(self.user.pk)
+
+    async def disconnect(self, code):
+        if getattr(self, 'group_name', None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') == 'read':
+            try:
+                message_id = int(content.get('message_id'))
+            except (TypeError, ValueError):
+                await self.send_json({'type': 'error', 'error': 'message_id must be an integer.'})
+                return
+            await self.mark_read(message_id)
+            return
+        if content.get('type') == 'heartbeat':
+            await sync_to_async(presence.heartbeat)(self.user.pk)
+            online = await sync_to_async(presence.online_user_ids)(self.participant_ids)
+            await self.send_json({'type': 'presence', 'online': sorted(online)})
+            return
+        if content.get('type') == 'typing':
+            if await sync_to_async(presence.allow_typing_notice)(self.thread_id, self.user.pk):
+                await self.channel_layer.group_send(
+                    self.group_name, {'type': 'chat.typing', 'user_id': self.user.pk, 'username': self.user.username},
+                )
+            return
+        if content.get('type') != 'message':
+            await self.send_json({'type': 'error', 'error': 'Unsupported event type.'})
+            return
+        text = str(content.get('content') or '').strip()
+        if not text:
+            await self.send_json({'type': 'error', 'error': 'Message is empty.'})
+            return
+        if len(text) > MAX_MESSAGE_LENGTH:
+            await self.send_json({'type': 'error', 'error': f'Messages are limited to {MAX_MESSAGE_LENGTH} characters.'})
+            return
+
+        message = await self.save_message(text)
+        await self.channel_layer.group_send(self.group_name, {'type': 'chat.message', 'message': message})
+
+    async def chat_message(self, event):
+        await self.send_json({'type': 'message', 'message': event['message']})
+
+    async def chat_typing(self, event):
+        if event['user_id'] != self.user.pk:
+            await self.send_json({'type': 'typing', 'user_id': event['user_id'], 'username': event['username']})
+
+    async def chat_translation(self, event):
+        await self.send_json({
+            'type': 'translation', 'message_id': event['message_id'], 'translations': event['translations'],
+        })
+
+    @database_sync_to_async
+    def get_thread(self):
+        if self.user is None or not self.user.is_authenticated:
+            return None
+        thread = Thread.objects.filter(pk=self.thread_id, participants=self.user).first()
+        if thread is not None:
+            self.participant_ids = list(thread.participants.values_list('pk', flat=True))
+        return thread
+
+    @database_sync_to_async
+    def mark_read(self, message_id):
+        # Only ids that exist in this thread can move the cursor
+        if self.thread.messages.filter(pk=message_id).exists():
+            mark_thread_read(self.user, self.thread, up_to_message_id=message_id)
+
+    @database_sync_to_async
+    def save_message(self, text):
+        return serialize_message(create_message(self.thread, self.user, content=text))
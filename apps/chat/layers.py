@@ -0,0 +1,220 @@
+"""
+A channel layer backed by a shared SQLite file.
+
+It stands in for the Redis layer on a single machine: every Daphne or worker
+process pointing at the same file shares channels and groups, so cross-process
+fan-out can be exercised without a Redis server. Receivers poll, so latency
+is a few milliseconds at best; use Redis in production.
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'apps.chat.layers.SQLiteChannelLayer',
+            'CONFIG': {'path': '/tmp/channel_layer.sqlite3'},
+        }
+    }
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path='channel_layer.sqlite3', expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.005, max_poll_interval=0.1, receive_batch_size=100, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.receive_batch_size = receive_batch_size
+        self._received = {}
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._last_cleanup = 0.0
+
+    # Storage
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.connection = connection
+        return connection
+
+    def _run(self, func, *args):
+        return asyncio.to_thread(func, *args)
+
+    def _cleanup(self, connection, now):
+        # Expired rows are skipped by every query; this only reclaims space
+        if now - self._last_cleanup < 1:
+            return
+        self._last_cleanup = now
+        connection.execute('DELETE FROM messages WHERE expires < ?', (now,))
+        connection.execute('DELETE FROM group_members WHERE expires < ?', (now,))
+
+    def _insert(self, connection, channels, payload, now, raise_when_full):
+        """Append payload to each channel with room for it. Must run inside a transaction."""
+        for channel in channels:
+            queued = connection.execute(
+                'SELECT COUNT(*) FROM messages WHERE channel = ? AND expires >= ?', (channel, now)
+            ).fetchone()[0]
+            if queued >= self.get_capacity(channel):
+                if raise_when_full:
+                    raise ChannelFull(channel)
+                continue
+            connection.execute(
+                'INSERT INTO messages (channel, payload, expires) VALUES (?, ?, ?)',
+                (channel, payload, now + self.expiry),
+            )
+
+    def _send_sync(self, channel, payload):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._cleanup(connection, now)
+            self._insert(connection, [channel], payload, now, raise_when_full=True)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _claim_sync(self, channel):
+        """Take up to receive_batch_size pending messages off a channel, oldest first."""
+        connection = self._connection()
+        now = time.time()
+        # Idle polls only read, so they never queue behind (or block) senders for the write lock
+        pending = connection.execute(
+            'SELECT 1 FROM messages WHERE channel = ? AND expires >= ? LIMIT 1', (channel, now),
+        ).fetchone()
+        if pending is None:
+            return []
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                'SELECT id, payload FROM messages WHERE channel = ? AND expires >= ? ORDER BY id LIMIT ?',
+                (channel, now, self.receive_batch_size),
+            ).fetchall()
+            if rows:
+                connection.execute(
+                    'DELETE FROM messages WHERE channel = ? AND id <= ?', (channel, rows[-1][0]),
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return [payload for _, payload in rows]
+
+    def _group_send_sync(self, group, payload):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._cleanup(connection, now)
+            channels = [
+                row[0] for row in connection.execute(
+                    'SELECT channel FROM group_members WHERE group_name = ? AND expires >= ?', (group, now)
+                )
+            ]
+            # Like the Redis layer, full channels silently miss group messages
+            self._insert(connection, channels, payload, now, raise_when_full=False)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _execute(self, sql, params=()):
+        self._connection().execute(sql, params)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        await self._run(self._send_sync, channel, msgpack.packb(message, use_bin_type=True))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        # Messages claimed in a batch are handed out from a local buffer, which
+        # only exists while it holds messages so finished channels leave nothing behind
+        received = self._received.get(channel)
+        delay = self.poll_interval
+        while not received:
+            claimed = await self._run(self._claim_sync, channel)
+            if claimed:
+                received = self._received.setdefault(channel, deque())
+                received.extend(claimed)
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_poll_interval)
+        payload = received.popleft()
+        if not received:
+            self._received.pop(channel, None)
+        return msgpack.unpackb(payload, raw=False)
+
+    async def new_channel(self, prefix='specific.'):
+        return f'{prefix}{uuid.uuid4().hex}'
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(
+            self._execute,
+            'INSERT OR REPLACE INTO group_members (group_name, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(
+            self._execute, 'DELETE FROM group_members WHERE group_name = ? AND channel = ?', (group, channel),
+        )
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._run(self._group_send_sync, group, msgpack.packb(message, use_bin_type=True))
+
+    async def flush(self):
+        def flush_sync():
+            connection = self._connection()
+            connection.execute('DELETE FROM messages')
+            connection.execute('DELETE FROM group_members')
+
+        self._received.clear()
+        await self._run(flush_sync)
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+GROUP_NAME = 'benchmark_broadcast'
+IDLE_TIMEOUT = 2.0
+
+
+async def _subscribe(layer, count, ready, results):
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP_NAME, channel)
+    ready()
+    latencies = []
+    last_received = None
+    try:
+        while len(latencies) < count:
+            message = await asyncio.wait_for(layer.receive(channel), timeout=IDLE_TIMEOUT)
+            last_received = time.time()
+            latencies.append(last_received - message['sent_at'])
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await layer.group_discard(GROUP_NAME, channel)
+    results({'received': len(latencies), 'latencies': latencies, 'finished_at': last_received})
+
+
+def _subscriber_process(count, ready_event, result_queue):
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from channels.layers import get_channel_layer
+
+    asyncio.run(_subscribe(get_channel_layer(), count, ready_event.set, result_queue.put))
+
+
+class Command(BaseCommand):
+    help = 'Measure group broadcast throughput and latency of the configured channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=4)
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--payload-size', type=int, default=200, help='Message body size in bytes')
+        parser.add_argument(
+            '--in-process',
+            action='store_true',
+            help='Run subscribers as tasks in this process (implied for the in-memory layer)',
+        )
+
+    def handle(self, *args, **options):
+        from channels.layers import InMemoryChannelLayer, get_channel_layer
+
+        if options['subscribers'] < 1 or options['messages'] < 1:
+            raise CommandError('--subscribers and --messages must be positive')
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError('No channel layer is configured')
+        in_process = options['in_process'] or isinstance(layer, InMemoryChannelLayer)
+        self.stdout.write(
+            f"{type(layer).__name__}: {options['subscribers']} subscribers "
+            f"({'in-process' if in_process else 'separate processes'}), {options['messages']} messages"
+        )
+
+        if in_process:
+            results, elapsed = asyncio.run(self._run_in_process(layer, options))
+        else:
+            results, elapsed = self._run_multiprocess(layer, options)
+        self._report(results, elapsed, options)
+
+    async def _publish(self, layer, options):
+        body = 'x' * options['payload_size']
+        started = time.time()
+        for i in range(options['messages']):
+            await layer.group_send(GROUP_NAME, {'type': 'benchmark.message', 'seq': i, 'body': body, 'sent_at': time.time()})
+        return started
+
+    async def _run_in_process(self, layer, options):
+        results = []
+        ready = []
+        subscribers = [
+            asyncio.create_task(_subscribe(layer, options['messages'], lambda: ready.append(True), results.append))
+            for _ in range(options['subscribers'])
+        ]
+        while len(ready) < options['subscribers']:
+            await asyncio.sleep(0.01)
+        started = await self._publish(layer, options)
+        await asyncio.gather(*subscribers)
+        return results, self._elapsed(results, started)
+
+    def _run_multiprocess(self, layer, options):
+        context = multiprocessing.get_context()
+        result_queue = context.Queue()
+        ready_events = [context.Event() for _ in range(options['subscribers'])]
+        processes = [
+            context.Process(target=_subscriber_process, args=(options['messages'], event, result_queue), daemon=True)
+            for event in ready_events
+        ]
+        for process in processes:
+            process.start()
+        for event in ready_events:
+            if not event.wait(timeout=30):
+                raise CommandError('Subscriber processes did not start')
+
+        started = asyncio.run(self._publish(layer, options))
+        results = [result_queue.get(timeout=60 + IDLE_TIMEOUT) for _ in processes]
+        for process in processes:
+            process.join(timeout=5)
+        return results, self._elapsed(results, started)
+
+    def _elapsed(self, results, started):
+        finished = [result['finished_at'] for result in results if result['finished_at']]
+        return max(finished) - started if finished else 0.0
+
+    def _report(self, results, elapsed, options):
+        expected = options['subscribers'] * options['messages']
+        delivered = sum(result['received'] for result in results)
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+
+        self.stdout.write(f"Delivered {delivered}/{expected} messages in {elapsed:.3f}s")
+        if elapsed > 0:
+            self.stdout.write(f"Throughput: {delivered / elapsed:,.0f} deliveries/s")
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"Latency: median {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+            )
+        if delivered < expected:
+            self.stdout.write(self.style.WARNING(
+                f"{expected - delivered} deliveries were dropped (channel capacity reached or expired)"
+            ))
@@ -0,0 +1,55 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.chatbot import ChatbotEntry, ChatbotIndex
+
+VOCABULARY_SIZE = 20000
+COMMON_WORDS = ['course', 'lesson', 'quiz', 'grade', 'english', 'deadline', 'certificate', 'forum', 'teacher', 'account']
+
+
+class Command(BaseCommand):
+    help = 'Build the chatbot matcher over synthetic Q&A entries and measure index build and query times'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=50000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['entries'] < 1 or options['queries'] < 1:
+            raise CommandError('--entries and --queries must be positive')
+        rng = random.Random(options['seed'])
+        vocabulary = [f'term{i}' for i in range(VOCABULARY_SIZE)]
+
+        def phrase(length):
+            # Mostly rare words with a few very common ones, like real questions
+            return ' '.join(rng.choice(COMMON_WORDS) if rng.random() < 0.2 else rng.choice(vocabulary) for _ in range(length))
+
+        entries = [
+            ChatbotEntry(i, f'How do I {phrase(rng.randint(4, 12))}?', ', '.join(phrase(1) for _ in range(3)),
+                         rng.randint(0, 5), f'Answer {i}')
+            for i in range(options['entries'])
+        ]
+        started = time.perf_counter()
+        index = ChatbotIndex(entries)
+        build_time = time.perf_counter() - started
+        self.stdout.write(f"Indexed {len(index)} entries in {build_time:.2f}s")
+
+        queries = [
+            entry.question if rng.random() < 0.5 else phrase(rng.randint(2, 8))
+            for entry in rng.sample(entries, min(options['queries'], len(entries)))
+        ]
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{len(timings)} queries: median {statistics.median(timings) * 1000:.3f} ms, "
+            f"p95 {p95 * 1000:.3f} ms, max {timings[-1] * 1000:.3f} ms"
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cursors_from_receipts(apps, schema_editor):
+    """Start each cursor at the newest message the user has a receipt for."""
+    MessageReadReceipt = apps.get_model('chat', 'MessageReadReceipt')
+    ThreadReadCursor = apps.get_model('chat', 'ThreadReadCursor')
+    rows = (
+        MessageReadReceipt.objects.values('user_id', 'message__thread_id')
+        .annotate(last_read_message_id=models.Max('message_id'), last_read_at=models.Max('read_at'))
+        .order_by()
+    )
+    ThreadReadCursor.objects.bulk_create(
+        [
+            ThreadReadCursor(
+                user_id=row['user_id'],
+                thread_id=row['message__thread_id'],
+                last_read_message_id=row['last_read_message_id'],
+                last_read_at=row['last_read_at'],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chatbottopic_chatbotquestionanswer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.thread')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thread_read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'thread')},
+            },
+        ),
+        migrations.RunPython(cursors_from_receipts, reverse_code=migrations.RunPython.noop),
+    ]
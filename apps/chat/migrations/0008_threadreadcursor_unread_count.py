@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:29
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    """Give every participant a cursor and count the messages past it."""
+    Thread = apps.get_model('chat', 'Thread')
+    Message = apps.get_model('chat', 'Message')
+    ThreadReadCursor = apps.get_model('chat', 'ThreadReadCursor')
+    Participant = Thread.participants.through
+
+    existing = ThreadReadCursor.objects.filter(user_id=models.OuterRef('user_id'), thread_id=models.OuterRef('thread_id'))
+    ThreadReadCursor.objects.bulk_create(
+        [
+            ThreadReadCursor(user_id=user_id, thread_id=thread_id)
+            for user_id, thread_id in Participant.objects.exclude(models.Exists(existing))
+            .values_list('user_id', 'thread_id').iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    unread = (
+        Message.objects.filter(thread_id=models.OuterRef('thread_id'), id__gt=models.OuterRef('last_read_message_id'))
+        .exclude(sender_id=models.OuterRef('user_id'))
+        .order_by().values('thread_id').annotate(total=models.Count('id')).values('total')[:1]
+    )
+    ThreadReadCursor.objects.update(unread_count=Coalesce(models.Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_threadreadcursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='threadreadcursor',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+def key_existing_direct_threads(apps, schema_editor):
+    """Key every two-person thread; when a pair has several, the most recently active one wins."""
+    Thread = apps.get_model('chat', 'Thread')
+    Participant = Thread.participants.through
+    pairs = (
+        Participant.objects.values('thread_id')
+        .annotate(members=models.Count('user_id'), low=models.Min('user_id'), high=models.Max('user_id'))
+        .filter(members=2)
+        .order_by('-thread__updated_at')
+    )
+    keyed = {}
+    for row in pairs.iterator():
+        keyed.setdefault(f"{row['low']}:{row['high']}", row['thread_id'])
+    threads = [Thread(pk=thread_id, direct_key=key) for key, thread_id in keyed.items()]
+    Thread.objects.bulk_update(threads, ['direct_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_threadreadcursor_unread_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='direct_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(key_existing_direct_threads, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_last_messages(apps, schema_editor):
+    Thread = apps.get_model('chat', 'Thread')
+    Message = apps.get_model('chat', 'Message')
+    latest = Message.objects.filter(thread_id=models.OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    Thread.objects.update(last_message=models.Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_thread_direct_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(set_last_messages, reverse_code=migrations.RunPython.noop),
+    ]
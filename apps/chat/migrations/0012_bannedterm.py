@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+def seed_banned_terms(apps, schema_editor):
+    """Carry over the keywords that used to be hardcoded in apps.chat.moderation."""
+    BannedTerm = apps.get_model('chat', 'BannedTerm')
+    BannedTerm.objects.bulk_create(
+        [BannedTerm(term=term) for term in ('spam', 'inappropriate', 'abuse', 'badword')],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_translationcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannedTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(help_text='Matched case-insensitively as a whole word or phrase', max_length=100, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['term'],
+            },
+        ),
+        migrations.RunPython(seed_banned_terms, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_bannedterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='translation_pending',
+            field=models.BooleanField(db_index=True, default=False, help_text='Waiting for background translation'),
+        ),
+    ]
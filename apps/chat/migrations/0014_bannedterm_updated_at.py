@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_message_translation_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bannedterm',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
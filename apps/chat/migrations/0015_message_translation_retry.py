@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_bannedterm_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='translation_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='translation_retry_at',
+            field=models.DateTimeField(blank=True, help_text='Not claimed for translation again before this', null=True),
+        ),
+    ]
@@ -4,6 +4,12 @@ from django.utils import timezone
 
 class Thread(models.Model):
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chat_threads')
+    # "<lower user id>:<higher user id>" for one-to-one threads, null for group threads
+    direct_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Denormalized newest message for thread list previews, kept current on send
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -32,6 +38,9 @@ class Message(models.Model):
     # Translation support
     original_language = models.CharField(max_length=10, blank=True, null=True, help_text="ISO language code")
     translated_content = models.JSONField(default=dict, blank=True, help_text="Translations: {lang_code: translated_text}")
+    translation_pending = models.BooleanField(default=False, db_index=True, help_text="Waiting for background translation")
+    translation_attempts = models.PositiveSmallIntegerField(default=0)
+    translation_retry_at = models.DateTimeField(null=True, blank=True, help_text="Not claimed for translation again before this")
     
     # Mentions
     mentions = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='mentioned_in_messages', blank=True)
@@ -69,6 +78,56 @@ class MessageReadReceipt(models.Model):
         return f"User {self.user.id} read message {self.message.id} at {self.read_at}"
 
 
+class ThreadReadCursor(models.Model):
+    """
+    How far a user has read in a thread: every message with an id up to
+    last_read_message_id counts as read. One row per (user, thread) instead
+    of one receipt per message. unread_count is a denormalized counter of
+    messages from others past the cursor, kept up to date on send and read.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='thread_read_cursors')
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='read_cursors')
+    # A plain id rather than a foreign key, so deleting a message never resets the cursor
+    last_read_message_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(default=timezone.now)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'thread')
+
+    def __str__(self):
+        return f"User {self.user_id} read thread {self.thread_id} up to message {self.last_read_message_id}"
+
+
+class TranslationCache(models.Model):
+    """
+    A translated string, keyed by a hash of its source text and language
+    pair, so identical texts are only ever sent to the translation backend once.
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of source language, target language and text")
+    source_language = models.CharField(max_length=10)
+    target_language = models.CharField(max_length=10)
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source_language}->{self.target_language} {self.key[:12]}"
+
+
+class BannedTerm(models.Model):
+    """A word or phrase that flags chat messages and forum posts containing it."""
+    term = models.CharField(max_length=100, unique=True, help_text="Matched case-insensitively as a whole word or phrase")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['term']
+
+    def __str__(self):
+        return self.term
+
+
 class MessageReaction(models.Model):
     """Emoji reactions to messages"""
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='reactions')
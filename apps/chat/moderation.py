@@ -1,16 +1,138 @@
-import re
+"""
+Banned-term moderation for chat messages and forum posts.
 
-BANNED_KEYWORDS = [
-    'spam',
-    'inappropriate',
-    'abuse',
-    'badword',
-    # Add more keywords as needed
-]
+The active BannedTerm rows are compiled once into an Aho-Corasick automaton,
+which finds every occurrence of every term in a single pass over the text,
+however many terms there are. Each process keeps its compiled automaton
+together with the term-list version it was built from. The version is read
+from the database (the number of terms and the latest updated_at), so it
+does not depend on a shared cache. A process checks it at most once every
+VERSION_CHECK_INTERVAL seconds, and rebuilds and swaps in a new automaton
+whole when it has changed. The process that saved an edit checks again
+straight after the commit.
+"""
+import threading
+from collections import deque, namedtuple
+from time import monotonic
 
-def contains_inappropriate_content(text):
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import BannedTerm
+
+VERSION_CHECK_INTERVAL = 5
+
+BannedTermMatch = namedtuple('BannedTermMatch', ['start', 'end', 'term'])
+
+
+def _fold(text):
+    # lower() can lengthen some characters (e.g. 'İ'); keep those as-is so spans line up with the text
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+class Automaton:
+    """Aho-Corasick automaton over lowercased terms."""
+
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for term in {_fold(term.strip()) for term in terms if term and term.strip()}:
+            self._add(term)
+        self._link()
+
+    def _add(self, term):
+        state = 0
+        for char in term:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state] += (term,)
+
+    def _link(self):
+        # Breadth-first, so a state's failure target is complete before its children need it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] += self._output[self._fail[child]]
+                queue.append(child)
+
+    def scan(self, text):
+        """Yield a BannedTermMatch for every occurrence of every term in text."""
+        state = 0
+        for position, char in enumerate(_fold(text)):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for term in self._output[state]:
+                yield BannedTermMatch(position - len(term) + 1, position + 1, term)
+
+
+_compiled = (None, Automaton(()))
+_compile_lock = threading.Lock()
+_checked_at = None
+
+
+def terms_version():
+    """The term list's version: its row count and latest change."""
+    stats = BannedTerm.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+    return stats['count'], stats['changed']
+
+
+def recheck_banned_terms():
+    """Make this process check the term-list version on its next scan."""
+    global _checked_at
+    _checked_at = None
+
+
+def invalidate_banned_terms():
+    """Re-check the term list in this process once the current transaction commits."""
+    transaction.on_commit(recheck_banned_terms)
+
+
+def get_automaton():
+    """The automaton for the current term list, rebuilt if the list changed."""
+    global _compiled, _checked_at
+    now = monotonic()
+    if _checked_at is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _compiled[1]
+    version = terms_version()
+    _checked_at = now
+    compiled_version, automaton = _compiled
+    if version == compiled_version:
+        return automaton
+    with _compile_lock:
+        if _compiled[0] != version:
+            terms = BannedTerm.objects.filter(is_active=True).values_list('term', flat=True)
+            _compiled = (version, Automaton(terms))
+        return _compiled[1]
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def find_banned_terms(text):
+    """Return the whole-word, case-insensitive banned-term matches in text, by position."""
     if not text:
-        return False
-    # Create a regex pattern to match whole words, case-insensitive
-    pattern = re.compile(r'\b(' + '|'.join(map(re.escape, BANNED_KEYWORDS)) + r')\b', re.IGNORECASE)
-    return bool(pattern.search(text))
\ No newline at end of file
+        return []
+    return sorted(
+        match for match in get_automaton().scan(text)
+        if (match.start == 0 or not _is_word_char(text[match.start - 1]))
+        and (match.end == len(text) or not _is_word_char(text[match.end]))
+    )
+
+
+def contains_inappropriate_content(text):
+    return bool(find_banned_terms(text))
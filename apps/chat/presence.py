@@ -0,0 +1,104 @@
+"""
+Online presence and typing indicators, kept out of the database.
+
+Each heartbeat from a connected chat socket refreshes a per-user key that
+expires after PRESENCE_TTL seconds; a user is online while their key exists,
+so going offline needs no write. Typing notices are rate limited with a
+short-lived per-(thread, user) key and are never stored.
+
+Keys live in the cache named by CHAT_PRESENCE_CACHE (shared across
+processes when it is Redis), or in a process-local TTL store when that cache
+is missing or a dummy cache.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.dummy import DummyCache
+
+PRESENCE_TTL = 60
+# Clients should heartbeat comfortably inside the TTL
+HEARTBEAT_INTERVAL = 25
+TYPING_MIN_INTERVAL = 2
+
+
+class InMemoryTTLStore:
+    """Process-local stand-in for the cache operations presence needs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+
+    def add(self, key, value, timeout):
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, now + timeout)
+            return True
+
+    def get_many(self, keys):
+        with self._lock:
+            now = time.monotonic()
+            found = {}
+            for key in keys:
+                entry = self._live(key, now)
+                if entry is not None:
+                    found[key] = entry[0]
+            return found
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    cache = caches[getattr(settings, 'CHAT_PRESENCE_CACHE', 'default')]
+                except InvalidCacheBackendError:
+                    cache = None
+                _store = InMemoryTTLStore() if cache is None or isinstance(cache, DummyCache) else cache
+    return _store
+
+
+def _presence_key(user_id):
+    return f'chat:presence:{user_id}'
+
+
+def heartbeat(user_id):
+    """Mark the user online for the next PRESENCE_TTL seconds."""
+    get_store().set(_presence_key(user_id), int(time.time()), PRESENCE_TTL)
+
+
+def online_user_ids(user_ids):
+    """The subset of user_ids that are online, with one multi-get."""
+    user_ids = list(user_ids)
+    found = get_store().get_many([_presence_key(user_id) for user_id in user_ids])
+    return {user_id for user_id in user_ids if _presence_key(user_id) in found}
+
+
+def allow_typing_notice(thread_id, user_id):
+    """Whether a typing notice may be broadcast now (at most one per TYPING_MIN_INTERVAL)."""
+    return get_store().add(f'chat:typing:{thread_id}:{user_id}', 1, TYPING_MIN_INTERVAL)
@@ -0,0 +1,308 @@
+"""
+Chat message creation, broadcasting and read tracking, shared by the HTTP
+views and the websocket consumer.
+"""
+import base64
+from collections import Counter
+from datetime import datetime
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Message, MessageReaction, MessageReadReceipt, Thread, ThreadReadCursor
+
+MAX_MESSAGE_LENGTH = 5000
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+
+def thread_group_name(thread_id):
+    return f'chat_thread_{thread_id}'
+
+
+def direct_thread_key(user_id, other_user_id):
+    low, high = sorted((user_id, other_user_id))
+    return f'{low}:{high}'
+
+
+def get_or_create_direct_thread(user, other_user):
+    """
+    Return (thread, created) for the one-to-one thread between two users.
+    The lookup is one query on the unique direct_key, and the unique
+    constraint makes concurrent creates settle on a single thread.
+    """
+    key = direct_thread_key(user.pk, other_user.pk)
+    thread = Thread.objects.filter(direct_key=key).first()
+    if thread is not None:
+        return thread, False
+    try:
+        with transaction.atomic():
+            thread = Thread.objects.create(direct_key=key)
+            thread.participants.add(user, other_user)
+    except IntegrityError:
+        return Thread.objects.get(direct_key=key), False
+    return thread, True
+
+
+def serialize_message(message):
+    return {
+        'id': message.pk,
+        'thread_id': message.thread_id,
+        'sender_id': message.sender_id,
+        'sender': message.sender.username,
+        'content': message.content or '',
+        'message_type': message.message_type,
+        'audio_url': message.audio_file.url if message.audio_file else None,
+        'timestamp': message.timestamp.isoformat(),
+        'translations': message.translated_content or {},
+    }
+
+
+def serialize_reactions(message):
+    """Reaction counts per emoji, from the prefetched reactions."""
+    counts = Counter(reaction.emoji for reaction in message.reactions.all())
+    return [{'emoji': emoji, 'count': count} for emoji, count in counts.most_common()]
+
+
+def encode_cursor(message):
+    """Opaque pagination cursor for a message's (timestamp, id) position."""
+    return base64.urlsafe_b64encode(f'{message.timestamp.isoformat()}|{message.pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, id) in a cursor. Raises ValueError for malformed cursors."""
+    # Bad base64, bad UTF-8, a missing separator and a bad timestamp all raise ValueError
+    timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(pk)
+
+
+def message_page(thread, before=None, after=None, limit=MESSAGE_PAGE_SIZE):
+    """
+    One page of a thread's messages, oldest first, by keyset pagination on
+    (timestamp, id): the newest page by default, or the messages just older
+    than the `before` cursor or just newer than the `after` cursor. Each page
+    is an index range scan on (thread, -timestamp) however deep it is.
+    Returns (messages, has_more), where has_more says whether there are
+    further messages in the direction being paged.
+    """
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    messages = thread.messages.select_related('sender').prefetch_related(
+        Prefetch('reactions', queryset=MessageReaction.objects.order_by())
+    )
+    if after is not None:
+        timestamp, pk = decode_cursor(after)
+        messages = messages.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+        page = list(messages.order_by('timestamp', 'id')[:limit + 1])
+        return page[:limit], len(page) > limit
+
+    if before is not None:
+        timestamp, pk = decode_cursor(before)
+        messages = messages.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    page = list(messages.order_by('-timestamp', '-id')[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+
+def create_message(thread, sender, content='', audio_file=None):
+    """
+    Insert a message. The thread's updated_at and last_message are bumped by
+    an UPDATE in the post_save receiver rather than by re-saving the thread.
+    """
+    message = Message.objects.create(
+        thread=thread,
+        sender=sender,
+        content=content,
+        audio_file=audio_file,
+        message_type='audio' if audio_file else 'text',
+    )
+    return message
+
+
+def broadcast_message(message):
+    """Send a message to everyone connected to its thread (for messages not sent over the socket)."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        thread_group_name(message.thread_id),
+        {'type': 'chat.message', 'message': serialize_message(message)},
+    )
+
+
+def broadcast_translations(message, translations):
+    """Send newly stored translations of a message to everyone connected to its thread."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        thread_group_name(message.thread_id),
+        {'type': 'chat.translation', 'message_id': message.pk, 'translations': translations},
+    )
+
+
+def mark_thread_read(user, thread, up_to_message_id=None):
+    """
+    Move the user's read cursor in a thread to up_to_message_id (default: the
+    newest message) and recount its unread counter, in one conditional
+    UPDATE: it only matches a cursor that is still behind, so concurrent
+    reads can never move it backwards. A cursor is inserted only when the
+    participant has none yet. Returns the cursor position.
+    """
+    messages = Message.objects.filter(thread_id=thread.pk)
+    if up_to_message_id is None:
+        target = Coalesce(Subquery(messages.order_by('-id').values('id')[:1]), 0)
+    else:
+        target = Value(up_to_message_id)
+    remaining = Coalesce(
+        Subquery(
+            messages.filter(id__gt=target).exclude(sender_id=user.pk)
+            .order_by().values('thread_id').annotate(total=Count('id')).values('total')[:1]
+        ),
+        0,
+    )
+    cursors = ThreadReadCursor.objects.filter(user=user, thread=thread)
+    receipts = getattr(settings, 'CHAT_PER_MESSAGE_READ_RECEIPTS', False)
+    if receipts:
+        previous = cursors.values_list('last_read_message_id', flat=True).first() or 0
+
+    advanced = cursors.filter(last_read_message_id__lt=target).update(
+        last_read_message_id=target, last_read_at=timezone.now(), unread_count=remaining,
+    )
+    if advanced and up_to_message_id is not None and not receipts:
+        return up_to_message_id
+    position = cursors.values_list('last_read_message_id', flat=True).first()
+    if position is None:
+        # The participant has no cursor yet (rare: one is created on joining)
+        position = up_to_message_id
+        if position is None:
+            position = messages.aggregate(last_id=Max('id'))['last_id'] or 0
+        fields = {
+            'last_read_message_id': position, 'last_read_at': timezone.now(),
+            'unread_count': messages.filter(id__gt=position).exclude(sender_id=user.pk).count(),
+        }
+        try:
+            with transaction.atomic():
+                ThreadReadCursor.objects.create(user=user, thread=thread, **fields)
+            advanced = 1
+        except IntegrityError:
+            # Another read created the cursor first
+            return mark_thread_read(user, thread, up_to_message_id)
+
+    if advanced and receipts:
+        record_read_receipts(user, messages.filter(id__gt=previous, id__lte=position))
+    return position
+
+
+def record_read_receipts(user, messages):
+    """
+    Compatibility path: write per-message receipts (one INSERT) for callers
+    that need to know exactly which messages were seen and when.
+    """
+    MessageReadReceipt.objects.bulk_create(
+        [
+            MessageReadReceipt(user=user, message_id=message_id)
+            for message_id in messages.exclude(sender=user).values_list('id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def unread_count(user, thread):
+    """Messages from others in the thread past the user's read cursor."""
+    return ThreadReadCursor.objects.filter(user=user, thread=thread).values_list('unread_count', flat=True).first() or 0
+
+
+def threads_with_unread_counts(user):
+    """The user's threads annotated with unread_count, from their read cursors."""
+    return user.chat_threads.annotate(
+        unread_count=Coalesce(
+            Subquery(ThreadReadCursor.objects.filter(user=user, thread=OuterRef('pk')).values('unread_count')[:1]),
+            0,
+        ),
+    )
+
+
+def thread_summaries(user):
+    """
+    The user's threads for the thread list, newest activity first, with
+    unread_count, last_message (and its sender) and other_participants
+    loaded. Two queries however many threads there are.
+    """
+    return threads_with_unread_counts(user).select_related('last_message__sender').prefetch_related(
+        Prefetch(
+            'participants',
+            queryset=get_user_model().objects.exclude(pk=user.pk).only('id', 'username'),
+            to_attr='other_participants',
+        ),
+    ).order_by('-updated_at')
+
+
+def total_unread_count(user):
+    """Unread messages across all of the user's threads."""
+    return ThreadReadCursor.objects.filter(user=user).aggregate(total=Sum('unread_count'))['total'] or 0
+
+
+def _counted_unread():
+    """Subquery recounting a cursor's unread messages from the message table."""
+    return Coalesce(
+        Subquery(
+            Message.objects.filter(thread_id=OuterRef('thread_id'), id__gt=OuterRef('last_read_message_id'))
+            .exclude(sender_id=OuterRef('user_id'))
+            .order_by().values('thread_id').annotate(total=Count('id')).values('total')[:1]
+        ),
+        0,
+    )
+
+
+def create_missing_cursors():
+    """Create cursors for participants that have none. Returns the number created."""
+    Participant = Thread.participants.through
+    existing = ThreadReadCursor.objects.filter(user_id=OuterRef('user_id'), thread_id=OuterRef('thread_id'))
+    created = ThreadReadCursor.objects.bulk_create(
+        [
+            ThreadReadCursor(user_id=user_id, thread_id=thread_id)
+            for user_id, thread_id in Participant.objects.exclude(Exists(existing))
+            .values_list('user_id', 'thread_id').iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return len(created)
+
+
+def reconcile_unread_counters(chunk_size=1000):
+    """
+    Recount every cursor's unread messages and fix counters that drifted,
+    walking the cursors in primary key order one chunk at a time. Each chunk
+    is recounted and written by one UPDATE, so an increment from a message
+    sent meanwhile is never overwritten by a count read earlier.
+    New cursors get their counts in the same pass. Returns the number corrected.
+    """
+    create_missing_cursors()
+    corrected = 0
+    last_pk = 0
+    while True:
+        chunk_pks = list(
+            ThreadReadCursor.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not chunk_pks:
+            return corrected
+        last_pk = chunk_pks[-1]
+        corrected += ThreadReadCursor.objects.filter(pk__in=chunk_pks).exclude(
+            unread_count=_counted_unread(),
+        ).update(unread_count=_counted_unread())
+
+
+def is_read_by(message, user):
+    """Whether the user has read a message, by cursor or by per-message receipt."""
+    return (
+        ThreadReadCursor.objects.filter(
+            user=user, thread_id=message.thread_id, last_read_message_id__gte=message.pk,
+        ).exists()
+        or message.read_receipts.filter(user=user).exists()
+    )
@@ -1,10 +1,14 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
-from apps.forum.models import Post
-from apps.chat.models import Message
-from .moderation import contains_inappropriate_content
+from apps.core.mentions import invalidate_username_index, thread_scope
+from apps.forum.models import DiscussionPost, DiscussionThread
+from apps.chat.models import BannedTerm, ChatbotQuestionAnswer, ChatbotTopic, Message, Thread, ThreadReadCursor
+from .chatbot import invalidate_chatbot_index
+from .moderation import contains_inappropriate_content, invalidate_banned_terms
 
-@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=DiscussionThread)
 def flag_inappropriate_post(sender, instance, **kwargs):
     # Check title and content for inappropriate words
     if contains_inappropriate_content(instance.title) or contains_inappropriate_content(instance.content):
@@ -12,8 +16,94 @@ def flag_inappropriate_post(sender, instance, **kwargs):
         if hasattr(instance, 'is_flagged'):
             instance.is_flagged = True
 
+@receiver(pre_save, sender=DiscussionPost)
+def flag_inappropriate_reply(sender, instance, **kwargs):
+    if contains_inappropriate_content(instance.content):
+        if hasattr(instance, 'is_flagged'):
+            instance.is_flagged = True
+
 @receiver(pre_save, sender=Message)
 def flag_inappropriate_message(sender, instance, **kwargs):
     if contains_inappropriate_content(instance.content):
         if hasattr(instance, 'is_flagged'):
-            instance.is_flagged = True
\ No newline at end of file
+            instance.is_flagged = True
+
+@receiver([post_save, post_delete], sender=BannedTerm)
+def reload_banned_terms(sender, instance, **kwargs):
+    invalidate_banned_terms()
+
+@receiver([post_save, post_delete], sender=ChatbotQuestionAnswer)
+@receiver([post_save, post_delete], sender=ChatbotTopic)
+def reload_chatbot_index(sender, instance, **kwargs):
+    invalidate_chatbot_index()
+
+@receiver(post_save, sender=Message)
+def update_thread_on_new_message(sender, instance, created, **kwargs):
+    # Plain UPDATEs: bump the thread's summary and the other participants' unread counters
+    if created:
+        Thread.objects.filter(pk=instance.thread_id).update(updated_at=instance.timestamp, last_message=instance)
+        ThreadReadCursor.objects.filter(thread_id=instance.thread_id).exclude(user_id=instance.sender_id).update(
+            unread_count=F('unread_count') + 1,
+        )
+
+@receiver(pre_save, sender=Message)
+def mark_for_translation(sender, instance, **kwargs):
+    # Decided from the instance alone, so sending costs no extra query; the
+    # background run works out which participants want which language
+    if instance._state.adding:
+        instance.translation_pending = bool(instance.content)
+
+@receiver(post_save, sender=Message)
+def schedule_translation(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields and 'content' in update_fields and instance.content:
+        # Edited text: stored translations are stale
+        Message.objects.filter(pk=instance.pk).update(
+            translated_content={}, translation_pending=True, translation_attempts=0, translation_retry_at=None,
+        )
+    elif not (created and instance.translation_pending):
+        return
+    from .tasks import schedule_translation_drain
+
+    transaction.on_commit(schedule_translation_drain)
+
+@receiver(post_delete, sender=Message)
+def repoint_last_message(sender, instance, **kwargs):
+    # Deleting a thread's last message nulls Thread.last_message; point it at the new newest one
+    latest = Message.objects.filter(thread_id=instance.thread_id).order_by('-timestamp', '-id').values('id')[:1]
+    Thread.objects.filter(pk=instance.thread_id, last_message__isnull=True).update(last_message=Subquery(latest))
+
+@receiver(m2m_changed, sender=Thread.participants.through)
+def sync_read_cursors(sender, instance, action, reverse, pk_set, **kwargs):
+    # Every participant has a cursor, so sending a message only has to bump counters.
+    # A late joiner starts at the newest message, so earlier history is not counted as unread.
+    if action == 'post_add':
+        pairs = [(instance.pk, pk) if not reverse else (pk, instance.pk) for pk in pk_set]
+        newest = dict(
+            Message.objects.filter(thread_id__in={thread_id for thread_id, _ in pairs}).order_by()
+            .values('thread_id').annotate(newest=Max('id')).values_list('thread_id', 'newest')
+        )
+        ThreadReadCursor.objects.bulk_create(
+            [
+                ThreadReadCursor(thread_id=thread_id, user_id=user_id, last_read_message_id=newest.get(thread_id, 0))
+                for thread_id, user_id in pairs
+            ],
+            ignore_conflicts=True,
+        )
+    elif action == 'post_remove':
+        lookup = {'thread_id': instance.pk, 'user_id__in': pk_set} if not reverse else {'user_id': instance.pk, 'thread_id__in': pk_set}
+        ThreadReadCursor.objects.filter(**lookup).delete()
+    elif action == 'pre_clear':
+        lookup = {'thread_id': instance.pk} if not reverse else {'user_id': instance.pk}
+        ThreadReadCursor.objects.filter(**lookup).delete()
+
+@receiver(m2m_changed, sender=Thread.participants.through)
+def reset_thread_mention_index(sender, instance, action, reverse, pk_set, **kwargs):
+    # Each thread's mention index lists its participants
+    if action in ('post_add', 'post_remove'):
+        thread_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear':
+        thread_ids = list(instance.chat_threads.values_list('pk', flat=True)) if reverse else [instance.pk]
+    else:
+        return
+    for thread_id in thread_ids:
+        invalidate_username_index(thread_scope(thread_id))
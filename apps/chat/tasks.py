@@ -0,0 +1,58 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from .services import reconcile_unread_counters
+from .translation import TranslationUnavailable, translate_pending_messages
+
+TRANSLATION_DRAIN_FLAG_CACHE_KEY = 'chat:translation:drain'
+TRANSLATION_DRAIN_DEBOUNCE = 2
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_chat_unread_counters():
+    """
+    Periodic task to recount unread messages per read cursor, correcting any
+    drift in the denormalized counters.
+    """
+    corrected = reconcile_unread_counters()
+    return f"Reconciled chat unread counters, corrected {corrected} cursors."
+
+
+@shared_task
+def translate_chat_messages(max_batches=20):
+    """
+    Translate messages waiting for translation, a batch at a time, and push
+    the translations to connected clients. Dispatched (debounced) after
+    messages are sent, and periodically; failed messages are retried later
+    with backoff, and the run stops early when the backend is unavailable.
+    """
+    cache.delete(TRANSLATION_DRAIN_FLAG_CACHE_KEY)
+    translated = 0
+    for _ in range(max_batches):
+        try:
+            count = translate_pending_messages()
+        except TranslationUnavailable:
+            logger.warning('Chat translation backend unavailable; pending messages will be retried.', exc_info=True)
+            break
+        if not count:
+            break
+        translated += count
+    return f"Translated {translated} chat messages."
+
+
+def schedule_translation_drain():
+    """
+    Dispatch translate_chat_messages unless a run was dispatched in the last
+    TRANSLATION_DRAIN_DEBOUNCE seconds. Never raises: sending a message must
+    not fail because the broker is unreachable.
+    """
+    if not cache.add(TRANSLATION_DRAIN_FLAG_CACHE_KEY, 1, TRANSLATION_DRAIN_DEBOUNCE):
+        return
+    try:
+        translate_chat_messages.apply_async(retry=False)
+    except Exception:
+        logger.warning('Could not dispatch chat translation; the periodic run will pick it up.', exc_info=True)
@@ -1,6 +1,28 @@
+import asyncio
+import os
+import tempfile
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import IntegrityError, connection
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from .models import Thread, Message, MessageReadReceipt
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+from .layers import SQLiteChannelLayer
+from . import chatbot, moderation, presence, translation
+from . import tasks as chat_tasks
+from .models import BannedTerm, ChatbotQuestionAnswer, ChatbotTopic, Thread, Message, MessageReaction, MessageReadReceipt, ThreadReadCursor, TranslationCache
+from .services import (
+    MESSAGE_PAGE_SIZE, create_message, encode_cursor, get_or_create_direct_thread, is_read_by, mark_thread_read,
+    reconcile_unread_counters, thread_summaries, threads_with_unread_counts, total_unread_count, unread_count,
+)
+from .routing import websocket_urlpatterns
 
 User = get_user_model()
 
@@ -102,4 +124,851 @@ class ChatModelsTest(TestCase):
         self.assertEqual(unread_for_user3.count(), 2)
         # The unread messages should be msg2 (from user1) and the message from user2
         self.assertIn(msg2, unread_for_user3)
-        self.assertNotIn(msg1, unread_for_user3)
\ No newline at end of file
+        self.assertNotIn(msg1, unread_for_user3)
+
+
+class ChatConsumerTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='sockuser1', password='password')
+        self.user2 = User.objects.create_user(username='sockuser2', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.user1, self.user2)
+
+    def _communicator(self, user, thread_id=None):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{thread_id or self.thread.pk}/'
+        )
+        communicator.scope['user'] = user
+        return communicator
+
+    async def test_message_broadcast_to_participants(self):
+        sender = self._communicator(self.user1)
+        receiver = self._communicator(self.user2)
+        self.assertTrue((await sender.connect())[0])
+        self.assertTrue((await receiver.connect())[0])
+
+        await sender.send_json_to({'type': 'message', 'content': 'Hello over the socket'})
+        for communicator in (sender, receiver):
+            event = await communicator.receive_json_from()
+            self.assertEqual(event['type'], 'message')
+            self.assertEqual(event['message']['content'], 'Hello over the socket')
+            self.assertEqual(event['message']['sender'], 'sockuser1')
+
+        message = await database_sync_to_async(Message.objects.get)(thread=self.thread)
+        self.assertEqual(message.sender_id, self.user1.pk)
+        await sender.disconnect()
+        await receiver.disconnect()
+
+    async def test_non_participant_rejected(self):
+        connected, code = await self._communicator(self.outsider).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+    async def test_empty_message_rejected(self):
+        communicator = self._communicator(self.user1)
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'message', 'content': '   '})
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'error')
+        self.assertFalse(await database_sync_to_async(Message.objects.exists)())
+        await communicator.disconnect()
+
+    def test_http_send_returns_json_for_ajax(self):
+        self.client.login(username='sockuser1', password='password')
+        response = self.client.post(
+            reverse('send_message', args=[self.thread.pk]),
+            {'content': 'Posted message'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message']['content'], 'Posted message')
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.updated_at, Message.objects.get().timestamp)
+
+
+
+class SQLiteChannelLayerTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'layer.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _layer(self, **config):
+        return SQLiteChannelLayer(path=self.path, poll_interval=0.001, **config)
+
+    async def test_send_and_receive(self):
+        layer = self._layer()
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'test.message', 'text': 'one'})
+        await layer.send(channel, {'type': 'test.message', 'text': 'two'})
+        self.assertEqual((await layer.receive(channel))['text'], 'one')
+        self.assertEqual((await layer.receive(channel))['text'], 'two')
+
+    async def test_group_fan_out_between_layer_instances(self):
+        # Separate instances on one file behave like separate processes
+        publisher, subscriber_a, subscriber_b = self._layer(), self._layer(), self._layer()
+        channel_a = await subscriber_a.new_channel()
+        channel_b = await subscriber_b.new_channel()
+        await subscriber_a.group_add('chat_thread_1', channel_a)
+        await subscriber_b.group_add('chat_thread_1', channel_b)
+
+        await publisher.group_send('chat_thread_1', {'type': 'chat.message', 'body': b'bytes ok'})
+        self.assertEqual((await subscriber_a.receive(channel_a))['body'], b'bytes ok')
+        self.assertEqual((await subscriber_b.receive(channel_b))['body'], b'bytes ok')
+
+        await subscriber_b.group_discard('chat_thread_1', channel_b)
+        await publisher.group_send('chat_thread_1', {'type': 'chat.message', 'body': 'second'})
+        self.assertEqual((await subscriber_a.receive(channel_a))['body'], 'second')
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(subscriber_b.receive(channel_b), timeout=0.1)
+
+    async def test_receive_buffers_are_released(self):
+        layer = self._layer(receive_batch_size=10)
+        channel = await layer.new_channel()
+        for text in ('one', 'two'):
+            await layer.send(channel, {'type': 'test.message', 'text': text})
+        self.assertEqual((await layer.receive(channel))['text'], 'one')
+        self.assertIn(channel, layer._received)
+        self.assertEqual((await layer.receive(channel))['text'], 'two')
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), timeout=0.05)
+        self.assertEqual(layer._received, {})
+
+    async def test_idle_poll_takes_no_write_lock(self):
+        layer = self._layer()
+        channel = await layer.new_channel()
+        statements = []
+        layer._connection().set_trace_callback(statements.append)
+        self.assertEqual(await asyncio.to_thread(layer._claim_sync, channel), [])
+        self.assertNotIn('BEGIN IMMEDIATE', statements)
+
+    async def test_capacity(self):
+        layer = self._layer(capacity=2)
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'test.message'})
+        await layer.send(channel, {'type': 'test.message'})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {'type': 'test.message'})
+
+    async def test_expired_messages_skipped(self):
+        layer = self._layer(expiry=-1)
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'test.message'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), timeout=0.1)
+
+    async def test_flush(self):
+        layer = self._layer()
+        channel = await layer.new_channel()
+        await layer.group_add('group', channel)
+        await layer.send(channel, {'type': 'test.message'})
+        await layer.flush()
+        await layer.group_send('group', {'type': 'test.message'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), timeout=0.1)
+
+
+
+class ThreadReadCursorTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='cursor1', password='password')
+        self.user2 = User.objects.create_user(username='cursor2', password='password')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.user1, self.user2)
+        self.other_thread = Thread.objects.create()
+        self.other_thread.participants.add(self.user1, self.user2)
+
+    def _send(self, sender, thread=None, content='Hi'):
+        return Message.objects.create(thread=thread or self.thread, sender=sender, content=content)
+
+    def test_unread_counts_follow_cursor(self):
+        first = self._send(self.user1)
+        self._send(self.user1)
+        self._send(self.user2)  # own messages are never unread
+        self._send(self.user1, thread=self.other_thread)
+        self.assertEqual(unread_count(self.user2, self.thread), 2)
+        self.assertEqual(total_unread_count(self.user2), 3)
+
+        mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 1)
+        counts = {thread.pk: thread.unread_count for thread in threads_with_unread_counts(self.user2)}
+        self.assertEqual(counts, {self.thread.pk: 1, self.other_thread.pk: 1})
+
+    def test_mark_read_is_single_upsert(self):
+        self._send(self.user1)
+        mark_thread_read(self.user2, self.thread)
+        last = self._send(self.user1)
+        mark_thread_read(self.user2, self.thread)
+        cursor = ThreadReadCursor.objects.get(user=self.user2, thread=self.thread)
+        self.assertEqual(cursor.last_read_message_id, last.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 0)
+        self.assertFalse(MessageReadReceipt.objects.exists())
+
+    def test_mark_read_query_count(self):
+        first = self._send(self.user1)
+        last = self._send(self.user1)
+        with self.assertNumQueries(1):
+            self.assertEqual(mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk), first.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 1)
+        # Without a position, the newest id and the count come from the same UPDATE; one SELECT reads it back
+        with self.assertNumQueries(2):
+            self.assertEqual(mark_thread_read(self.user2, self.thread), last.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 0)
+
+    def test_missing_cursor_is_created(self):
+        first = self._send(self.user1)
+        self._send(self.user1)
+        ThreadReadCursor.objects.filter(user=self.user2).delete()
+        self.assertEqual(mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk), first.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 1)
+
+    def test_cursor_never_moves_backwards(self):
+        first = self._send(self.user1)
+        last = self._send(self.user1)
+        mark_thread_read(self.user2, self.thread)
+        self.assertEqual(mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk), last.pk)
+
+    def test_concurrent_read_never_moves_cursor_backwards(self):
+        first = self._send(self.user1)
+        last = self._send(self.user1)
+        cursor = ThreadReadCursor.objects.filter(user=self.user2, thread=self.thread)
+        raced = []
+
+        def read_elsewhere(execute, sql, params, many, context):
+            # Another read finishes between this one's lookup and its write
+            if 'COUNT(' in sql and not raced:
+                raced.append(True)
+                cursor.update(last_read_message_id=last.pk, unread_count=0)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(read_elsewhere):
+            self.assertEqual(mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk), last.pk)
+        self.assertTrue(raced)
+        self.assertEqual(cursor.get().last_read_message_id, last.pk)
+        self.assertEqual(unread_count(self.user2, self.thread), 0)
+
+    def test_is_read_by_uses_cursor_or_receipt(self):
+        first = self._send(self.user1)
+        second = self._send(self.user1)
+        mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk)
+        self.assertTrue(is_read_by(first, self.user2))
+        self.assertFalse(is_read_by(second, self.user2))
+        MessageReadReceipt.objects.create(user=self.user2, message=second)
+        self.assertTrue(is_read_by(second, self.user2))
+
+    @override_settings(CHAT_PER_MESSAGE_READ_RECEIPTS=True)
+    def test_per_message_receipts_compatibility(self):
+        self._send(self.user1)
+        self._send(self.user1)
+        self._send(self.user2)
+        mark_thread_read(self.user2, self.thread)
+        self.assertEqual(MessageReadReceipt.objects.filter(user=self.user2).count(), 2)
+
+    def test_opening_thread_marks_read(self):
+        self._send(self.user1)
+        self.client.login(username='cursor2', password='password')
+        response = self.client.get(reverse('chat_thread', args=[self.thread.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(unread_count(self.user2, self.thread), 0)
+
+    async def test_socket_read_event_moves_cursor(self):
+        message = await database_sync_to_async(self._send)(self.user1)
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.thread.pk}/')
+        communicator.scope['user'] = self.user2
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'read', 'message_id': message.pk})
+        await communicator.send_json_to({'type': 'bogus'})
+        await communicator.receive_json_from()  # the error reply means the read was handled first
+        self.assertEqual(await database_sync_to_async(unread_count)(self.user2, self.thread), 0)
+        await communicator.disconnect()
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='counter1', password='password')
+        self.user2 = User.objects.create_user(username='counter2', password='password')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.user1, self.user2)
+
+    def _counter(self, user):
+        return ThreadReadCursor.objects.get(user=user, thread=self.thread).unread_count
+
+    def test_participants_get_cursors(self):
+        user3 = User.objects.create_user(username='counter3', password='password')
+        user3.chat_threads.add(self.thread)
+        self.assertEqual(ThreadReadCursor.objects.filter(thread=self.thread).count(), 3)
+        self.thread.participants.remove(user3)
+        self.assertFalse(ThreadReadCursor.objects.filter(user=user3).exists())
+        self.thread.participants.clear()
+        self.assertFalse(ThreadReadCursor.objects.filter(thread=self.thread).exists())
+
+    def test_late_joiner_starts_at_newest_message(self):
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Before')
+        user3 = User.objects.create_user(username='counter3', password='password')
+        self.thread.participants.add(user3)
+        self.assertEqual(self._counter(user3), 0)
+        self.assertEqual(reconcile_unread_counters(), 0)
+        Message.objects.create(thread=self.thread, sender=self.user1, content='After')
+        self.assertEqual(self._counter(user3), 1)
+        self.assertEqual(reconcile_unread_counters(), 0)
+
+    def test_send_increments_and_read_resets(self):
+        with CaptureQueriesContext(connection) as queries:
+            Message.objects.create(thread=self.thread, sender=self.user1, content='Hi')
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "chat_threadreadcursor"') for query in queries), 1)
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Again')
+        self.assertEqual(self._counter(self.user2), 2)
+        self.assertEqual(self._counter(self.user1), 0)
+
+        mark_thread_read(self.user2, self.thread)
+        self.assertEqual(self._counter(self.user2), 0)
+
+    def test_partial_read_keeps_remaining_count(self):
+        first = Message.objects.create(thread=self.thread, sender=self.user1, content='One')
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Two')
+        mark_thread_read(self.user2, self.thread, up_to_message_id=first.pk)
+        self.assertEqual(self._counter(self.user2), 1)
+
+    def test_dashboard_total_reads_counters(self):
+        other = Thread.objects.create()
+        other.participants.add(self.user1, self.user2)
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Hi')
+        Message.objects.create(thread=other, sender=self.user1, content='Hi')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(total_unread_count(self.user2), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('chat_message', queries[0]['sql'])
+
+    def test_reconcile_repairs_drift(self):
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Hi')
+        Message.objects.create(thread=self.thread, sender=self.user2, content='Hello')
+        ThreadReadCursor.objects.filter(user=self.user2).update(unread_count=7)
+        ThreadReadCursor.objects.filter(user=self.user1).delete()
+
+        self.assertEqual(reconcile_unread_counters(chunk_size=1), 2)
+        self.assertEqual(self._counter(self.user1), 1)
+        self.assertEqual(self._counter(self.user2), 1)
+        self.assertEqual(reconcile_unread_counters(), 0)
+
+    def test_reconcile_keeps_concurrent_increment(self):
+        Message.objects.create(thread=self.thread, sender=self.user1, content='Hi')
+        ThreadReadCursor.objects.filter(user=self.user2).update(unread_count=7)
+        raced = []
+
+        def send_elsewhere(execute, sql, params, many, context):
+            # A message is sent just before the reconcile writes
+            if not raced and sql.startswith('UPDATE "chat_threadreadcursor"'):
+                raced.append(True)
+                Message.objects.create(thread=self.thread, sender=self.user1, content='Again')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(send_elsewhere):
+            reconcile_unread_counters()
+        self.assertTrue(raced)
+        self.assertEqual(self._counter(self.user2), 2)
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='history1', password='password')
+        self.user2 = User.objects.create_user(username='history2', password='password')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.user1, self.user2)
+        self.messages = [
+            Message.objects.create(thread=self.thread, sender=self.user1 if i % 2 else self.user2, content=f'Message {i}')
+            for i in range(7)
+        ]
+        self.url = reverse('message_history', args=[self.thread.pk])
+        self.client.login(username='history1', password='password')
+
+    def test_pages_backwards_through_history(self):
+        page = self.client.get(self.url, {'limit': 3}).json()
+        self.assertEqual([m['content'] for m in page['messages']], ['Message 4', 'Message 5', 'Message 6'])
+        seen = page['messages']
+        while page['has_more']:
+            page = self.client.get(self.url, {'limit': 3, 'before': page['before']}).json()
+            seen = page['messages'] + seen
+        self.assertEqual([m['id'] for m in seen], [m.pk for m in self.messages])
+
+    def test_after_cursor_returns_newer_messages(self):
+        oldest = self.client.get(self.url, {'limit': 2, 'before': encode_cursor(self.messages[2])}).json()
+        newer = self.client.get(self.url, {'limit': 3, 'after': oldest['after']}).json()
+        self.assertEqual([m['content'] for m in newer['messages']], ['Message 2', 'Message 3', 'Message 4'])
+        self.assertTrue(newer['has_more'])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for message in self.messages:
+            MessageReaction.objects.create(message=message, user=self.user1, emoji='👍')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {'limit': 2})
+        with CaptureQueriesContext(connection) as large:
+            page = self.client.get(self.url, {'limit': 7}).json()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(page['messages'][0]['reactions'], [{'emoji': '👍', 'count': 1}])
+
+    def test_invalid_cursor_and_non_participant(self):
+        self.assertEqual(self.client.get(self.url, {'before': 'not-a-cursor'}).status_code, 400)
+        User.objects.create_user(username='outsider', password='password')
+        self.client.login(username='outsider', password='password')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_thread_page_renders_latest_page_only(self):
+        Message.objects.bulk_create(
+            [Message(thread=self.thread, sender=self.user2, content=f'Later {i}') for i in range(MESSAGE_PAGE_SIZE)]
+        )
+        response = self.client.get(reverse('chat_thread', args=[self.thread.pk]))
+        rendered = response.context['thread_messages']
+        self.assertEqual(len(rendered), MESSAGE_PAGE_SIZE)
+        self.assertEqual(rendered[-1].content, f'Later {MESSAGE_PAGE_SIZE - 1}')
+        self.assertTrue(response.context['has_more'])
+
+
+class DirectThreadTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='direct1', password='password')
+        self.user2 = User.objects.create_user(username='direct2', password='password')
+
+    def test_lookup_is_symmetric_and_unique(self):
+        thread, created = get_or_create_direct_thread(self.user1, self.user2)
+        self.assertTrue(created)
+        self.assertEqual(get_or_create_direct_thread(self.user2, self.user1), (thread, False))
+        self.assertEqual(set(thread.participants.all()), {self.user1, self.user2})
+        with self.assertRaises(IntegrityError):
+            Thread.objects.create(direct_key=thread.direct_key)
+
+    def test_start_chat_reuses_thread_with_one_lookup(self):
+        self.client.login(username='direct1', password='password')
+        url = reverse('start_chat', args=[self.user2.pk])
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(first.url, second.url)
+        self.assertEqual(Thread.objects.count(), 1)
+        self.assertEqual(sum('chat_thread' in query['sql'] for query in queries), 1)
+
+    def test_group_threads_are_not_direct(self):
+        group = Thread.objects.create()
+        group.participants.add(self.user1, self.user2)
+        thread, created = get_or_create_direct_thread(self.user1, self.user2)
+        self.assertTrue(created)
+        self.assertNotEqual(thread, group)
+
+
+class ThreadSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='summary', password='password')
+        self.others = [User.objects.create_user(username=f'summary{i}', password='password') for i in range(3)]
+
+    def _thread_with(self, other, content):
+        thread = Thread.objects.create()
+        thread.participants.add(self.user, other)
+        message = Message.objects.create(thread=thread, sender=other, content=content)
+        return thread, message
+
+    def test_last_message_tracks_sends_and_deletes(self):
+        thread, first = self._thread_with(self.others[0], 'First')
+        second = Message.objects.create(thread=thread, sender=self.user, content='Second')
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message, second)
+        self.assertEqual(thread.updated_at, second.timestamp)
+        second.delete()
+        thread.refresh_from_db()
+        self.assertEqual(thread.last_message, first)
+
+    def test_summaries_in_constant_queries(self):
+        self._thread_with(self.others[0], 'Hello')
+        with CaptureQueriesContext(connection) as one_thread:
+            list(thread_summaries(self.user))
+        for other in self.others[1:]:
+            self._thread_with(other, 'Hi')
+        with CaptureQueriesContext(connection) as many_threads:
+            summaries = list(thread_summaries(self.user))
+        self.assertEqual(len(one_thread), len(many_threads))
+
+        newest = summaries[0]
+        self.assertEqual(newest.last_message.content, 'Hi')
+        self.assertEqual(newest.last_message.sender, self.others[2])
+        self.assertEqual(newest.other_participants, [self.others[2]])
+        self.assertEqual(newest.unread_count, 1)
+
+    def test_chat_index_renders_previews(self):
+        self._thread_with(self.others[0], 'Preview text')
+        self.client.login(username='summary', password='password')
+        response = self.client.get(reverse('chat_index'))
+        self.assertContains(response, 'Preview text')
+        self.assertContains(response, 'summary0')
+
+
+class TranslationCacheTests(TestCase):
+    def setUp(self):
+        translation.clear_memo()
+        self.addCleanup(translation.clear_memo)
+        self.backend = mock.Mock(wraps=translation.LocalTranslationBackend())
+        patcher = mock.patch.object(translation, 'get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_dedupes_and_keeps_order(self):
+        result = translation.translate_texts(['Hello', 'Bye', 'Hello', ''], 'fr')
+        self.assertEqual(result, ['[fr] Hello', '[fr] Bye', '[fr] Hello', ''])
+        self.backend.translate_batch.assert_called_once_with(['Hello', 'Bye'], 'fr', 'auto')
+        self.assertEqual(TranslationCache.objects.count(), 2)
+
+    def test_repeated_phrases_never_hit_backend_twice(self):
+        translation.translate_texts(['Hello'], 'fr')
+        translation.translate_texts(['Hello'], 'fr')
+        translation.clear_memo()  # a new process still has the database cache
+        self.assertEqual(translation.translate_text('Hello', 'fr'), '[fr] Hello')
+        self.assertEqual(self.backend.translate_batch.call_count, 1)
+        translation.translate_text('Hello', 'es')
+        self.assertEqual(self.backend.translate_batch.call_count, 2)
+
+    def test_failed_batch_is_not_cached(self):
+        self.backend.translate_batch.side_effect = RuntimeError('offline')
+        with self.assertRaises(RuntimeError):
+            translation.translate_texts(['Hello'], 'fr')
+        self.assertFalse(TranslationCache.objects.exists())
+
+
+class GoogleBackendChunkingTests(TestCase):
+    def test_short_texts_share_requests(self):
+        backend = translation.GoogleTranslationBackend()
+        backend.max_chars = 12
+        chunks = list(backend._chunks(['one', 'two', 'three', 'multi\nline', 'four']))
+        self.assertEqual(chunks, [['one', 'two'], ['three'], ['multi\nline'], ['four']])
+
+
+class TranslationPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        translation.clear_memo()
+        self.addCleanup(translation.clear_memo)
+        self.sender = User.objects.create_user(username='speaker', password='password', preferred_language='en')
+        self.reader = User.objects.create_user(username='reader', password='password', preferred_language='fr')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.sender, self.reader)
+
+    def test_new_message_is_translated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            message = create_message(self.thread, self.sender, content='Good morning')
+            # Nothing is translated inside the sending request
+            self.assertEqual(Message.objects.get(pk=message.pk).translated_content, {})
+        message.refresh_from_db()
+        self.assertEqual(message.translated_content, {'fr': '[fr] Good morning'})
+        self.assertFalse(message.translation_pending)
+
+    def test_pending_messages_are_translated_in_one_batch(self):
+        backend = mock.Mock(wraps=translation.LocalTranslationBackend())
+        with mock.patch.object(chat_tasks.translate_chat_messages, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(4):
+                    create_message(self.thread, self.sender, content=f'Line {i}')
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(Message.objects.filter(translation_pending=True).count(), 4)
+
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            chat_tasks.translate_chat_messages()
+        backend.translate_batch.assert_called_once()
+        self.assertEqual(len(backend.translate_batch.call_args[0][0]), 4)
+        self.assertFalse(Message.objects.filter(translation_pending=True).exists())
+
+    def test_broker_failure_does_not_fail_send(self):
+        with mock.patch.object(chat_tasks.translate_chat_messages, 'apply_async', side_effect=OSError('no broker')):
+            with self.captureOnCommitCallbacks(execute=True):
+                message = create_message(self.thread, self.sender, content='Still sent')
+        self.assertTrue(Message.objects.get(pk=message.pk).translation_pending)
+
+    def _pending(self, *contents):
+        return [Message.objects.create(thread=self.thread, sender=self.sender, content=c, translation_pending=True) for c in contents]
+
+    def test_failing_message_does_not_block_queue(self):
+        poison, good = self._pending('Poison', 'Fine')
+        backend = translation.LocalTranslationBackend()
+        real = backend.translate_batch
+
+        def translate_batch(texts, *args, **kwargs):
+            if 'Poison' in texts:
+                raise RuntimeError('backend rejected text')
+            return real(texts, *args, **kwargs)
+
+        with mock.patch.object(backend, 'translate_batch', side_effect=translate_batch), \
+                mock.patch.object(translation, 'get_backend', return_value=backend):
+            self.assertEqual(translation.translate_pending_messages(), 2)
+            # The poison message is backed off, so the next run has nothing due
+            self.assertEqual(translation.translate_pending_messages(), 0)
+        good.refresh_from_db()
+        poison.refresh_from_db()
+        self.assertEqual(good.translated_content, {'fr': '[fr] Fine'})
+        self.assertFalse(good.translation_pending)
+        self.assertTrue(poison.translation_pending)
+        self.assertEqual(poison.translation_attempts, 1)
+        self.assertGreater(poison.translation_retry_at, timezone.now())
+
+    def test_claimed_messages_are_skipped(self):
+        claimed, free = self._pending('Claimed', 'Free')
+        self.assertEqual(translation._claim_pending(1), [claimed.pk])
+        backend = mock.Mock(wraps=translation.LocalTranslationBackend())
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            self.assertEqual(translation.translate_pending_messages(), 1)
+        self.assertEqual(backend.translate_batch.call_args[0][0], ['Free'])
+        self.assertTrue(Message.objects.get(pk=claimed.pk).translation_pending)
+
+    def test_retries_give_up_after_max_attempts(self):
+        message, = self._pending('Never')
+        backend = mock.Mock()
+        backend.translate_batch.side_effect = RuntimeError('down')
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            for _ in range(translation.TRANSLATION_MAX_ATTEMPTS):
+                Message.objects.filter(pk=message.pk).update(translation_retry_at=None)
+                with self.assertRaises(translation.TranslationUnavailable):
+                    translation.translate_pending_messages()
+        message.refresh_from_db()
+        self.assertFalse(message.translation_pending)
+        self.assertEqual(message.translation_attempts, translation.TRANSLATION_MAX_ATTEMPTS)
+
+    def test_drain_stops_when_backend_unavailable(self):
+        self._pending('One')
+        backend = mock.Mock()
+        backend.translate_batch.side_effect = RuntimeError('down')
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            chat_tasks.translate_chat_messages()
+        self.assertEqual(backend.translate_batch.call_count, 1)
+
+    def test_batch_translates_once_per_language(self):
+        spanish = User.objects.create_user(username='lector', password='password', preferred_language='es')
+        self.thread.participants.add(spanish)
+        messages = [Message.objects.create(thread=self.thread, sender=self.sender, content=f'Line {i}') for i in range(3)]
+        backend = mock.Mock(wraps=translation.LocalTranslationBackend())
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            self.assertEqual(translation.translate_messages([m.pk for m in messages]), 3)
+            self.assertEqual(translation.translate_messages([m.pk for m in messages]), 0)
+        self.assertEqual(backend.translate_batch.call_count, 2)
+        self.assertEqual(Message.objects.get(pk=messages[0].pk).translated_content, {'fr': '[fr] Line 0', 'es': '[es] Line 0'})
+
+    def test_nothing_translated_when_nobody_needs_translation(self):
+        self.reader.preferred_language = ''
+        self.reader.save()
+        backend = mock.Mock(wraps=translation.LocalTranslationBackend())
+        with mock.patch.object(translation, 'get_backend', return_value=backend):
+            with self.captureOnCommitCallbacks(execute=True):
+                message = create_message(self.thread, self.sender, content='Hello')
+        backend.translate_batch.assert_not_called()
+        self.assertFalse(Message.objects.get(pk=message.pk).translation_pending)
+
+    def test_sending_does_not_query_participants(self):
+        with CaptureQueriesContext(connection) as queries:
+            Message.objects.create(thread=self.thread, sender=self.sender, content='Hello')
+        self.assertFalse([q for q in queries.captured_queries if 'chat_thread_participants' in q['sql']])
+
+    def test_edited_content_is_translated_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            message = create_message(self.thread, self.sender, content='Hello')
+        message.content = 'Goodbye'
+        with self.captureOnCommitCallbacks(execute=True):
+            message.save(update_fields=['content'])
+        message.refresh_from_db()
+        self.assertEqual(message.translated_content, {'fr': '[fr] Goodbye'})
+        self.assertFalse(message.translation_pending)
+
+    def test_thread_page_shows_stored_translation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_message(self.thread, self.sender, content='See you soon')
+        self.client.login(username='reader', password='password')
+        response = self.client.get(reverse('chat_thread', args=[self.thread.pk]))
+        self.assertContains(response, '[fr] See you soon')
+
+    async def test_translation_pushed_to_socket(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.thread.pk}/')
+        communicator.scope['user'] = self.reader
+        await communicator.connect()
+        message = await database_sync_to_async(Message.objects.create)(thread=self.thread, sender=self.sender, content='Hi')
+        await database_sync_to_async(translation.translate_messages)([message.pk])
+        event = await communicator.receive_json_from()
+        self.assertEqual(event, {'type': 'translation', 'message_id': message.pk, 'translations': {'fr': '[fr] Hi'}})
+        await communicator.disconnect()
+
+
+class ModerationTests(TestCase):
+    def setUp(self):
+        BannedTerm.objects.all().delete()
+        for term in ('spam', 'he', 'she', 'hers', 'bad word'):
+            BannedTerm.objects.create(term=term)
+        moderation.recheck_banned_terms()
+        self.addCleanup(moderation.recheck_banned_terms)
+
+    def test_automaton_finds_overlapping_terms(self):
+        automaton = moderation.Automaton(['he', 'she', 'his', 'hers'])
+        matches = sorted((match.start, match.term) for match in automaton.scan('ushers'))
+        self.assertEqual(matches, [(1, 'she'), (2, 'he'), (2, 'hers')])
+
+    def test_whole_word_case_insensitive_spans(self):
+        text = 'No SPAM here, spammer. A Bad Word!'
+        self.assertEqual(
+            moderation.find_banned_terms(text),
+            [moderation.BannedTermMatch(3, 7, 'spam'), moderation.BannedTermMatch(25, 33, 'bad word')],
+        )
+        self.assertFalse(moderation.contains_inappropriate_content('Shepherds'))
+        self.assertFalse(moderation.contains_inappropriate_content(''))
+
+    def test_term_changes_rebuild_after_commit(self):
+        self.assertFalse(moderation.contains_inappropriate_content('total nonsense'))
+        with self.captureOnCommitCallbacks(execute=True):
+            BannedTerm.objects.create(term='nonsense')
+        self.assertTrue(moderation.contains_inappropriate_content('total nonsense'))
+        with self.captureOnCommitCallbacks(execute=True):
+            BannedTerm.objects.filter(term='nonsense').delete()
+            BannedTerm.objects.get(term='spam').delete()
+        self.assertFalse(moderation.contains_inappropriate_content('total nonsense spam'))
+
+    def test_edits_from_other_processes_picked_up_after_interval(self):
+        self.assertTrue(moderation.contains_inappropriate_content('spam'))
+        # Another process's edit: no signal reaches this one
+        BannedTerm.objects.filter(term='spam').update(is_active=False, updated_at=timezone.now())
+        self.assertTrue(moderation.contains_inappropriate_content('spam'))
+        later = moderation.monotonic() + moderation.VERSION_CHECK_INTERVAL
+        with mock.patch.object(moderation, 'monotonic', return_value=later):
+            self.assertFalse(moderation.contains_inappropriate_content('spam'))
+
+    def test_compiled_once_per_version(self):
+        moderation.find_banned_terms('warm up')
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                moderation.find_banned_terms('spam and more spam')
+        self.assertEqual(len(queries), 0)
+
+
+class ChatbotMatcherTests(TestCase):
+    def setUp(self):
+        self.addCleanup(chatbot.recheck_chatbot_index)
+        self.topic = ChatbotTopic.objects.create(name='Courses', slug='courses')
+        self.enroll = ChatbotQuestionAnswer.objects.create(
+            topic=self.topic, question_text='How do I enroll in a course?', answer_text='Use the Enroll button.',
+            keywords='enrollment, join, register',
+        )
+        self.certificate = ChatbotQuestionAnswer.objects.create(
+            topic=self.topic, question_text='When do I get my course certificate?', answer_text='After the final quiz.',
+        )
+        self.reset = ChatbotQuestionAnswer.objects.create(
+            topic=self.topic, question_text='How can I reset my password?', answer_text='Use the reset link.',
+        )
+        chatbot.recheck_chatbot_index()
+
+    def test_bm25_ranks_best_entry(self):
+        self.assertEqual(chatbot.find_answer('I forgot my password, how to reset it').id, self.reset.pk)
+        self.assertEqual(chatbot.find_answer('course certificate please').id, self.certificate.pk)
+        self.assertEqual(chatbot.find_answer('can I register?').id, self.enroll.pk)
+        self.assertIsNone(chatbot.find_answer('what is the weather'))
+
+    def test_priority_breaks_ties(self):
+        index = chatbot.ChatbotIndex([
+            chatbot.ChatbotEntry(1, 'Grading policy', '', 0, 'low'),
+            chatbot.ChatbotEntry(2, 'Grading policy', '', 5, 'high'),
+            chatbot.ChatbotEntry(3, 'Attendance policy', '', 9, 'other'),
+        ])
+        self.assertEqual([match.answer for match in index.search('grading policy', limit=3)], ['high', 'low', 'other'])
+
+    def test_pruned_search_matches_exhaustive_ranking(self):
+        entries = [
+            chatbot.ChatbotEntry(i, f'question {i % 7} about topic{i % 13} and word{i}', '', i % 3, str(i))
+            for i in range(300)
+        ]
+        index = chatbot.ChatbotIndex(entries)
+        for query in ('topic3 question word42', 'question about topic5', 'word7 word8 topic1'):
+            best = index.search(query, limit=1)[0]
+            exhaustive = max(index.search(query, limit=len(entries)), key=lambda match: match.score)
+            self.assertAlmostEqual(best.score, exhaustive.score)
+
+    def test_index_rebuilds_after_changes(self):
+        chatbot.get_index()
+        with CaptureQueriesContext(connection) as queries:
+            chatbot.find_answer('reset password')
+        self.assertEqual(len(queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reset.is_active = False
+            self.reset.save()
+        self.assertIsNone(chatbot.find_answer('reset password'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.is_active = False
+            self.topic.save()
+        self.assertEqual(len(chatbot.get_index()), 0)
+
+    def test_edits_from_other_processes_picked_up_after_interval(self):
+        self.assertEqual(chatbot.find_answer('reset password').id, self.reset.pk)
+        ChatbotQuestionAnswer.objects.filter(pk=self.reset.pk).update(is_active=False, updated_at=timezone.now())
+        self.assertIsNotNone(chatbot.find_answer('reset password'))
+        later = chatbot.monotonic() + chatbot.VERSION_CHECK_INTERVAL
+        with mock.patch.object(chatbot, 'monotonic', return_value=later):
+            self.assertIsNone(chatbot.find_answer('reset password'))
+
+    def test_forum_chatbot_prefers_curated_answer(self):
+        User.objects.create_user(username='asker', password='password')
+        self.client.login(username='asker', password='password')
+        response = self.client.post(reverse('forum:chatbot_query'), {'message': 'How do I reset my password?'})
+        self.assertEqual(response.json(), {'response': 'Use the reset link.'})
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='present1', password='password')
+        self.user2 = User.objects.create_user(username='present2', password='password')
+        self.thread = Thread.objects.create()
+        self.thread.participants.add(self.user1, self.user2)
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.thread.pk}/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def test_online_lookup_is_one_multi_get(self):
+        presence.heartbeat(self.user1.pk)
+        with mock.patch.object(presence.get_store(), 'get_many', wraps=presence.get_store().get_many) as get_many:
+            self.assertEqual(presence.online_user_ids([self.user1.pk, self.user2.pk]), {self.user1.pk})
+        get_many.assert_called_once()
+
+    def test_in_memory_store_expires_keys(self):
+        store = presence.InMemoryTTLStore()
+        with mock.patch.object(presence.time, 'monotonic', return_value=100.0):
+            store.set('a', 1, 10)
+            self.assertTrue(store.add('b', 1, 2))
+            self.assertFalse(store.add('b', 1, 2))
+        with mock.patch.object(presence.time, 'monotonic', return_value=105.0):
+            self.assertEqual(store.get_many(['a', 'b']), {'a': 1})
+            self.assertTrue(store.add('b', 1, 2))
+
+    def test_typing_notices_are_rate_limited(self):
+        self.assertTrue(presence.allow_typing_notice(self.thread.pk, self.user1.pk))
+        self.assertFalse(presence.allow_typing_notice(self.thread.pk, self.user1.pk))
+        self.assertTrue(presence.allow_typing_notice(self.thread.pk, self.user2.pk))
+
+    async def test_heartbeat_reports_online_participants(self):
+        first = self._communicator(self.user1)
+        second = self._communicator(self.user2)
+        await first.connect()
+        await first.send_json_to({'type': 'heartbeat'})
+        self.assertEqual(await first.receive_json_from(), {'type': 'presence', 'online': [self.user1.pk]})
+        await second.connect()
+        await first.send_json_to({'type': 'heartbeat'})
+        self.assertEqual(
+            await first.receive_json_from(), {'type': 'presence', 'online': sorted([self.user1.pk, self.user2.pk])},
+        )
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_typing_relayed_to_others_only(self):
+        typist = self._communicator(self.user1)
+        reader = self._communicator(self.user2)
+        await typist.connect()
+        await reader.connect()
+        await typist.send_json_to({'type': 'typing'})
+        await typist.send_json_to({'type': 'typing'})  # rate limited, not relayed
+        self.assertEqual(
+            await reader.receive_json_from(), {'type': 'typing', 'user_id': self.user1.pk, 'username': 'present1'},
+        )
+        self.assertTrue(await reader.receive_nothing())
+        self.assertTrue(await typist.receive_nothing())
+        await typist.disconnect()
+        await reader.disconnect()
@@ -0,0 +1,283 @@
+"""
+Message translation with a persistent memo cache.
+
+Translations are looked up in an in-process LRU, then in the TranslationCache
+table, and only the strings missing from both are sent to the configured
+backend, deduplicated and in batches. Every result is stored under a hash of
+(source language, target language, text), so a repeated phrase never reaches
+the backend twice. The backend is a dotted path in CHAT_TRANSLATION_BACKEND.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Message, Thread, TranslationCache
+from .services import broadcast_translations
+
+TRANSLATION_BATCH_SIZE = 50
+TRANSLATION_MAX_ATTEMPTS = 5
+TRANSLATION_RETRY_DELAY = timedelta(seconds=30)
+TRANSLATION_MAX_RETRY_DELAY = timedelta(hours=1)
+# A claimed batch is skipped by other drains for this long (or until its worker finishes)
+TRANSLATION_LEASE = timedelta(minutes=5)
+
+
+class TranslationUnavailable(Exception):
+    """No message in a batch could be translated."""
+
+
+class LocalTranslationBackend:
+    """Deterministic offline backend for tests and development: tags text with the target language."""
+
+    def translate_batch(self, texts, target_language, source_language='auto'):
+        return [f'[{target_language}] {text}' for text in texts]
+
+
+class GoogleTranslationBackend:
+    """
+    Google Translate through deep_translator. Texts without line breaks are
+    joined with newlines into requests of up to max_chars, so a batch costs a
+    few network calls rather than one per text.
+    """
+    max_chars = 4500
+
+    def translate_batch(self, texts, target_language, source_language='auto'):
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source=source_language, target=target_language)
+        results = []
+        for chunk in self._chunks(texts):
+            if len(chunk) == 1:
+                results.append(translator.translate(chunk[0]) or chunk[0])
+                continue
+            translated = (translator.translate('\n'.join(chunk)) or '').split('\n')
+            if len(translated) != len(chunk):
+                # The backend merged or split lines; fall back to one call per text
+                translated = [translator.translate(text) or text for text in chunk]
+            results.extend(translated)
+        return results
+
+    def _chunks(self, texts):
+        chunk, size = [], 0
+        for text in texts:
+            if '\n' in text or len(text) > self.max_chars:
+                if chunk:
+                    yield chunk
+                    chunk, size = [], 0
+                yield [text]
+                continue
+            if chunk and size + len(text) + 1 > self.max_chars:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(text)
+            size += len(text) + 1
+        if chunk:
+            yield chunk
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used mapping."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_memo = LRUCache(getattr(settings, 'CHAT_TRANSLATION_LRU_SIZE', 4096))
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.CHAT_TRANSLATION_BACKEND)()
+    return _backend
+
+
+def translation_key(text, target_language, source_language='auto'):
+    return hashlib.sha256(f'{source_language}\0{target_language}\0{text}'.encode()).hexdigest()
+
+
+def translate_texts(texts, target_language, source_language='auto'):
+    """
+    Translate a list of strings, returning translations in the same order.
+    Blank strings are returned unchanged. Backend errors propagate; nothing
+    is cached for a batch that failed.
+    """
+    keys = {text: translation_key(text, target_language, source_language) for text in texts if text and text.strip()}
+    found = {}
+    for text, key in keys.items():
+        cached = _memo.get(key)
+        if cached is not None:
+            found[text] = cached
+
+    missing = {text: key for text, key in keys.items() if text not in found}
+    if missing:
+        stored = dict(TranslationCache.objects.filter(key__in=missing.values()).values_list('key', 'translated_text'))
+        for text, key in missing.items():
+            if key in stored:
+                found[text] = stored[key]
+                _memo.set(key, stored[key])
+
+    pending = [text for text in missing if text not in found]
+    for start in range(0, len(pending), TRANSLATION_BATCH_SIZE):
+        batch = pending[start:start + TRANSLATION_BATCH_SIZE]
+        translated = get_backend().translate_batch(batch, target_language, source_language)
+        TranslationCache.objects.bulk_create(
+            [
+                TranslationCache(
+                    key=keys[text],
+                    source_language=source_language,
+                    target_language=target_language,
+                    translated_text=result,
+                )
+                for text, result in zip(batch, translated)
+            ],
+            ignore_conflicts=True,
+        )
+        for text, result in zip(batch, translated):
+            found[text] = result
+            _memo.set(keys[text], result)
+
+    return [found.get(text, text) for text in texts]
+
+
+def translate_text(text, target_language, source_language='auto'):
+    return translate_texts([text], target_language, source_language)[0]
+
+
+def clear_memo():
+    """Empty the in-process LRU (the database cache is kept)."""
+    _memo.clear()
+
+
+def translate_messages(message_ids):
+    """
+    Translate messages into the preferred languages of their threads' other
+    participants, one backend batch per language, and store the results in
+    Message.translated_content with a single bulk update. Connected clients
+    are sent each message's new translations. Returns the number of
+    messages updated.
+    """
+    messages = list(Message.objects.filter(pk__in=message_ids).exclude(content__isnull=True).exclude(content=''))
+    members = {}
+    for thread_id, user_id, language in Thread.participants.through.objects.filter(
+        thread_id__in={message.thread_id for message in messages},
+    ).exclude(user__preferred_language='').values_list('thread_id', 'user_id', 'user__preferred_language'):
+        members.setdefault(thread_id, []).append((user_id, language))
+
+    wanted = {}
+    for message in messages:
+        for user_id, language in members.get(message.thread_id, []):
+            if user_id != message.sender_id and language != message.original_language \
+                    and language not in message.translated_content:
+                wanted.setdefault(language, set()).add(message)
+
+    added = {}
+    for language, targets in wanted.items():
+        targets = sorted(targets, key=lambda message: message.pk)
+        for message, translated in zip(targets, translate_texts([message.content for message in targets], language)):
+            message.translated_content[language] = translated
+            added.setdefault(message, {})[language] = translated
+
+    Message.objects.bulk_update(list(added), ['translated_content'])
+    for message, translations in added.items():
+        broadcast_translations(message, translations)
+    return len(added)
+
+
+def _claim_pending(batch_size):
+    """
+    Claim up to batch_size due pending messages, oldest first. Claimed rows
+    are leased until TRANSLATION_LEASE from now, so a concurrent drain skips
+    them, and their attempt counter is bumped.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        message_ids = list(
+            Message.objects.select_for_update(skip_locked=True)
+            .filter(translation_pending=True)
+            .filter(Q(translation_retry_at__isnull=True) | Q(translation_retry_at__lte=now))
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        Message.objects.filter(pk__in=message_ids).update(
+            translation_retry_at=now + TRANSLATION_LEASE,
+            translation_attempts=F('translation_attempts') + 1,
+        )
+    return message_ids
+
+
+def _retry_later(message_ids):
+    """Back failed messages off exponentially, giving up after TRANSLATION_MAX_ATTEMPTS."""
+    now = timezone.now()
+    by_attempts = {}
+    for message_id, attempts in Message.objects.filter(pk__in=message_ids).values_list('pk', 'translation_attempts'):
+        by_attempts.setdefault(attempts, []).append(message_id)
+    for attempts, ids in by_attempts.items():
+        if attempts >= TRANSLATION_MAX_ATTEMPTS:
+            Message.objects.filter(pk__in=ids).update(translation_pending=False, translation_retry_at=None)
+        else:
+            delay = min(TRANSLATION_RETRY_DELAY * 2 ** (attempts - 1), TRANSLATION_MAX_RETRY_DELAY)
+            Message.objects.filter(pk__in=ids).update(translation_retry_at=now + delay)
+
+
+def translate_pending_messages(batch_size=TRANSLATION_BATCH_SIZE):
+    """
+    Claim and translate one batch of messages flagged translation_pending.
+    If the batch fails, its messages are retried one at a time so a single
+    bad message cannot hold back the rest; those that still fail are backed
+    off. Raises if every message failed (most likely the backend is down).
+    Returns the number of messages claimed.
+    """
+    message_ids = _claim_pending(batch_size)
+    if not message_ids:
+        return 0
+    failed = []
+    try:
+        translate_messages(message_ids)
+    except Exception:
+        if len(message_ids) == 1:
+            failed = message_ids
+        else:
+            for message_id in message_ids:
+                try:
+                    translate_messages([message_id])
+                except Exception:
+                    failed.append(message_id)
+    Message.objects.filter(pk__in=[pk for pk in message_ids if pk not in failed]).update(
+        translation_pending=False, translation_retry_at=None,
+    )
+    if failed:
+        _retry_later(failed)
+        if len(failed) == len(message_ids):
+            raise TranslationUnavailable(f'Could not translate messages {failed}.')
+    return len(message_ids)
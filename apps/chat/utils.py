@@ -1,41 +1,38 @@
-from deep_translator import GoogleTranslator
-import re
+import logging
+
 from django.contrib.auth import get_user_model
+from apps.core.mentions import mentioned_usernames, render_mentions, resolve_mentions, thread_username_index
+from .translation import translate_text
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 def translate_message(text, target_language='en', source_language='auto'):
-    """Translate message text to target language"""
+    """Translate message text to target language, through the translation cache"""
     try:
-        translator = GoogleTranslator(source=source_language, target=target_language)
-        translated = translator.translate(text)
-        return translated
-    except Exception as e:
-        print(f"Translation error: {e}")
+        return translate_text(text, target_language, source_language)
+    except Exception:
+        logger.exception('Could not translate message text to %s.', target_language)
         return text
 
 
 def extract_mentions(text):
     """Extract @mentions from text and return list of User objects"""
-    # Pattern to match @username
-    mention_pattern = r'@(\w+)'
-    usernames = re.findall(mention_pattern, text)
-    
-    # Get unique usernames
-    usernames = list(set(usernames))
-    
-    # Find users
-    mentioned_users = User.objects.filter(username__in=usernames)
-    
-    return list(mentioned_users)
+    usernames = mentioned_usernames(text)
+    if not usernames:
+        return []
+    return list(User.objects.filter(username__in=usernames))
+
+
+def resolve_message_mentions(messages):
+    """
+    Resolve @mentions for a page of messages: [{username: user_id}] in the
+    same order, from the cached username index of each message's thread.
+    """
+    return [resolve_mentions([message.content], thread_username_index(message.thread_id))[0] for message in messages]
 
 
 def format_message_with_mentions(text, mentioned_users):
     """Format message text with clickable mention links"""
-    for user in mentioned_users:
-        pattern = f'@{user.username}'
-        replacement = f'<a href="/accounts/profile/{user.id}/" class="mention">@{user.username}</a>'
-        text = text.replace(pattern, replacement)
-    
-    return text
\ No newline at end of file
+    return render_mentions(text, {user.username: user.pk for user in mentioned_users})
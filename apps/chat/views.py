@@ -1,46 +1,88 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from .models import Thread, Message
+from .services import (
+    MAX_MESSAGE_LENGTH, MESSAGE_PAGE_SIZE, broadcast_message, create_message, encode_cursor,
+    get_or_create_direct_thread, mark_thread_read, message_page, serialize_message, serialize_reactions,
+    thread_summaries,
+)
 from apps.accounts.models import User
 from django.db.models import Q
 
 @login_required
 def chat_index(request):
-    threads = request.user.chat_threads.all().order_by('-updated_at')
+    threads = thread_summaries(request.user)
     return render(request, 'chat/chat.html', {'threads': threads})
 
 @login_required
 def chat_thread(request, thread_id):
-    threads = request.user.chat_threads.all().order_by('-updated_at')
     active_thread = get_object_or_404(Thread, pk=thread_id, participants=request.user)
     
-    # Mark unread messages from other participants as read
-    unread_messages = active_thread.messages.exclude(sender=request.user).exclude(
-        read_by=request.user
-    )
-    for message in unread_messages:
-        message.read_by.add(request.user)
+    # One upsert of the read cursor marks everything in the thread as read
+    mark_thread_read(request.user, active_thread)
+    threads = thread_summaries(request.user)
+    # Only the newest page is rendered; older messages load on scroll from message_history
+    messages, has_more = message_page(active_thread)
+    for message in messages:
+        message.translation = message.translated_content.get(request.user.preferred_language)
     
     return render(request, 'chat/chat.html', {
         'threads': threads,
-        'active_thread': active_thread
+        'active_thread': active_thread,
+        'thread_messages': messages,
+        'has_more': has_more,
+        'before_cursor': encode_cursor(messages[0]) if messages else '',
+    })
+
+@login_required
+def message_history(request, thread_id):
+    """
+    A page of a thread's messages as JSON, oldest first. Pass ?before=<cursor>
+    for older messages or ?after=<cursor> for newer ones; cursors come from
+    the previous page's before/after values.
+    """
+    thread = get_object_or_404(Thread, pk=thread_id, participants=request.user)
+    try:
+        limit = int(request.GET.get('limit', MESSAGE_PAGE_SIZE))
+        messages, has_more = message_page(
+            thread,
+            before=request.GET.get('before') or None,
+            after=request.GET.get('after') or None,
+            limit=limit,
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor or limit'}, status=400)
+
+    return JsonResponse({
+        'messages': [
+            {**serialize_message(message), 'reactions': serialize_reactions(message)} for message in messages
+        ],
+        'has_more': has_more,
+        'before': encode_cursor(messages[0]) if messages else None,
+        'after': encode_cursor(messages[-1]) if messages else None,
     })
 
 @login_required
 def send_message(request, thread_id):
+    """
+    HTTP fallback for sending messages: used for audio uploads and when the
+    websocket is unavailable. Text messages normally go through ChatConsumer.
+    """
     thread = get_object_or_404(Thread, pk=thread_id, participants=request.user)
+    message = None
     if request.method == 'POST':
-        content = request.POST.get('content')
+        content = (request.POST.get('content') or '')[:MAX_MESSAGE_LENGTH]
         audio_file = request.FILES.get('audio')
         
         if content or audio_file:
-            Message.objects.create(
-                thread=thread, 
-                sender=request.user, 
-                content=content if content else '',
-                audio_file=audio_file
-            )
-            thread.save() # Update updated_at
+            message = create_message(thread, request.user, content=content, audio_file=audio_file)
+            broadcast_message(message)
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        if message is None:
+            return JsonResponse({'status': 'error', 'message': 'Message is empty'}, status=400)
+        return JsonResponse({'status': 'success', 'message': serialize_message(message)})
     return redirect('chat_thread', thread_id=thread_id)
 
 @login_required
@@ -49,22 +91,5 @@ def start_chat(request, user_id):
     if target_user == request.user:
         return redirect('chat_index')
     
-    # Check for existing thread with exactly these two participants
-    # This is a bit complex in Django ORM without a through model custom query, 
-    # but we can filter threads where both are participants and count is 2.
-    
-    threads = Thread.objects.filter(participants=request.user).filter(participants=target_user)
-    
-    existing_thread = None
-    for thread in threads:
-        if thread.participants.count() == 2:
-            existing_thread = thread
-            break
-            
-    if existing_thread:
-        return redirect('chat_thread', thread_id=existing_thread.pk)
-    else:
-        # Create new thread
-        new_thread = Thread.objects.create()
-        new_thread.participants.add(request.user, target_user)
-        return redirect('chat_thread', thread_id=new_thread.pk)
+    thread, _ = get_or_create_direct_thread(request.user, target_user)
+    return redirect('chat_thread', thread_id=thread.pk)
@@ -0,0 +1,87 @@
+"""
+@mention resolution and rendering shared by chat and the forum.
+
+Mentions are resolved against a cached username -> id index of the people who
+can be mentioned in a scope (a chat thread's participants, a course's
+members), or with one query for a whole batch of texts when there is no
+scope. Rendering is a single regex pass with a dict lookup per match.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+from django.urls import reverse
+
+MENTION_PATTERN = re.compile(r'@(\w+)')
+# Membership changes invalidate an index explicitly; renames are picked up on expiry
+MENTION_INDEX_TTL = 300
+
+
+def mentioned_usernames(text):
+    return set(MENTION_PATTERN.findall(text or ''))
+
+
+def _index_key(scope):
+    return f'mentions:index:{scope}'
+
+
+def username_index(scope, members):
+    """
+    The {username: user_id} index for a scope, cached. `members` is a user
+    queryset that is only evaluated on a cache miss.
+    """
+    index = cache.get(_index_key(scope))
+    if index is None:
+        index = dict(members.values_list('username', 'id'))
+        cache.set(_index_key(scope), index, MENTION_INDEX_TTL)
+    return index
+
+
+def invalidate_username_index(scope):
+    cache.delete(_index_key(scope))
+
+
+def thread_scope(thread_id):
+    return f'chat_thread:{thread_id}'
+
+
+def course_scope(course_id):
+    return f'course:{course_id}'
+
+
+def thread_username_index(thread_id):
+    return username_index(thread_scope(thread_id), get_user_model().objects.filter(chat_threads=thread_id))
+
+
+def course_username_index(course_id):
+    members = get_user_model().objects.filter(Q(courses_enrolled=course_id) | Q(courses_teaching=course_id)).distinct()
+    return username_index(course_scope(course_id), members)
+
+
+def resolve_mentions(texts, index=None):
+    """
+    For each text, the {username: user_id} of the users it mentions. Uses the
+    given index if there is one, otherwise one query for the whole batch.
+    """
+    found = [mentioned_usernames(text) for text in texts]
+    if index is None:
+        wanted = set().union(*found)
+        index = dict(
+            get_user_model().objects.filter(username__in=wanted).values_list('username', 'id')
+        ) if wanted else {}
+    return [{username: index[username] for username in usernames if username in index} for usernames in found]
+
+
+def render_mentions(text, mentions):
+    """Link each @username in `mentions` ({username: user_id}) to the user's profile, in one pass."""
+    if not text or not mentions:
+        return text
+
+    def link(match):
+        user_id = mentions.get(match.group(1))
+        if user_id is None:
+            return match.group(0)
+        return f'<a href="{reverse("user_detail", args=[user_id])}" class="mention">@{match.group(1)}</a>'
+
+    return MENTION_PATTERN.sub(link, text)
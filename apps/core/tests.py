@@ -1,3 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from apps.chat.models import Message, Thread
+from apps.chat.utils import extract_mentions, format_message_with_mentions, resolve_message_mentions
+from apps.courses.models import Course
+from apps.forum.models import DiscussionThread
+from apps.forum.utils import resolve_post_mentions
+from .mentions import course_username_index, render_mentions, resolve_mentions, thread_username_index
+
+User = get_user_model()
+
+
+class MentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.bobby = User.objects.create_user(username='bobby', password='password')
+
+    def test_render_is_single_pass_and_exact(self):
+        text = format_message_with_mentions('@bob meet @bobby and @carol', [self.bob, self.bobby])
+        self.assertIn(f'<a href="{reverse("user_detail", args=[self.bob.pk])}" class="mention">@bob</a> meet', text)
+        self.assertIn(f'href="{reverse("user_detail", args=[self.bobby.pk])}" class="mention">@bobby</a>', text)
+        self.assertTrue(text.endswith('and @carol'))
+        self.assertEqual(render_mentions('no mentions', {}), 'no mentions')
+
+    def test_batch_resolution_is_one_query(self):
+        texts = ['hi @alice', '@bob and @nobody', 'nothing here']
+        with self.assertNumQueries(1):
+            resolved = resolve_mentions(texts)
+        self.assertEqual(resolved, [{'alice': self.alice.pk}, {'bob': self.bob.pk}, {}])
+        with self.assertNumQueries(0):
+            self.assertEqual(extract_mentions('no one'), [])
+
+    def test_thread_index_is_cached_and_reset_on_membership_change(self):
+        thread = Thread.objects.create()
+        thread.participants.add(self.alice, self.bob)
+        messages = [Message.objects.create(thread=thread, sender=self.alice, content=f'@bob @bobby {i}') for i in range(5)]
+        resolve_message_mentions(messages[:1])
+        with self.assertNumQueries(0):
+            resolved = resolve_message_mentions(messages)
+        self.assertEqual(resolved, [{'bob': self.bob.pk}] * 5)
+
+        thread.participants.add(self.bobby)
+        self.assertIn('bobby', thread_username_index(thread.pk))
+        self.bobby.chat_threads.clear()
+        self.assertNotIn('bobby', thread_username_index(thread.pk))
+
+    def test_course_index_covers_students_and_instructors(self):
+        course = Course.objects.create(title='Mentions', description='Course')
+        course.students.add(self.alice)
+        course.instructors.add(self.bob)
+        posts = [DiscussionThread(course=course, author=self.alice, title='Q', content='@bob @alice @bobby')]
+        self.assertEqual(resolve_post_mentions(posts, course.pk), [{'bob': self.bob.pk, 'alice': self.alice.pk}])
+        self.bobby.courses_enrolled.add(course)
+        self.assertIn('bobby', course_username_index(course.pk))
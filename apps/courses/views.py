@@ -6,6 +6,7 @@ from django.db.models import Prefetch
 from .models import Course, Lesson, Assignment, Submission, LessonProgress
 from .forms import SubmissionForm, CourseForm, LessonForm, AssignmentForm
 from apps.accounts.models import User
+from apps.analytics.utils import log_student_activity
 
 class InstructorRequiredMixin(UserPassesTestMixin):
     def test_func(self):
@@ -230,6 +231,8 @@ def toggle_lesson_completion(request, lesson_id):
     
     progress.is_completed = not progress.is_completed
     progress.save()
+    if progress.is_completed:
+        log_student_activity(request.user, 'lesson_complete', course=lesson.course, lesson_id=lesson.pk)
     
     return JsonResponse({
         'status': 'success', 
@@ -6,7 +6,7 @@ from django.utils import timezone
 from django.urls import reverse
 from django.db.models import Prefetch
 from apps.courses.models import Course, Assignment, Submission
-from apps.chat.models import Message
+from apps.chat.services import total_unread_count
 from apps.quiz.models import QuizSubmission
 from django.http import JsonResponse
 
@@ -39,14 +39,8 @@ def dashboard(request):
         ).count()
         pending_label = "Pending Assignments"
 
-    # 3. Unread Messages (FIXED: Using new read receipt model)
-    unread_messages_count = Message.objects.filter(
-        thread__participants=user
-    ).exclude(
-        sender=user
-    ).exclude(
-        read_receipts__user=user
-    ).count()
+    # 3. Unread Messages (messages past the user's read cursor in each thread)
+    unread_messages_count = total_unread_count(user)
 
     # 4. Learning Analytics (Quiz Performance) (FIXED: N+1 problem)
     recent_quizzes = QuizSubmission.objects.filter(
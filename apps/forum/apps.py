@@ -4,3 +4,6 @@ class ForumConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.forum'
     label = 'forum'
+
+    def ready(self):
+        import apps.forum.signals
@@ -0,0 +1,17 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from apps.core.mentions import course_scope, invalidate_username_index
+from apps.courses.models import Course
+
+@receiver(m2m_changed, sender=Course.students.through)
+@receiver(m2m_changed, sender=Course.instructors.through)
+def reset_course_mention_index(sender, instance, action, reverse, pk_set, **kwargs):
+    # Each course's mention index lists its students and instructors
+    if action in ('post_add', 'post_remove'):
+        course_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear':
+        course_ids = list(sender.objects.filter(user=instance).values_list('course_id', flat=True)) if reverse else [instance.pk]
+    else:
+        return
+    for course_id in course_ids:
+        invalidate_username_index(course_scope(course_id))
@@ -1,29 +1,26 @@
-import re
 from django.contrib.auth import get_user_model
+from apps.core.mentions import course_username_index, mentioned_usernames, render_mentions, resolve_mentions
 
 User = get_user_model()
 
 
 def extract_mentions(text):
     """Extract @mentions from text and return list of User objects"""
-    # Pattern to match @username
-    mention_pattern = r'@(\w+)'
-    usernames = re.findall(mention_pattern, text)
-    
-    # Get unique usernames
-    usernames = list(set(usernames))
-    
-    # Find users
-    mentioned_users = User.objects.filter(username__in=usernames)
-    
-    return list(mentioned_users)
+    usernames = mentioned_usernames(text)
+    if not usernames:
+        return []
+    return list(User.objects.filter(username__in=usernames))
+
+
+def resolve_post_mentions(posts, course_id):
+    """
+    Resolve @mentions for a page of forum threads or posts in one course:
+    [{username: user_id}] in the same order, from the course's cached
+    username index.
+    """
+    return resolve_mentions([post.content for post in posts], course_username_index(course_id))
 
 
 def format_text_with_mentions(text, mentioned_users):
     """Format text with clickable mention links"""
-    for user in mentioned_users:
-        pattern = f'@{user.username}'
-        replacement = f'<a href="/accounts/profile/{user.id}/" class="mention">@{user.username}</a>'
-        text = text.replace(pattern, replacement)
-    
-    return text
\ No newline at end of file
+    return render_mentions(text, {user.username: user.pk for user in mentioned_users})
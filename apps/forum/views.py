@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Count, Max
 from django.http import HttpResponseForbidden, JsonResponse
+from apps.chat.chatbot import find_answer
 from apps.courses.models import Course
 from .models import DiscussionThread, DiscussionPost
 from .forms import DiscussionThreadForm, DiscussionPostForm
@@ -60,6 +61,11 @@ def chatbot_query(request):
         #     print(f"Error calling AI model: {e}")
         #     ai_response = "I apologize, but I'm having trouble connecting to the AI at the moment."
         
+        # Curated answers from the chatbot Q&A take precedence over the simulation
+        match = find_answer(user_message)
+        if match is not None:
+            return JsonResponse({'response': match.answer})
+
         # Simulated AI response for demonstration
         # This part will be replaced by actual AI model invocation
         if "hello" in user_message.lower() or "hi" in user_message.lower():
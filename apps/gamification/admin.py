@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import Badge, UserPoints, UserBadge, DailyChallenge, UserDailyChallenge
+from .models import Badge, UserPoints, UserBadge, DailyChallenge, UserDailyChallenge, PointsTransaction, LearningStreak, GamificationEvent
 
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'points_required', 'slug', 'created_at')
-    list_filter = ('points_required', 'created_at')
+    list_display = ('name', 'badge_type', 'points_required', 'streak_days_required', 'slug', 'created_at')
+    list_filter = ('badge_type', 'points_required', 'created_at')
     search_fields = ('name', 'description', 'slug')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('points_required',)
@@ -27,8 +27,8 @@ class UserBadgeAdmin(admin.ModelAdmin):
 
 @admin.register(DailyChallenge)
 class DailyChallengeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'points_award', 'frequency', 'is_active', 'created_at')
-    list_filter = ('frequency', 'is_active', 'created_at')
+    list_display = ('name', 'points_award', 'frequency', 'activity_type', 'target_count', 'is_active', 'created_at')
+    list_filter = ('frequency', 'activity_type', 'is_active', 'created_at')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ('-created_at',)
@@ -40,3 +40,26 @@ class UserDailyChallengeAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'challenge__name')
     ordering = ('-completed_date',)
     readonly_fields = ('completed_date', 'is_completed')
+
+@admin.register(PointsTransaction)
+class PointsTransactionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'amount', 'source', 'course', 'idempotency_key', 'created_at')
+    list_filter = ('source', 'created_at')
+    search_fields = ('user__username', 'idempotency_key')
+    ordering = ('-created_at',)
+    readonly_fields = ('user', 'amount', 'source', 'course', 'idempotency_key', 'created_at')
+
+@admin.register(LearningStreak)
+class LearningStreakAdmin(admin.ModelAdmin):
+    list_display = ('user', 'longest_streak', 'last_active_date', 'start_date')
+    search_fields = ('user__username',)
+    ordering = ('-longest_streak',)
+    exclude = ('days',)
+    readonly_fields = ('user', 'start_date', 'last_active_date', 'longest_streak', 'updated_at')
+
+@admin.register(GamificationEvent)
+class GamificationEventAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event_type', 'amount', 'source', 'activity_date', 'created_at')
+    list_filter = ('event_type', 'source')
+    search_fields = ('user__username', 'idempotency_key')
+    ordering = ('created_at',)
@@ -0,0 +1,122 @@
+"""
+Incremental badge evaluation against cached, sorted arrays of badge thresholds
+(points for point badges, days for streak badges).
+"""
+from bisect import bisect_right
+
+from django.core.cache import cache
+
+from .models import Badge, LearningStreak, UserBadge, UserPoints
+
+BADGE_THRESHOLDS_CACHE_KEY = 'gamification:badge_thresholds:{}'
+THRESHOLD_FIELDS = {
+    'points': 'points_required',
+    'streak': 'streak_days_required',
+}
+
+
+def get_badge_thresholds(badge_type='points'):
+    """Return (thresholds, badge_ids): parallel lists sorted by the badge type's threshold."""
+    thresholds = cache.get(BADGE_THRESHOLDS_CACHE_KEY.format(badge_type))
+    if thresholds is None:
+        field = THRESHOLD_FIELDS[badge_type]
+        rows = list(
+            Badge.objects.filter(badge_type=badge_type, **{f'{field}__isnull': False})
+            .order_by(field, 'pk').values_list(field, 'pk')
+        )
+        thresholds = ([value for value, _ in rows], [pk for _, pk in rows])
+        cache.set(BADGE_THRESHOLDS_CACHE_KEY.format(badge_type), thresholds, None)
+    return thresholds
+
+
+def invalidate_badge_thresholds():
+    cache.delete_many([BADGE_THRESHOLDS_CACHE_KEY.format(badge_type) for badge_type in THRESHOLD_FIELDS])
+
+
+def badges_crossed(old_total, new_total, badge_type='points'):
+    """
+    Return the ids of badges whose threshold lies in (old_total, new_total].
+    A user starting from zero also crosses the zero-point badges.
+    """
+    points, badge_ids = get_badge_thresholds(badge_type)
+    low = bisect_right(points, old_total) if old_total > 0 else 0
+    high = bisect_right(points, new_total)
+    return badge_ids[low:high]
+
+
+def award_badges(user, badge_ids):
+    """Award badges in one insert, skipping any the user already holds."""
+    if badge_ids:
+        UserBadge.objects.bulk_create(
+            [UserBadge(user=user, badge_id=badge_id) for badge_id in badge_ids],
+            ignore_conflicts=True,
+        )
+    return badge_ids
+
+
+def evaluate_badges(user, old_total, new_total, badge_type='points'):
+    """
+    Award the badges crossed by moving from old_total to new_total.
+
+    Runs no queries unless a threshold was crossed (or the threshold cache is
+    cold). Badges added with thresholds below existing totals are not picked up
+    here; use check_badges for a full evaluation.
+    """
+    if new_total <= old_total:
+        return []
+    return award_badges(user, badges_crossed(old_total, new_total, badge_type))
+
+
+def _missing_badges(rows, thresholds, badge_ids=None):
+    """
+    Yield (user_id, badge_id) for every badge the (user_id, value) rows qualify
+    for, optionally limited to badge_ids.
+    """
+    values, threshold_badge_ids = thresholds
+    for user_id, value in rows:
+        for badge_id in threshold_badge_ids[:bisect_right(values, value)]:
+            if badge_ids is None or badge_id in badge_ids:
+                yield user_id, badge_id
+
+
+def backfill_badges(badge_type='points', badge_ids=None, chunk_size=1000, dry_run=False):
+    """
+    Award every badge of a type that users qualify for but do not hold.
+
+    Point totals (or longest streaks) are streamed in primary key order, one
+    chunk at a time; each chunk costs one query for the held badges and one
+    bulk insert. Yields (users_processed, badges_awarded) after each chunk.
+    """
+    invalidate_badge_thresholds()
+    thresholds = get_badge_thresholds(badge_type)
+    if badge_ids is not None:
+        badge_ids = set(badge_ids)
+    if badge_type == 'points':
+        queryset = UserPoints.objects.values_list('pk', 'user_id', 'total_points')
+    else:
+        queryset = LearningStreak.objects.values_list('pk', 'user_id', 'longest_streak')
+
+    processed = awarded = 0
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        held = set(
+            UserBadge.objects.filter(user_id__in=[user_id for _, user_id, _ in chunk]).values_list('user_id', 'badge_id')
+        )
+        missing = [
+            pair for pair in _missing_badges(((user_id, value) for _, user_id, value in chunk), thresholds, badge_ids)
+            if pair not in held
+        ]
+        if missing and not dry_run:
+            UserBadge.objects.bulk_create(
+                [UserBadge(user_id=user_id, badge_id=badge_id) for user_id, badge_id in missing],
+                ignore_conflicts=True,
+                batch_size=chunk_size,
+            )
+        processed += len(chunk)
+        awarded += len(missing)
+        yield processed, awarded
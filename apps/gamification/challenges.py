@@ -0,0 +1,106 @@
+"""
+Batch evaluation of DailyChallenge completions over StudentActivityLog.
+
+Each run works per challenge and time window: one grouped query finds every
+user with enough matching activity, completions are inserted in bulk, and
+their points are written to the ledger in one aggregated award.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.analytics.models import StudentActivityLog
+from .models import DailyChallenge, UserDailyChallenge
+from .utils import award_points_bulk
+
+EVALUATION_CHUNK_SIZE = 1000
+
+
+def challenge_window(challenge, day):
+    """
+    Return (start, end) dates of the window containing `day`, end exclusive.
+    "once" challenges have a single window covering everything up to `day`.
+    """
+    if challenge.frequency == 'daily':
+        return day, day + timedelta(days=1)
+    if challenge.frequency == 'weekly':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if challenge.frequency == 'monthly':
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    return None, day + timedelta(days=1)
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def qualifying_users(challenge, start, end):
+    """Ids of users with at least target_count matching activities in [start, end)."""
+    activity = StudentActivityLog.objects.filter(timestamp__lt=_aware(end))
+    if start is not None:
+        activity = activity.filter(timestamp__gte=_aware(start))
+    if challenge.activity_type:
+        activity = activity.filter(activity_type=challenge.activity_type)
+    return (
+        activity.values('student_id')
+        .annotate(activity_count=Count('id'))
+        .filter(activity_count__gte=max(challenge.target_count, 1))
+        .order_by('student_id')
+        .values_list('student_id', flat=True)
+    )
+
+
+def evaluate_challenge(challenge, day=None):
+    """
+    Record completions of a challenge for the window containing `day`.
+    Returns the number of new completions.
+    """
+    day = day or timezone.localdate()
+    start, end = challenge_window(challenge, day)
+    completed_date = start or day
+
+    completions = UserDailyChallenge.objects.filter(challenge=challenge)
+    if start is not None:
+        completions = completions.filter(completed_date=start)
+
+    created = 0
+    with transaction.atomic():
+        # Serializes runs for the same challenge, so a window is awarded once
+        DailyChallenge.objects.select_for_update().filter(pk=challenge.pk).first()
+        user_ids = list(
+            qualifying_users(challenge, start, end).exclude(student_id__in=completions.values('user_id'))
+        )
+        for offset in range(0, len(user_ids), EVALUATION_CHUNK_SIZE):
+            chunk = user_ids[offset:offset + EVALUATION_CHUNK_SIZE]
+            UserDailyChallenge.objects.bulk_create(
+                [UserDailyChallenge(user_id=user_id, challenge=challenge, completed_date=completed_date) for user_id in chunk],
+                ignore_conflicts=True,
+            )
+            award_points_bulk(
+                chunk,
+                challenge.points_award,
+                idempotency_prefix=f'challenge:{challenge.pk}:{completed_date.isoformat()}',
+                source='challenge',
+            )
+            created += len(chunk)
+    return created
+
+
+def evaluate_challenges(day=None):
+    """
+    Evaluate every active challenge for the current window, and for the
+    previous one when `day` starts a new window, so activity logged just
+    before a boundary is not missed. Returns {challenge slug: completions}.
+    """
+    day = day or timezone.localdate()
+    results = {}
+    for challenge in DailyChallenge.objects.filter(is_active=True):
+        days = [day]
+        if challenge.frequency != 'once' and challenge_window(challenge, day - timedelta(days=1))[0] != challenge_window(challenge, day)[0]:
+            days.insert(0, day - timedelta(days=1))
+        results[challenge.slug] = sum(evaluate_challenge(challenge, window_day) for window_day in days)
+    return results
@@ -0,0 +1,104 @@
+"""
+Gamification event outbox.
+
+Request handlers and signals only insert a GamificationEvent row. After the
+commit, at most one process_gamification_events run is dispatched per
+DRAIN_DEBOUNCE seconds, and the periodic beat entry drains whatever is left.
+The task applies pending events in batches grouped by user: one ledger insert
+and one total update per batch, one streak update and one badge evaluation
+per user. A failure to reach the broker is logged, never raised to the
+request that wrote the event.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import GamificationEvent, PointsTransaction
+from .streaks import record_activity_days
+from .utils import apply_points_entries
+
+EVENT_BATCH_SIZE = 500
+DRAIN_FLAG_CACHE_KEY = 'gamification:drain'
+DRAIN_DEBOUNCE = 5
+
+logger = logging.getLogger(__name__)
+
+
+def _dispatch_processing():
+    from .tasks import process_gamification_events
+
+    # Only the first event in a debounce window dispatches; the run drains the rest
+    if not cache.add(DRAIN_FLAG_CACHE_KEY, 1, DRAIN_DEBOUNCE):
+        return
+    try:
+        process_gamification_events.apply_async(retry=False)
+    except Exception:
+        logger.warning('Could not dispatch gamification processing; the periodic run will pick it up.', exc_info=True)
+
+
+def _schedule_processing():
+    transaction.on_commit(_dispatch_processing)
+
+
+def release_drain_flag():
+    """Let the next event dispatch a new run (called as a run starts draining)."""
+    cache.delete(DRAIN_FLAG_CACHE_KEY)
+
+
+def enqueue_points(user, amount, idempotency_key, source, course_id=None):
+    """Queue a points award; a pending award with the same key is ignored."""
+    try:
+        with transaction.atomic():
+            GamificationEvent.objects.create(
+                user=user,
+                event_type='points',
+                amount=amount,
+                source=source,
+                course_id=course_id,
+                idempotency_key=idempotency_key,
+            )
+    except IntegrityError:
+        return
+    _schedule_processing()
+
+
+def enqueue_activity(user, day):
+    """Queue an active day for the user's learning streak."""
+    GamificationEvent.objects.create(user=user, event_type='activity', activity_date=day)
+    _schedule_processing()
+
+
+def process_events(batch_size=EVENT_BATCH_SIZE):
+    """
+    Apply one batch of pending events and delete them.
+    Returns the number of events processed.
+    """
+    with transaction.atomic():
+        events = list(
+            GamificationEvent.objects.select_for_update(skip_locked=True)
+            .select_related('user').order_by('pk')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        apply_points_entries([
+            PointsTransaction(
+                user_id=event.user_id,
+                amount=event.amount,
+                source=event.source,
+                course_id=event.course_id,
+                idempotency_key=event.idempotency_key,
+            )
+            for event in events if event.event_type == 'points'
+        ])
+
+        activity = {}
+        for event in events:
+            if event.event_type == 'activity':
+                activity.setdefault(event.user, set()).add(event.activity_date)
+        for user, days in activity.items():
+            record_activity_days(user, days)
+
+        GamificationEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+    return len(events)
@@ -0,0 +1,386 @@
+"""
+Ranked leaderboards kept in sorted sets.
+
+Boards live in Redis sorted sets when LEADERBOARD_REDIS_URL is set, and in an
+in-process sorted index with the same interface otherwise (tests, local
+development). Top-N, rank and neighbour lookups are logarithmic in the board
+size. Boards:
+    global, course:<id>, weekly:<iso year>-W<week>, monthly:<year>-<month>
+
+A board that does not exist yet (first use, Redis flushed, process restarted)
+is seeded from the database on its first read; awards only increment boards
+that have already been seeded. Only one process seeds a board at a time, and
+awards recorded while its scores are being read are buffered and added once
+the seeded scores are in place, so none falls between the read and the swap. Awards are applied in the Celery worker, so an
+in-process board cannot see them from a web process: it is re-seeded from the
+database once it is LEADERBOARD_LOCAL_TTL seconds old.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, time, timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import PointsTransaction, UserPoints
+
+SCOPES = ('global', 'course', 'weekly', 'monthly')
+KEY_PREFIX = 'leaderboard:'
+# Period boards are kept for a while after their period ends, then expire
+PERIOD_BOARD_TTL = int(timedelta(days=100).total_seconds())
+# A seed that has not finished by then (e.g. its process died) can be retried
+SEED_LOCK_TTL = 60
+
+
+class InMemoryLeaderboardBackend:
+    """
+    Process-local stand-in for Redis sorted sets.
+
+    Each board keeps its entries sorted by (-score, user_id), so lookups are a
+    bisect. Updates shift the underlying list, which is fine for the board sizes
+    seen in tests and development. Other processes' awards never reach this
+    board, so a seeded board counts as unseeded once it is seed_ttl seconds
+    old and is rebuilt from the database on its next read.
+    """
+
+    def __init__(self, seed_ttl=None):
+        self._lock = threading.Lock()
+        self._boards = {}
+        self._seeded = {}
+        # Boards being seeded, with the awards buffered meanwhile: {key: {member: amount}}
+        self._seeding = {}
+        self.seed_ttl = seed_ttl
+
+    def _board(self, key):
+        return self._boards.setdefault(key, ([], {}))
+
+    def is_seeded(self, key):
+        seeded_at = self._seeded.get(key)
+        if seeded_at is None:
+            return False
+        return self.seed_ttl is None or monotonic() - seeded_at < self.seed_ttl
+
+    def begin_seed(self, key):
+        """Start seeding a board; False if it is already being seeded."""
+        with self._lock:
+            if key in self._seeding:
+                return False
+            self._seeding[key] = {}
+            return True
+
+    def abort_seed(self, key):
+        with self._lock:
+            self._seeding.pop(key, None)
+
+    def replace(self, key, scores, ttl=None):
+        """Install seeded scores plus any awards buffered while they were read."""
+        with self._lock:
+            scores = dict(scores)
+            for member, amount in self._seeding.pop(key, {}).items():
+                scores[member] = scores.get(member, 0) + amount
+            self._boards[key] = (sorted((-score, member) for member, score in scores.items()), scores)
+            self._seeded[key] = monotonic()
+
+    def _incr(self, key, member, amount):
+        entries, scores = self._board(key)
+        old = scores.get(member)
+        if old is not None:
+            del entries[bisect_left(entries, (-old, member))]
+        scores[member] = (old or 0) + amount
+        insort(entries, (-scores[member], member))
+
+    def incr(self, key, member, amount, ttl=None):
+        with self._lock:
+            self._incr(key, member, amount)
+
+    def add_award(self, key, member, amount, ttl=None):
+        """Buffer an award while the board is being seeded, else add it if the board was seeded."""
+        with self._lock:
+            if key in self._seeding:
+                buffered = self._seeding[key]
+                buffered[member] = buffered.get(member, 0) + amount
+            elif key in self._seeded:
+                self._incr(key, member, amount)
+
+    def range(self, key, start, stop):
+        """Return [(member, score)] for 0-based positions start..stop-1, best first."""
+        with self._lock:
+            entries, _ = self._board(key)
+            return [(member, -score) for score, member in entries[max(start, 0):stop]]
+
+    def rank(self, key, member):
+        """0-based position of member, or None if it is not on the board."""
+        with self._lock:
+            entries, scores = self._board(key)
+            if member not in scores:
+                return None
+            return bisect_left(entries, (-scores[member], member))
+
+    def score(self, key, member):
+        with self._lock:
+            return self._board(key)[1].get(member)
+
+    def count(self, key):
+        with self._lock:
+            return len(self._board(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+            self._seeded.clear()
+            self._seeding.clear()
+
+
+class RedisLeaderboardBackend:
+    """
+    Boards stored as Redis sorted sets (ZINCRBY / ZREVRANGE / ZREVRANK).
+
+    Seeding state lives next to each board: <key>:seeding is the seed lock,
+    <key>:pending a hash of awards buffered during the seed. Starting a seed,
+    recording an award and installing seeded scores are Lua scripts, so each
+    is atomic with respect to the others.
+    """
+
+    BEGIN_SEED = """
+        if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+            redis.call('DEL', KEYS[2])
+            return 1
+        end
+        return 0
+    """
+    ADD_AWARD = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+            redis.call('EXPIRE', KEYS[2], ARGV[4])
+        elseif redis.call('EXISTS', KEYS[3]) == 1 then
+            redis.call('ZINCRBY', KEYS[4], ARGV[2], ARGV[1])
+            if tonumber(ARGV[3]) > 0 then
+                redis.call('EXPIRE', KEYS[4], ARGV[3])
+            end
+        end
+    """
+    FINISH_SEED = """
+        redis.call('DEL', KEYS[2])
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            redis.call('RENAME', KEYS[1], KEYS[2])
+        end
+        local pending = redis.call('HGETALL', KEYS[3])
+        for i = 1, #pending, 2 do
+            redis.call('ZINCRBY', KEYS[2], pending[i + 1], pending[i])
+        end
+        redis.call('DEL', KEYS[3], KEYS[5])
+        redis.call('SET', KEYS[4], 1)
+        if tonumber(ARGV[1]) > 0 then
+            redis.call('EXPIRE', KEYS[2], ARGV[1])
+            redis.call('EXPIRE', KEYS[4], ARGV[1])
+        end
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._begin_seed = self._redis.register_script(self.BEGIN_SEED)
+        self._add_award = self._redis.register_script(self.ADD_AWARD)
+        self._finish_seed = self._redis.register_script(self.FINISH_SEED)
+
+    def _seeded_key(self, key):
+        return f'{KEY_PREFIX}{key}:seeded'
+
+    def _seeding_keys(self, key):
+        return f'{KEY_PREFIX}{key}:seeding', f'{KEY_PREFIX}{key}:pending'
+
+    def is_seeded(self, key):
+        return bool(self._redis.exists(self._seeded_key(key)))
+
+    def begin_seed(self, key):
+        return bool(self._begin_seed(keys=self._seeding_keys(key), args=[SEED_LOCK_TTL]))
+
+    def abort_seed(self, key):
+        self._redis.delete(*self._seeding_keys(key))
+
+    def replace(self, key, scores, ttl=None):
+        staging = f'{KEY_PREFIX}{key}:staging'
+        pipe = self._redis.pipeline()
+        pipe.delete(staging)
+        if scores:
+            pipe.zadd(staging, scores)
+        pipe.execute()
+        seeding, pending = self._seeding_keys(key)
+        self._finish_seed(
+            keys=[staging, KEY_PREFIX + key, pending, self._seeded_key(key), seeding], args=[ttl or 0],
+        )
+
+    def incr(self, key, member, amount, ttl=None):
+        pipe = self._redis.pipeline()
+        pipe.zincrby(KEY_PREFIX + key, amount, member)
+        if ttl:
+            pipe.expire(KEY_PREFIX + key, ttl)
+        pipe.execute()
+
+    def add_award(self, key, member, amount, ttl=None):
+        seeding, pending = self._seeding_keys(key)
+        self._add_award(
+            keys=[seeding, pending, self._seeded_key(key), KEY_PREFIX + key],
+            args=[member, amount, ttl or 0, SEED_LOCK_TTL],
+        )
+
+    def range(self, key, start, stop):
+        if stop <= start:
+            return []
+        rows = self._redis.zrevrange(KEY_PREFIX + key, max(start, 0), stop - 1, withscores=True)
+        return [(int(member), int(score)) for member, score in rows]
+
+    def rank(self, key, member):
+        return self._redis.zrevrank(KEY_PREFIX + key, member)
+
+    def score(self, key, member):
+        score = self._redis.zscore(KEY_PREFIX + key, member)
+        return None if score is None else int(score)
+
+    def count(self, key):
+        return self._redis.zcard(KEY_PREFIX + key)
+
+    def clear(self):
+        for key in self._redis.scan_iter(f'{KEY_PREFIX}*'):
+            self._redis.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = getattr(settings, 'LEADERBOARD_REDIS_URL', None)
+                if url:
+                    _backend = RedisLeaderboardBackend(url)
+                else:
+                    _backend = InMemoryLeaderboardBackend(seed_ttl=getattr(settings, 'LEADERBOARD_LOCAL_TTL', 30))
+    return _backend
+
+
+def _period_bounds(scope, when=None):
+    """Return the (start, end) datetimes of the week or month containing `when`."""
+    day = timezone.localdate(when)
+    if scope == 'weekly':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    else:
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    tz = timezone.get_current_timezone()
+    return timezone.make_aware(datetime.combine(start, time.min), tz), timezone.make_aware(datetime.combine(end, time.min), tz)
+
+
+def board_key(scope='global', course_id=None, when=None):
+    if scope == 'global':
+        return 'global'
+    if scope == 'course':
+        return f'course:{course_id}'
+    day = timezone.localdate(when)
+    if scope == 'weekly':
+        year, week, _ = day.isocalendar()
+        return f'weekly:{year}-W{week:02d}'
+    if scope == 'monthly':
+        return f'monthly:{day.year}-{day.month:02d}'
+    raise ValueError(f"Unknown leaderboard scope '{scope}'.")
+
+
+def _ttl(scope):
+    return PERIOD_BOARD_TTL if scope in ('weekly', 'monthly') else None
+
+
+def _load_scores(scope, course_id=None, when=None):
+    """Compute a board's scores from the database."""
+    if scope == 'global':
+        rows = UserPoints.objects.filter(total_points__gt=0).values_list('user_id', 'total_points')
+    else:
+        ledger = PointsTransaction.objects.all()
+        if scope == 'course':
+            ledger = ledger.filter(course_id=course_id)
+        else:
+            start, end = _period_bounds(scope, when)
+            # Opening balances carry totals from before the ledger existed
+            ledger = ledger.filter(created_at__gte=start, created_at__lt=end).exclude(idempotency_key__startswith='opening:')
+        rows = ledger.values_list('user_id').annotate(total=Sum('amount')).filter(total__gt=0)
+    return dict(rows)
+
+
+def rebuild_board(scope='global', course_id=None, when=None):
+    """
+    Replace a board with scores computed from the database, plus the awards
+    recorded while they were read. Returns False without doing anything if
+    another process is already seeding the board.
+    """
+    backend = get_backend()
+    key = board_key(scope, course_id, when)
+    if not backend.begin_seed(key):
+        return False
+    try:
+        scores = _load_scores(scope, course_id, when)
+    except BaseException:
+        backend.abort_seed(key)
+        raise
+    backend.replace(key, scores, ttl=_ttl(scope))
+    return True
+
+
+def _ensure_seeded(scope, course_id=None, when=None):
+    key = board_key(scope, course_id, when)
+    if not get_backend().is_seeded(key):
+        rebuild_board(scope, course_id, when)
+    return key
+
+
+def record_award(user_id, amount, course_id=None, when=None):
+    """Add an award to every board it counts towards. Call after the award has committed."""
+    backend = get_backend()
+    boards = [('global', None), ('weekly', None), ('monthly', None)]
+    if course_id is not None:
+        boards.append(('course', course_id))
+    for scope, board_course_id in boards:
+        backend.add_award(board_key(scope, board_course_id, when), user_id, amount, ttl=_ttl(scope))
+
+
+def _entries(rows, first_rank):
+    return [
+        {'rank': first_rank + offset, 'user_id': user_id, 'points': points}
+        for offset, (user_id, points) in enumerate(rows)
+    ]
+
+
+def top(scope='global', course_id=None, limit=20, when=None):
+    """Return the best `limit` entries as [{'rank', 'user_id', 'points'}]."""
+    key = _ensure_seeded(scope, course_id, when)
+    return _entries(get_backend().range(key, 0, limit), 1)
+
+
+def rank_of(user_id, scope='global', course_id=None, when=None):
+    """Return the user's {'rank', 'user_id', 'points'} entry, or None if they are not ranked."""
+    key = _ensure_seeded(scope, course_id, when)
+    backend = get_backend()
+    position = backend.rank(key, user_id)
+    if position is None:
+        return None
+    return {'rank': position + 1, 'user_id': user_id, 'points': backend.score(key, user_id)}
+
+
+def neighbors(user_id, scope='global', course_id=None, radius=2, when=None):
+    """Return the entries ranked within `radius` places of the user, including the user."""
+    key = _ensure_seeded(scope, course_id, when)
+    backend = get_backend()
+    position = backend.rank(key, user_id)
+    if position is None:
+        return []
+    start = max(position - radius, 0)
+    return _entries(backend.range(key, start, position + radius + 1), start + 1)
+
+
+def board_size(scope='global', course_id=None, when=None):
+    return get_backend().count(_ensure_seeded(scope, course_id, when))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.gamification.badges import THRESHOLD_FIELDS, backfill_badges
+from apps.gamification.models import Badge, LearningStreak, UserPoints
+
+
+class Command(BaseCommand):
+    help = 'Award badges that users qualify for but have not received (e.g. after adding a badge or lowering its threshold)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--badge',
+            action='append',
+            dest='badges',
+            metavar='SLUG',
+            help='Only backfill this badge (can be repeated)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be awarded without writing')
+
+    def handle(self, *args, **options):
+        badges = Badge.objects.all()
+        if options['badges']:
+            badges = badges.filter(slug__in=options['badges'])
+            missing = set(options['badges']) - set(badges.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown badge(s): {', '.join(sorted(missing))}")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        badge_ids = set(badges.values_list('pk', flat=True)) if options['badges'] else None
+        totals = {'points': UserPoints.objects.count(), 'streak': LearningStreak.objects.count()}
+        verb = 'Would award' if options['dry_run'] else 'Awarded'
+
+        for badge_type in THRESHOLD_FIELDS:
+            if not badges.filter(badge_type=badge_type).exists():
+                continue
+            self.stdout.write(f"Backfilling {badge_type} badges for {totals[badge_type]} users")
+            awarded = 0
+            for processed, awarded in backfill_badges(
+                badge_type, badge_ids=badge_ids, chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            ):
+                self.stdout.write(f"  {processed}/{totals[badge_type]} users, {awarded} badges")
+            self.stdout.write(self.style.SUCCESS(f"{verb} {awarded} {badge_type} badges"))
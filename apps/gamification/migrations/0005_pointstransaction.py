@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """Seed the ledger with each user's existing total so reconciliation keeps it."""
+    UserPoints = apps.get_model('gamification', 'UserPoints')
+    PointsTransaction = apps.get_model('gamification', 'PointsTransaction')
+
+    PointsTransaction.objects.bulk_create(
+        [
+            PointsTransaction(
+                user_id=user_id,
+                amount=total_points,
+                source='adjustment',
+                idempotency_key=f'opening:{user_id}',
+            )
+            for user_id, total_points in UserPoints.objects.filter(total_points__gt=0).values_list('user_id', 'total_points')
+        ],
+        batch_size=1000,
+    )
+
+    # Points for lessons completed so far are part of the opening balance;
+    # zero-amount rows claim their keys so completing them again awards nothing
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    PointsTransaction.objects.bulk_create(
+        [
+            PointsTransaction(
+                user_id=student_id,
+                amount=0,
+                source='lesson',
+                idempotency_key=f'lesson:{student_id}:{lesson_id}',
+            )
+            for student_id, lesson_id in LessonProgress.objects.filter(is_completed=True).values_list('student_id', 'lesson_id')
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0004_dailychallenge_userdailychallenge'),
+        ('courses', '0002_lessonprogress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('source', models.CharField(choices=[('lesson', 'Lesson Completed'), ('quiz', 'Quiz Submitted'), ('challenge', 'Challenge Completed'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='gamificatio_user_id_9393e2_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_plagiarismreport'),
+        ('gamification', '0005_pointstransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointstransaction',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_transactions', to='courses.course'),
+        ),
+    ]
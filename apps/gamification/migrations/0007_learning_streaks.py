@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0006_pointstransaction_course'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='badge_type',
+            field=models.CharField(choices=[('points', 'Points'), ('streak', 'Learning Streak')], default='points', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='badge',
+            name='streak_days_required',
+            field=models.PositiveIntegerField(blank=True, help_text='For streak badges: consecutive active days needed', null=True),
+        ),
+        migrations.CreateModel(
+            name='LearningStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('days', models.BinaryField(default=bytes)),
+                ('last_active_date', models.DateField()),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='learning_streak', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0007_learning_streaks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailychallenge',
+            name='activity_type',
+            field=models.CharField(blank=True, choices=[('lesson_view', 'Lesson Viewed'), ('lesson_complete', 'Lesson Completed'), ('quiz_attempt', 'Quiz Attempted'), ('assignment_submit', 'Assignment Submitted'), ('forum_post', 'Forum Post Created'), ('chat_message', 'Chat Message Sent'), ('video_join', 'Video Session Joined')], help_text='Leave blank to count any activity', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dailychallenge',
+            name='target_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='userdailychallenge',
+            name='completed_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
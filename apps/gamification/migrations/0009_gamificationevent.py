@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_plagiarismreport'),
+        ('gamification', '0008_daily_challenge_criteria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GamificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('points', 'Points Award'), ('activity', 'Activity Day')], max_length=10)),
+                ('amount', models.IntegerField(default=0)),
+                ('source', models.CharField(blank=True, choices=[('lesson', 'Lesson Completed'), ('quiz', 'Quiz Submitted'), ('challenge', 'Challenge Completed'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('idempotency_key', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('activity_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gamification_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -1,12 +1,20 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from apps.analytics.models import StudentActivityLog
 
 class Badge(models.Model):
+    BADGE_TYPES = [
+        ('points', 'Points'),
+        ('streak', 'Learning Streak'),
+    ]
     name = models.CharField(max_length=100)
     description = models.TextField()
     slug = models.SlugField(unique=True)
     icon = models.ImageField(upload_to='badges/', blank=True, null=True)
+    badge_type = models.CharField(max_length=10, choices=BADGE_TYPES, default='points')
     points_required = models.PositiveIntegerField(default=0)
+    streak_days_required = models.PositiveIntegerField(null=True, blank=True, help_text="For streak badges: consecutive active days needed")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -51,6 +59,9 @@ class DailyChallenge(models.Model):
     is_active = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, max_length=200)
     frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='daily')
+    # Completion criteria: at least target_count activities of this type in the window
+    activity_type = models.CharField(max_length=20, choices=StudentActivityLog.ACTIVITY_TYPES, blank=True, help_text="Leave blank to count any activity")
+    target_count = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -62,7 +73,8 @@ class DailyChallenge(models.Model):
 class UserDailyChallenge(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_challenges_completed')
     challenge = models.ForeignKey(DailyChallenge, on_delete=models.CASCADE, related_name='user_completions')
-    completed_date = models.DateField(auto_now_add=True) # Automatically set to today's date
+    # For weekly and monthly challenges this is the first day of the window completed
+    completed_date = models.DateField(default=timezone.localdate)
     is_completed = models.BooleanField(default=True) # Will always be true if an entry exists
 
     class Meta:
@@ -72,3 +84,68 @@ class UserDailyChallenge(models.Model):
 
     def __str__(self):
         return f"{self.user.username} completed {self.challenge.name} on {self.completed_date}"
+
+class PointsTransaction(models.Model):
+    """Append-only ledger of points awards. UserPoints.total_points is the running sum."""
+    SOURCE_CHOICES = [
+        ('lesson', 'Lesson Completed'),
+        ('quiz', 'Quiz Submitted'),
+        ('challenge', 'Challenge Completed'),
+        ('adjustment', 'Adjustment'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_transactions')
+    amount = models.IntegerField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    course = models.ForeignKey('courses.Course', on_delete=models.SET_NULL, null=True, blank=True, related_name='points_transactions')
+    # One row per source event, e.g. "lesson:<user>:<lesson>", so replays never award twice
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.amount:+d} pts ({self.get_source_display()})"
+
+class LearningStreak(models.Model):
+    """
+    A user's active days as a bitmap: bit i of `days` (little-endian) is set
+    if the user was active on start_date + i days.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='learning_streak')
+    start_date = models.DateField()
+    days = models.BinaryField(default=bytes)
+    last_active_date = models.DateField()
+    longest_streak = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - longest streak {self.longest_streak} days"
+
+class GamificationEvent(models.Model):
+    """
+    Outbox of pending gamification work, written on the request path and
+    applied in batches by the process_gamification_events task.
+    """
+    EVENT_TYPES = [
+        ('points', 'Points Award'),
+        ('activity', 'Activity Day'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='gamification_events')
+    event_type = models.CharField(max_length=10, choices=EVENT_TYPES)
+    amount = models.IntegerField(default=0)
+    source = models.CharField(max_length=20, choices=PointsTransaction.SOURCE_CHOICES, blank=True)
+    course = models.ForeignKey('courses.Course', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Ledger key for points events; duplicates of a pending award are dropped
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    activity_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['pk']
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} for {self.user.username}"
@@ -1,21 +1,34 @@
-from django.db.models.signals import post_save
+from django.db.models import Subquery
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.conf import settings
-from apps.courses.models import LessonProgress
-from .models import UserPoints
-from .utils import check_badges
+from django.utils import timezone
+from apps.analytics.models import StudentActivityLog
+from apps.courses.models import Lesson, LessonProgress
+from .badges import invalidate_badge_thresholds
+from .events import enqueue_activity, enqueue_points
+from .models import Badge
+
+LESSON_COMPLETION_POINTS = 10
 
 @receiver(post_save, sender=LessonProgress)
 def award_points_for_lesson(sender, instance, created, **kwargs):
     if instance.is_completed:
-        # Get or create UserPoints
-        user_points, _ = UserPoints.objects.get_or_create(user=instance.student)
-        
-        # Award 10 points for a lesson
-        # To avoid double counting, we might want to track if points were already awarded for this specific progress
-        # But for simplicity, we'll just add it.
-        
-        user_points.total_points += 10
-        user_points.save()
-        
-        check_badges(instance.student)
+        # Keyed per student and lesson, so re-saving or toggling a completed
+        # lesson never awards its points twice. The course is looked up by
+        # the event's INSERT rather than by loading the lesson here.
+        enqueue_points(
+            instance.student,
+            LESSON_COMPLETION_POINTS,
+            idempotency_key=f'lesson:{instance.student_id}:{instance.lesson_id}',
+            source='lesson',
+            course_id=Subquery(Lesson.objects.filter(pk=instance.lesson_id).values('course_id')[:1]),
+        )
+
+@receiver([post_save, post_delete], sender=Badge)
+def reset_badge_thresholds(sender, instance, **kwargs):
+    invalidate_badge_thresholds()
+
+@receiver(post_save, sender=StudentActivityLog)
+def update_learning_streak(sender, instance, created, **kwargs):
+    if created:
+        enqueue_activity(instance.student, timezone.localdate(instance.timestamp))
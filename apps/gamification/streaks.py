@@ -0,0 +1,88 @@
+"""
+Learning streaks computed from per-user day bitmaps.
+
+Each LearningStreak stores one bit per day since the user's first recorded
+activity, so a year of history is 46 bytes and streak lengths are a few
+integer bit operations instead of a scan over activity rows.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .badges import evaluate_badges
+from .models import LearningStreak
+
+
+def to_bitmap(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def from_bitmap(bitmap):
+    return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+
+def run_ending_at(bitmap, position):
+    """Length of the run of set bits ending at `position` (0 if that bit is clear)."""
+    if position < 0:
+        return 0
+    window = bitmap & ((1 << (position + 1)) - 1)
+    gaps = ~window & ((1 << (position + 1)) - 1)
+    return position - gaps.bit_length() + 1
+
+
+def run_starting_at(bitmap, position):
+    """Length of the run of set bits starting at `position` (0 if that bit is clear)."""
+    shifted = bitmap >> position
+    # ~x & (x + 1) isolates the lowest clear bit
+    return (~shifted & (shifted + 1)).bit_length() - 1
+
+
+def current_streak(streak, today=None):
+    """
+    Consecutive active days up to today. Today not being active yet does not
+    break the streak, so it counts back from yesterday in that case.
+    """
+    today = today or timezone.localdate()
+    bitmap = to_bitmap(streak.days)
+    position = (today - streak.start_date).days
+    if not bitmap >> position & 1:
+        position -= 1
+    return run_ending_at(bitmap, position)
+
+
+def record_activity_day(user, day=None):
+    """
+    Mark `day` as active for the user, update their longest streak and award
+    any streak badges it crosses. Returns the user's LearningStreak.
+    """
+    return record_activity_days(user, [day or timezone.localdate()])
+
+
+def record_activity_days(user, days):
+    """Mark several days as active for the user in one update. See record_activity_day."""
+    days = sorted(set(days))
+    with transaction.atomic():
+        streak, _ = LearningStreak.objects.select_for_update().get_or_create(
+            user=user,
+            defaults={'start_date': days[0], 'last_active_date': days[-1], 'days': b''},
+        )
+        bitmap = to_bitmap(streak.days)
+        if days[0] < streak.start_date:
+            bitmap <<= (streak.start_date - days[0]).days
+            streak.start_date = days[0]
+
+        old_bitmap = bitmap
+        old_longest = longest = streak.longest_streak
+        for day in days:
+            position = (day - streak.start_date).days
+            bitmap |= 1 << position
+            longest = max(longest, run_ending_at(bitmap, position) + run_starting_at(bitmap, position + 1))
+        if bitmap == old_bitmap and streak.days:
+            return streak
+
+        streak.longest_streak = longest
+        streak.days = from_bitmap(bitmap)
+        streak.last_active_date = max(streak.last_active_date, days[-1])
+        streak.save()
+
+    evaluate_badges(user, old_longest, streak.longest_streak, badge_type='streak')
+    return streak
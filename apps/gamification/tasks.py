@@ -0,0 +1,43 @@
+from celery import shared_task
+
+from . import leaderboard
+from .challenges import evaluate_challenges
+from .events import process_events, release_drain_flag
+from .utils import reconcile_points
+
+
+@shared_task
+def reconcile_points_ledger():
+    """
+    Periodic task to rebuild UserPoints totals from the points ledger,
+    correcting any drift.
+    """
+    corrected = reconcile_points()
+    if corrected:
+        leaderboard.rebuild_board('global')
+    return f"Reconciled points ledger, corrected {corrected} totals."
+
+
+@shared_task
+def evaluate_daily_challenges():
+    """
+    Periodic task to record daily challenge completions and award their points.
+    """
+    results = evaluate_challenges()
+    return f"Recorded {sum(results.values())} challenge completions."
+
+
+@shared_task
+def process_gamification_events(max_batches=20):
+    """
+    Apply pending gamification events (points, activity days) in batches.
+    Dispatched (debounced) after events are written, and periodically.
+    """
+    release_drain_flag()
+    processed = 0
+    for _ in range(max_batches):
+        count = process_events()
+        if not count:
+            break
+        processed += count
+    return f"Processed {processed} gamification events."
@@ -0,0 +1,565 @@
+from datetime import timedelta
+import io
+from importlib import import_module
+from unittest import mock
+from django.db import connection
+from django.apps import apps as django_apps
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from apps.analytics.utils import log_student_activity
+from apps.courses.models import Course, Lesson, LessonProgress
+from .models import Badge, UserBadge, UserPoints, PointsTransaction, LearningStreak, DailyChallenge, UserDailyChallenge, GamificationEvent
+from . import leaderboard
+from .events import enqueue_activity, enqueue_points, process_events
+from .challenges import challenge_window, evaluate_challenge, evaluate_challenges
+from .streaks import current_streak, record_activity_day, run_ending_at, run_starting_at
+from .badges import badges_crossed, evaluate_badges
+from .utils import award_points, check_badges, reconcile_points
+from .tasks import process_gamification_events, reconcile_points_ledger
+
+User = get_user_model()
+
+class PointsLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='ledgerstudent', password='password')
+        self.course = Course.objects.create(title='Ledger Course')
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson 1', content='Content')
+
+    def test_award_points_records_transaction_and_total(self):
+        self.assertTrue(award_points(self.student, 15, 'test:1', 'adjustment'))
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 15)
+        transaction = PointsTransaction.objects.get(idempotency_key='test:1')
+        self.assertEqual(transaction.amount, 15)
+        self.assertEqual(transaction.user, self.student)
+
+    def test_award_points_is_idempotent(self):
+        award_points(self.student, 15, 'test:1', 'adjustment')
+        self.assertFalse(award_points(self.student, 15, 'test:1', 'adjustment'))
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 15)
+        self.assertEqual(PointsTransaction.objects.filter(user=self.student).count(), 1)
+
+    def test_award_points_increments_existing_total(self):
+        UserPoints.objects.create(user=self.student, total_points=40)
+        award_points(self.student, 10, 'test:1', 'adjustment')
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 50)
+
+    def test_award_points_checks_badges(self):
+        badge = Badge.objects.create(name='Starter', description='First points', points_required=10)
+        award_points(self.student, 10, 'test:1', 'adjustment')
+        self.assertTrue(UserBadge.objects.filter(user=self.student, badge=badge).exists())
+
+    def test_lesson_completion_awarded_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            progress = LessonProgress.objects.create(student=self.student, lesson=self.lesson, is_completed=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            progress.save()
+            progress.is_completed = False
+            progress.save()
+            progress.is_completed = True
+            progress.save()
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 10)
+        self.assertEqual(PointsTransaction.objects.filter(user=self.student, source='lesson').count(), 1)
+
+    def test_lesson_completion_does_not_load_lesson(self):
+        progress = LessonProgress.objects.create(student=self.student, lesson=self.lesson, is_completed=False)
+        progress = LessonProgress.objects.get(pk=progress.pk)
+        progress.is_completed = True
+        with CaptureQueriesContext(connection) as queries:
+            progress.save()
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'courses_lesson' in q['sql']])
+        self.assertEqual(GamificationEvent.objects.get(user=self.student).course_id, self.lesson.course_id)
+
+    def test_lessons_in_opening_balance_are_not_awarded_again(self):
+        # A lesson completed before the ledger existed, with its points in the total
+        with self.captureOnCommitCallbacks(execute=False):
+            progress = LessonProgress.objects.create(student=self.student, lesson=self.lesson, is_completed=True)
+        GamificationEvent.objects.all().delete()
+        UserPoints.objects.create(user=self.student, total_points=10)
+        migration = import_module('apps.gamification.migrations.0005_pointstransaction')
+        migration.record_opening_balances(django_apps, None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            progress.is_completed = False
+            progress.save()
+            progress.is_completed = True
+            progress.save()
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 10)
+        self.assertEqual(reconcile_points(), 0)
+
+    def test_incomplete_lesson_awards_nothing(self):
+        LessonProgress.objects.create(student=self.student, lesson=self.lesson, is_completed=False)
+        self.assertFalse(PointsTransaction.objects.filter(user=self.student).exists())
+
+    def test_reconcile_repairs_drifted_totals(self):
+        other = User.objects.create_user(username='otherstudent', password='password')
+        award_points(self.student, 20, 'test:1', 'adjustment')
+        award_points(self.student, 5, 'test:2', 'adjustment')
+        award_points(other, 7, 'test:3', 'adjustment')
+        UserPoints.objects.filter(user=self.student).update(total_points=999)
+        UserPoints.objects.filter(user=other).delete()
+
+        self.assertEqual(reconcile_points(chunk_size=1), 2)
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 25)
+        self.assertEqual(UserPoints.objects.get(user=other).total_points, 7)
+        self.assertEqual(reconcile_points(), 0)
+
+    def test_reconcile_keeps_concurrent_award(self):
+        award_points(self.student, 20, 'test:1', 'adjustment')
+        raced = []
+
+        def award_elsewhere(execute, sql, params, many, context):
+            # An award commits while the reconcile is reading
+            if not raced and sql.startswith('SELECT') and 'gamification_userpoints' in sql:
+                raced.append(True)
+                award_points(self.student, 5, 'test:2', 'adjustment')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(award_elsewhere):
+            reconcile_points()
+        self.assertTrue(raced)
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 25)
+
+    def test_reconcile_task(self):
+        award_points(self.student, 20, 'test:1', 'adjustment')
+        UserPoints.objects.filter(user=self.student).update(total_points=0)
+        result = reconcile_points_ledger.delay().get()
+        self.assertIn('corrected 1', result)
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 20)
+
+
+class BadgeEvaluationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='badgestudent', password='password')
+        # Start from a known set of badges rather than the seeded ones
+        Badge.objects.all().delete()
+        self.welcome = Badge.objects.create(name='Welcome', slug='welcome', description='Joined', points_required=0)
+        self.bronze = Badge.objects.create(name='Bronze', slug='bronze', description='50 points', points_required=50)
+        self.silver = Badge.objects.create(name='Silver', slug='silver', description='100 points', points_required=100)
+
+    def _badges(self):
+        return set(UserBadge.objects.filter(user=self.student).values_list('badge__slug', flat=True))
+
+    def test_badges_crossed_between_totals(self):
+        self.assertEqual(badges_crossed(0, 10), [self.welcome.pk])
+        self.assertEqual(badges_crossed(10, 49), [])
+        self.assertEqual(badges_crossed(49, 50), [self.bronze.pk])
+        self.assertEqual(badges_crossed(40, 120), [self.bronze.pk, self.silver.pk])
+
+    def test_no_threshold_crossed_runs_no_queries(self):
+        badges_crossed(0, 1)  # warm the threshold cache
+        with self.assertNumQueries(0):
+            self.assertEqual(evaluate_badges(self.student, 10, 20), [])
+
+    def test_award_points_awards_crossed_badges(self):
+        award_points(self.student, 30, 'test:1', 'adjustment')
+        self.assertEqual(self._badges(), {'welcome'})
+        award_points(self.student, 80, 'test:2', 'adjustment')
+        self.assertEqual(self._badges(), {'welcome', 'bronze', 'silver'})
+
+    def test_already_held_badges_are_skipped(self):
+        UserBadge.objects.create(user=self.student, badge=self.bronze)
+        evaluate_badges(self.student, 0, 60)
+        self.assertEqual(UserBadge.objects.filter(user=self.student, badge=self.bronze).count(), 1)
+        self.assertEqual(self._badges(), {'welcome', 'bronze'})
+
+    def test_new_badge_invalidates_cached_thresholds(self):
+        badges_crossed(0, 1)
+        gold = Badge.objects.create(name='Gold', slug='gold', description='200 points', points_required=200)
+        self.assertEqual(badges_crossed(150, 200), [gold.pk])
+        gold.delete()
+        self.assertEqual(badges_crossed(150, 200), [])
+
+    def test_check_badges_full_evaluation(self):
+        UserPoints.objects.create(user=self.student, total_points=75)
+        check_badges(self.student)
+        self.assertEqual(self._badges(), {'welcome', 'bronze'})
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        leaderboard.get_backend().clear()
+        Badge.objects.all().delete()
+        self.course = Course.objects.create(title='Leaderboard Course')
+        self.users = [User.objects.create_user(username=f'player{i}', password='password') for i in range(5)]
+
+    def _award(self, user, amount, key, course=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(user, amount, key, 'adjustment', course=course)
+
+    def test_top_and_rank(self):
+        for i, user in enumerate(self.users):
+            self._award(user, (i + 1) * 10, f'test:{i}')
+        top = leaderboard.top(limit=3)
+        self.assertEqual([entry['user_id'] for entry in top], [self.users[4].pk, self.users[3].pk, self.users[2].pk])
+        self.assertEqual(top[0], {'rank': 1, 'user_id': self.users[4].pk, 'points': 50})
+        self.assertEqual(leaderboard.rank_of(self.users[0].pk)['rank'], 5)
+        self.assertIsNone(leaderboard.rank_of(User.objects.create_user(username='nobody').pk))
+
+    def test_awards_update_seeded_board(self):
+        self._award(self.users[0], 10, 'test:1')
+        self.assertEqual(leaderboard.top()[0]['user_id'], self.users[0].pk)
+        self._award(self.users[1], 30, 'test:2')
+        self._award(self.users[0], 25, 'test:3')
+        self.assertEqual(
+            [(entry['user_id'], entry['points']) for entry in leaderboard.top()],
+            [(self.users[0].pk, 35), (self.users[1].pk, 30)],
+        )
+
+    def test_board_seeded_from_database(self):
+        UserPoints.objects.create(user=self.users[2], total_points=70)
+        self.assertEqual(leaderboard.rank_of(self.users[2].pk), {'rank': 1, 'user_id': self.users[2].pk, 'points': 70})
+
+    def test_award_during_seed_is_not_lost(self):
+        self._award(self.users[0], 10, 'test:1')
+        load_scores = leaderboard._load_scores
+
+        def award_after_read(*args, **kwargs):
+            scores = load_scores(*args, **kwargs)
+            # An award commits after the scores were read but before they are installed
+            self._award(self.users[1], 25, 'test:2')
+            self.assertFalse(leaderboard.rebuild_board('global'))  # a second seed backs off
+            return scores
+
+        with mock.patch.object(leaderboard, '_load_scores', side_effect=award_after_read):
+            self.assertTrue(leaderboard.rebuild_board('global'))
+        self.assertEqual(
+            [(entry['user_id'], entry['points']) for entry in leaderboard.top()],
+            [(self.users[1].pk, 25), (self.users[0].pk, 10)],
+        )
+        self._award(self.users[0], 30, 'test:3')
+        self.assertEqual(leaderboard.rank_of(self.users[0].pk)['points'], 40)
+
+    def test_local_board_reseeds_after_ttl(self):
+        backend = leaderboard.get_backend()
+        if not isinstance(backend, leaderboard.InMemoryLeaderboardBackend):
+            self.skipTest('Only the in-process backend re-seeds on a timer.')
+        self._award(self.users[0], 10, 'test:1')
+        self.assertEqual(leaderboard.top()[0]['points'], 10)
+        # Another process applied this award, so it never reached this board
+        UserPoints.objects.filter(user=self.users[0]).update(total_points=60)
+        self.assertEqual(leaderboard.top()[0]['points'], 10)
+        with mock.patch.object(leaderboard, 'monotonic', return_value=leaderboard.monotonic() + backend.seed_ttl):
+            self.assertEqual(leaderboard.top()[0]['points'], 60)
+
+    def test_neighbors(self):
+        for i, user in enumerate(self.users):
+            self._award(user, (i + 1) * 10, f'test:{i}')
+        around = leaderboard.neighbors(self.users[2].pk, radius=1)
+        self.assertEqual([entry['rank'] for entry in around], [2, 3, 4])
+        self.assertEqual(around[1]['user_id'], self.users[2].pk)
+        self.assertEqual([entry['rank'] for entry in leaderboard.neighbors(self.users[4].pk, radius=1)], [1, 2])
+
+    def test_course_and_period_boards(self):
+        self._award(self.users[0], 40, 'test:1')
+        self._award(self.users[1], 15, 'test:2', course=self.course)
+        course_board = leaderboard.top('course', self.course.pk)
+        self.assertEqual([entry['user_id'] for entry in course_board], [self.users[1].pk])
+        self.assertEqual(leaderboard.board_size('weekly'), 2)
+        self.assertEqual(leaderboard.top('monthly')[0]['points'], 40)
+        next_month = timezone.now() + timedelta(days=40)
+        self.assertEqual(leaderboard.top('monthly', when=next_month), [])
+
+    def test_leaderboard_view_shows_own_rank(self):
+        self._award(self.users[3], 20, 'test:1')
+        self.client.login(username='player3', password='password')
+        response = self.client.get(reverse('leaderboard'), {'board': 'weekly'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['my_rank']['rank'], 1)
+        self.assertEqual(response.context['rankings'][0]['user'], self.users[3])
+        self.assertContains(response, 'Top learners this week')
+
+
+class LearningStreakTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Badge.objects.all().delete()
+        self.student = User.objects.create_user(username='streakstudent', password='password')
+        self.today = timezone.localdate()
+
+    def _days_ago(self, days):
+        return self.today - timedelta(days=days)
+
+    def test_bit_runs(self):
+        bitmap = 0b1101110
+        self.assertEqual(run_ending_at(bitmap, 3), 3)
+        self.assertEqual(run_ending_at(bitmap, 4), 0)
+        self.assertEqual(run_ending_at(bitmap, 6), 2)
+        self.assertEqual(run_starting_at(bitmap, 1), 3)
+        self.assertEqual(run_starting_at(bitmap, 4), 0)
+
+    def test_consecutive_days_build_streak(self):
+        for days in (3, 2, 1, 0):
+            streak = record_activity_day(self.student, self._days_ago(days))
+        self.assertEqual(streak.longest_streak, 4)
+        self.assertEqual(current_streak(streak, self.today), 4)
+        self.assertEqual(len(streak.days), 1)
+
+    def test_gap_resets_current_but_keeps_longest(self):
+        for days in (10, 9, 8, 2, 1):
+            streak = record_activity_day(self.student, self._days_ago(days))
+        self.assertEqual(streak.longest_streak, 3)
+        # Not active yet today: the streak still counts up to yesterday
+        self.assertEqual(current_streak(streak, self.today), 2)
+        self.assertEqual(current_streak(streak, self.today + timedelta(days=1)), 0)
+
+    def test_late_activity_joins_runs(self):
+        for days in (4, 3, 1, 0):
+            record_activity_day(self.student, self._days_ago(days))
+        streak = record_activity_day(self.student, self._days_ago(2))
+        self.assertEqual(streak.longest_streak, 5)
+
+    def test_activity_before_start_date_shifts_bitmap(self):
+        record_activity_day(self.student, self.today)
+        streak = record_activity_day(self.student, self._days_ago(1))
+        self.assertEqual(streak.start_date, self._days_ago(1))
+        self.assertEqual(current_streak(streak, self.today), 2)
+
+    def test_repeated_day_is_noop(self):
+        record_activity_day(self.student, self.today)
+        streak = record_activity_day(self.student, self.today)
+        self.assertEqual(streak.longest_streak, 1)
+
+    def test_streak_badges_awarded(self):
+        three = Badge.objects.create(name='Three Days', slug='three-days', description='3 day streak', badge_type='streak', streak_days_required=3)
+        week = Badge.objects.create(name='Week', slug='week', description='7 day streak', badge_type='streak', streak_days_required=7)
+        for days in (2, 1, 0):
+            record_activity_day(self.student, self._days_ago(days))
+        badges = set(UserBadge.objects.filter(user=self.student).values_list('badge_id', flat=True))
+        self.assertEqual(badges, {three.pk})
+        self.assertNotIn(week.pk, badges)
+
+    def test_streak_badges_ignored_by_points(self):
+        Badge.objects.create(name='Three Days', slug='three-days', description='3 day streak', badge_type='streak', streak_days_required=3)
+        award_points(self.student, 100, 'test:1', 'adjustment')
+        self.assertFalse(UserBadge.objects.filter(user=self.student).exists())
+
+    def test_activity_log_updates_streak(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_student_activity(self.student, 'lesson_view')
+        streak = LearningStreak.objects.get(user=self.student)
+        self.assertEqual(streak.last_active_date, self.today)
+        self.assertEqual(streak.longest_streak, 1)
+
+
+class DailyChallengeEvaluationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        leaderboard.get_backend().clear()
+        Badge.objects.all().delete()
+        self.today = timezone.localdate()
+        self.students = [User.objects.create_user(username=f'challenger{i}', password='password') for i in range(3)]
+        self.challenge = DailyChallenge.objects.create(
+            name='Two Lessons', slug='two-lessons', points_award=20,
+            frequency='daily', activity_type='lesson_complete', target_count=2,
+        )
+
+    def _log(self, student, activity_type='lesson_complete', days_ago=0):
+        log = log_student_activity(student, activity_type)
+        log.timestamp = timezone.now() - timedelta(days=days_ago)
+        log.save()
+
+    def test_windows(self):
+        monday = self.today - timedelta(days=self.today.weekday())
+        weekly = DailyChallenge(frequency='weekly')
+        self.assertEqual(challenge_window(weekly, monday + timedelta(days=3)), (monday, monday + timedelta(days=7)))
+        monthly = DailyChallenge(frequency='monthly')
+        start, end = challenge_window(monthly, self.today)
+        self.assertEqual(start, self.today.replace(day=1))
+        self.assertEqual(end.day, 1)
+        self.assertIsNone(challenge_window(DailyChallenge(frequency='once'), self.today)[0])
+
+    def test_qualifying_users_complete_and_earn_points(self):
+        self._log(self.students[0])
+        self._log(self.students[0])
+        self._log(self.students[1])
+        self._log(self.students[2], activity_type='forum_post')
+        self._log(self.students[2], activity_type='forum_post')
+
+        self.assertEqual(evaluate_challenge(self.challenge, self.today), 1)
+        completion = UserDailyChallenge.objects.get(challenge=self.challenge)
+        self.assertEqual(completion.user, self.students[0])
+        self.assertEqual(completion.completed_date, self.today)
+        self.assertEqual(UserPoints.objects.get(user=self.students[0]).total_points, 20)
+        self.assertFalse(UserPoints.objects.filter(user=self.students[2]).exists())
+
+    def test_reevaluation_does_not_duplicate(self):
+        self._log(self.students[0])
+        self._log(self.students[0])
+        evaluate_challenge(self.challenge, self.today)
+        self.assertEqual(evaluate_challenge(self.challenge, self.today), 0)
+        self.assertEqual(UserPoints.objects.get(user=self.students[0]).total_points, 20)
+        self.assertEqual(PointsTransaction.objects.filter(source='challenge').count(), 1)
+
+    def test_points_written_in_one_update(self):
+        for student in self.students:
+            self._log(student)
+            self._log(student)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(evaluate_challenge(self.challenge, self.today), 3)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "gamification_userpoints"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            sorted(UserPoints.objects.filter(user__in=self.students).values_list('total_points', flat=True)),
+            [20, 20, 20],
+        )
+
+    def test_once_challenge_completed_only_once(self):
+        once = DailyChallenge.objects.create(name='First Post', slug='first-post', points_award=5, frequency='once', activity_type='forum_post')
+        self._log(self.students[0], activity_type='forum_post', days_ago=3)
+        self.assertEqual(evaluate_challenge(once, self.today - timedelta(days=1)), 1)
+        self._log(self.students[0], activity_type='forum_post')
+        self.assertEqual(evaluate_challenge(once, self.today), 0)
+        self.assertEqual(UserPoints.objects.get(user=self.students[0]).total_points, 5)
+
+    def test_evaluate_challenges_catches_previous_window(self):
+        self._log(self.students[0], days_ago=1)
+        self._log(self.students[0], days_ago=1)
+        results = evaluate_challenges(self.today)
+        self.assertEqual(results['two-lessons'], 1)
+        completion = UserDailyChallenge.objects.get(challenge=self.challenge)
+        self.assertEqual(completion.completed_date, self.today - timedelta(days=1))
+
+    def test_inactive_challenges_skipped(self):
+        self.challenge.is_active = False
+        self.challenge.save()
+        self._log(self.students[0])
+        self._log(self.students[0])
+        self.assertEqual(evaluate_challenges(self.today), {})
+
+
+class BackfillBadgesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Badge.objects.all().delete()
+        self.users = [User.objects.create_user(username=f'backfill{i}', password='password') for i in range(5)]
+        for i, user in enumerate(self.users):
+            UserPoints.objects.create(user=user, total_points=i * 30)
+        self.bronze = Badge.objects.create(name='Bronze', slug='bronze', description='50 points', points_required=50)
+        self.silver = Badge.objects.create(name='Silver', slug='silver', description='100 points', points_required=100)
+
+    def _run(self, *args):
+        out = io.StringIO()
+        call_command('backfill_badges', *args, stdout=out)
+        return out.getvalue()
+
+    def test_awards_missing_badges(self):
+        UserBadge.objects.create(user=self.users[4], badge=self.bronze)
+        output = self._run('--chunk-size', '2')
+        self.assertIn('5/5 users', output)
+        self.assertIn('Awarded 3 points badges', output)
+        self.assertEqual(
+            set(UserBadge.objects.values_list('user__username', 'badge__slug')),
+            {('backfill2', 'bronze'), ('backfill3', 'bronze'), ('backfill4', 'bronze'), ('backfill4', 'silver')},
+        )
+
+    def test_queries_do_not_grow_per_user(self):
+        with CaptureQueriesContext(connection) as few_users:
+            self._run('--chunk-size', '100')
+        UserBadge.objects.all().delete()
+        for i in range(5, 15):
+            UserPoints.objects.create(user=User.objects.create_user(username=f'backfill{i}'), total_points=i * 30)
+        with self.assertNumQueries(len(few_users)):
+            self._run('--chunk-size', '100')
+
+    def test_single_badge_and_dry_run(self):
+        output = self._run('--badge', 'silver', '--dry-run')
+        self.assertIn('Would award 1 points badges', output)
+        self.assertFalse(UserBadge.objects.exists())
+        self._run('--badge', 'silver')
+        self.assertEqual(list(UserBadge.objects.values_list('badge__slug', flat=True)), ['silver'])
+
+    def test_streak_badges(self):
+        Badge.objects.create(name='Three Days', slug='three-days', description='3 day streak', badge_type='streak', streak_days_required=3)
+        LearningStreak.objects.create(user=self.users[0], start_date=timezone.localdate(), last_active_date=timezone.localdate(), days=b'\x07', longest_streak=3)
+        output = self._run('--badge', 'three-days')
+        self.assertIn('Awarded 1 streak badges', output)
+        self.assertTrue(UserBadge.objects.filter(user=self.users[0], badge__slug='three-days').exists())
+
+    def test_unknown_badge(self):
+        with self.assertRaises(CommandError):
+            self._run('--badge', 'nope')
+
+
+class GamificationEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Badge.objects.all().delete()
+        self.student = User.objects.create_user(username='eventstudent', password='password')
+        self.course = Course.objects.create(title='Event Course')
+        self.course.students.add(self.student)
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson 1', content='Content')
+
+    def test_lesson_toggle_only_writes_outbox(self):
+        self.client.login(username='eventstudent', password='password')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(reverse('courses:toggle_lesson_completion', args=[self.lesson.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UserPoints.objects.filter(user=self.student).exists())
+        self.assertEqual(
+            sorted(GamificationEvent.objects.values_list('event_type', flat=True)), ['activity', 'points'],
+        )
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 10)
+        self.assertTrue(LearningStreak.objects.filter(user=self.student).exists())
+        self.assertFalse(GamificationEvent.objects.exists())
+
+    def test_processing_dispatch_is_debounced(self):
+        with mock.patch.object(process_gamification_events, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(5):
+                    enqueue_points(self.student, 10, f'test:{i}', 'adjustment')
+                enqueue_activity(self.student, timezone.localdate())
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(GamificationEvent.objects.count(), 6)
+
+    def test_broker_failure_does_not_fail_request(self):
+        self.client.login(username='eventstudent', password='password')
+        with mock.patch.object(process_gamification_events, 'apply_async', side_effect=OSError('no broker')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('courses:toggle_lesson_completion', args=[self.lesson.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(GamificationEvent.objects.count(), 2)
+
+    def test_duplicate_pending_award_ignored(self):
+        enqueue_points(self.student, 10, 'lesson:1:1', 'lesson')
+        enqueue_points(self.student, 10, 'lesson:1:1', 'lesson')
+        self.assertEqual(GamificationEvent.objects.count(), 1)
+
+    def test_batch_groups_events_by_user(self):
+        other = User.objects.create_user(username='otherevent', password='password')
+        badge = Badge.objects.create(name='Fifty', slug='fifty', description='50 points', points_required=50)
+        for i in range(6):
+            enqueue_points(self.student, 10, f'test:{i}', 'adjustment', course_id=self.course.pk)
+        enqueue_points(other, 5, 'test:other', 'adjustment')
+        today = timezone.localdate()
+        enqueue_activity(self.student, today)
+        enqueue_activity(self.student, today - timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_events(), 9)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "gamification_pointstransaction"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 60)
+        self.assertEqual(UserPoints.objects.get(user=other).total_points, 5)
+        self.assertTrue(UserBadge.objects.filter(user=self.student, badge=badge).exists())
+        self.assertEqual(LearningStreak.objects.get(user=self.student).longest_streak, 2)
+        self.assertEqual(process_events(), 0)
+
+    def test_already_recorded_award_skipped(self):
+        award_points(self.student, 10, 'quiz:1', 'quiz')
+        enqueue_points(self.student, 10, 'quiz:1', 'quiz')
+        process_events()
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 10)
+        self.assertFalse(GamificationEvent.objects.exists())
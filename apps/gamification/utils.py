@@ -1,4 +1,174 @@
-from .models import UserPoints, Badge, UserBadge
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import leaderboard
+from .badges import award_badges, badges_crossed, evaluate_badges
+from .models import UserPoints, PointsTransaction
+
+
+def award_points(user, amount, idempotency_key, source, course=None):
+    """
+    Record a points award in the ledger and add it to the user's total.
+
+    The ledger row's unique idempotency key makes replays of the same event
+    a no-op, and the total is bumped with a single UPDATE using an F()
+    expression, so concurrent awards cannot overwrite each other. Leaderboards
+    are updated once the award has committed.
+    Returns True if the award was applied, False if it was already recorded.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                PointsTransaction.objects.create(
+                    user=user,
+                    amount=amount,
+                    source=source,
+                    course=course,
+                    idempotency_key=idempotency_key,
+                )
+        except IntegrityError:
+            return False
+
+        if not _increment_total(user.pk, amount):
+            UserPoints.objects.get_or_create(user=user)
+            _increment_total(user.pk, amount)
+        # The UPDATE holds the row lock, so this read sees exactly our increment
+        new_total = UserPoints.objects.filter(user_id=user.pk).values_list('total_points', flat=True).get()
+
+        course_id = course.pk if course is not None else None
+        transaction.on_commit(lambda: leaderboard.record_award(user.pk, amount, course_id))
+
+    evaluate_badges(user, new_total - amount, new_total)
+    return True
+
+
+def apply_points_entries(entries):
+    """
+    Apply many unsaved PointsTransaction entries in one aggregated write.
+
+    Entries whose idempotency key is already in the ledger (or repeated in
+    the batch) are dropped. The rest are inserted in bulk and each user's
+    total is bumped by their summed amount, with one UPDATE per distinct
+    amount. Call inside a transaction that serializes awards for the same
+    keys (e.g. holding a lock on the source rows).
+    Returns the entries that were applied.
+    """
+    recorded = set(
+        PointsTransaction.objects.filter(
+            idempotency_key__in=[entry.idempotency_key for entry in entries]
+        ).values_list('idempotency_key', flat=True)
+    )
+    applied = []
+    for entry in entries:
+        if entry.idempotency_key not in recorded:
+            recorded.add(entry.idempotency_key)
+            applied.append(entry)
+    if not applied:
+        return applied
+
+    per_user = {}
+    for entry in applied:
+        per_user[entry.user_id] = per_user.get(entry.user_id, 0) + entry.amount
+    users_by_amount = {}
+    for user_id, amount in per_user.items():
+        users_by_amount.setdefault(amount, []).append(user_id)
+
+    with transaction.atomic():
+        PointsTransaction.objects.bulk_create(applied, batch_size=1000)
+        UserPoints.objects.bulk_create(
+            [UserPoints(user_id=user_id) for user_id in per_user], ignore_conflicts=True, batch_size=1000,
+        )
+        now = timezone.now()
+        for amount, user_ids in users_by_amount.items():
+            UserPoints.objects.filter(user_id__in=user_ids).update(
+                total_points=F('total_points') + amount,
+                updated_at=now,
+            )
+        new_totals = list(UserPoints.objects.filter(user_id__in=per_user).select_related('user'))
+
+        def update_leaderboards():
+            for entry in applied:
+                leaderboard.record_award(entry.user_id, entry.amount, entry.course_id)
+        transaction.on_commit(update_leaderboards)
+
+    for user_points in new_totals:
+        amount = per_user[user_points.user_id]
+        evaluate_badges(user_points.user, user_points.total_points - amount, user_points.total_points)
+    return applied
+
+
+def award_points_bulk(user_ids, amount, idempotency_prefix, source, course=None):
+    """
+    Award the same amount to many users in one aggregated ledger write.
+
+    Each user's ledger key is "<idempotency_prefix>:<user_id>"; users whose
+    key is already recorded are skipped, and totals are bumped with a single
+    UPDATE. Returns the ids of the users who were awarded.
+    """
+    if amount <= 0:
+        return []
+    applied = apply_points_entries([
+        PointsTransaction(
+            user_id=user_id, amount=amount, source=source, course=course,
+            idempotency_key=f'{idempotency_prefix}:{user_id}',
+        )
+        for user_id in user_ids
+    ])
+    return [entry.user_id for entry in applied]
+
+
+def _increment_total(user_id, amount):
+    return UserPoints.objects.filter(user_id=user_id).update(
+        total_points=F('total_points') + amount,
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_points(chunk_size=1000):
+    """
+    Repair UserPoints totals that drifted from the sum of their ledger rows.
+
+    Totals are read before the ledger sums, and each correction is a
+    conditional UPDATE that only applies if the total is still the one
+    observed: an award committing in between changes the total, so the
+    stale sum is skipped (and checked again on the next run) instead of
+    overwriting the award's increment.
+    Returns the number of totals corrected.
+    """
+    corrected = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            PointsTransaction.objects.filter(user_id__gt=last_user_id)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()[:chunk_size]
+        )
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+
+        observed = dict(UserPoints.objects.filter(user_id__in=user_ids).values_list('user_id', 'total_points'))
+        expected = {
+            row['user_id']: max(row['total'], 0)
+            for row in PointsTransaction.objects.filter(user_id__in=user_ids)
+            .values('user_id').annotate(total=Sum('amount')).order_by()
+        }
+
+        now = timezone.now()
+        for user_id, total in expected.items():
+            if user_id in observed and observed[user_id] != total:
+                corrected += UserPoints.objects.filter(user_id=user_id, total_points=observed[user_id]).update(
+                    total_points=total,
+                    updated_at=now,
+                )
+        missing = [
+            UserPoints(user_id=user_id, total_points=total)
+            for user_id, total in expected.items() if user_id not in observed
+        ]
+        # If a concurrent award creates the row first, the insert is skipped and the next run rechecks it
+        corrected += len(UserPoints.objects.bulk_create(missing, ignore_conflicts=True))
+    return corrected
+
 
 def check_badges(user):
     """
@@ -6,11 +176,4 @@ def check_badges(user):
     and awards them if they don't already have them.
     """
     user_points, _ = UserPoints.objects.get_or_create(user=user)
-    
-    # Check for point-based badges
-    # We filter for badges the user qualifies for
-    badges = Badge.objects.filter(points_required__lte=user_points.total_points)
-    
-    for badge in badges:
-        # get_or_create ensures we don't award the same badge twice
-        UserBadge.objects.get_or_create(user=user, badge=badge)
+    return award_badges(user, badges_crossed(0, user_points.total_points))
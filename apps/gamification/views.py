@@ -1,11 +1,53 @@
 from django.views.generic import ListView
+from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import UserPoints
+from django.shortcuts import get_object_or_404
+from apps.courses.models import Course
+from . import leaderboard
+
+BOARD_TITLES = {
+    'global': 'Top learners of all time',
+    'weekly': 'Top learners this week',
+    'monthly': 'Top learners this month',
+    'course': 'Top learners in this course',
+}
 
 class LeaderboardView(LoginRequiredMixin, ListView):
-    model = UserPoints
     template_name = 'gamification/leaderboard.html'
     context_object_name = 'rankings'
+    top_size = 20
+
+    def get_board(self):
+        scope = self.request.GET.get('board', 'global')
+        if scope not in leaderboard.SCOPES:
+            scope = 'global'
+        course = None
+        if scope == 'course':
+            course_id = self.request.GET.get('course', '')
+            course = get_object_or_404(Course, pk=course_id) if course_id.isdigit() else None
+            if course is None:
+                scope = 'global'
+        return scope, course
+
+    def _with_users(self, entries):
+        users = get_user_model().objects.in_bulk([entry['user_id'] for entry in entries])
+        return [dict(entry, user=users[entry['user_id']]) for entry in entries if entry['user_id'] in users]
 
     def get_queryset(self):
-        return UserPoints.objects.select_related('user').order_by('-total_points')[:20]
+        self.scope, self.course = self.get_board()
+        self.course_id = self.course.pk if self.course else None
+        return self._with_users(leaderboard.top(self.scope, self.course_id, limit=self.top_size))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        my_rank = leaderboard.rank_of(self.request.user.pk, self.scope, self.course_id)
+        context['board'] = self.scope
+        context['course'] = self.course
+        context['board_title'] = BOARD_TITLES[self.scope]
+        context['my_rank'] = my_rank
+        # Users outside the top list see the learners just above and below them
+        if my_rank and my_rank['rank'] > self.top_size:
+            context['neighbors'] = self._with_users(
+                leaderboard.neighbors(self.request.user.pk, self.scope, self.course_id)
+            )
+        return context
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Quiz, Question, Choice, QuizSubmission, QuestionBank, QuizQuestionAttempt
+from .models import Quiz, Question, Choice, QuizSubmission, QuestionBank, QuizQuestionAttempt, QuestionStatistics, QuizStats
+from .tasks import run_item_analysis
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
@@ -14,6 +15,13 @@ class QuestionBankAdmin(admin.ModelAdmin):
     list_display = ('title', 'course')
     inlines = [QuestionInline]
     search_fields = ('title', 'course__title')
+    actions = ['analyze_items']
+
+    @admin.action(description='Run item analysis on selected question banks')
+    def analyze_items(self, request, queryset):
+        for bank in queryset:
+            run_item_analysis.delay(bank.pk)
+        self.message_user(request, f"Item analysis queued for {queryset.count()} question bank(s).")
 
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
@@ -48,3 +56,21 @@ class QuizQuestionAttemptAdmin(admin.ModelAdmin):
     list_display = ('submission', 'question', 'is_correct', 'points_earned')
     list_filter = ('submission__quiz', 'is_correct')
     search_fields = ('submission__student__username', 'question__text')
+
+@admin.register(QuestionStatistics)
+class QuestionStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'question_bank', 'attempts_count', 'p_value', 'discrimination', 'updated_at')
+    list_filter = ('question__question_bank',)
+    search_fields = ('question__text',)
+    ordering = ('p_value',)
+    readonly_fields = [field.name for field in QuestionStatistics._meta.fields]
+
+    @admin.display(description='Question bank')
+    def question_bank(self, obj):
+        return obj.question.question_bank
+
+@admin.register(QuizStats)
+class QuizStatsAdmin(admin.ModelAdmin):
+    list_display = ('quiz', 'submission_count', 'completed_count', 'mean_score', 'median_score', 'updated_at')
+    search_fields = ('quiz__title',)
+    readonly_fields = [field.name for field in QuizStats._meta.fields]
@@ -0,0 +1,169 @@
+"""
+Line-oriented import and export of question banks.
+
+JSONL: one question per line:
+    {"text": "...", "question_type": "multiple_choice",
+     "choices": [{"text": "...", "is_correct": true}, ...]}
+
+CSV: a header row, then one question per row:
+    text,question_type,correct,choice_1,choice_2,...
+where "correct" lists the 1-based positions of the correct choices
+separated by ";" (e.g. "2" or "1;3"), and essay rows leave it empty.
+"""
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Question, Choice
+
+FORMATS = ('jsonl', 'csv')
+QUESTION_TYPES = {value for value, _ in Question.QUESTION_TYPES}
+CHOICE_MAX_LENGTH = Choice._meta.get_field('text').max_length
+IMPORT_BATCH_SIZE = 1000
+
+
+def _validate(record, line_number):
+    """Check a parsed record and return it normalized, or raise ValidationError."""
+    if not isinstance(record, dict):
+        raise ValidationError(f"Line {line_number}: expected an object.")
+    text = str(record.get('text') or '').strip()
+    question_type = record.get('question_type') or 'multiple_choice'
+    choices = record.get('choices') or []
+
+    if not text:
+        raise ValidationError(f"Line {line_number}: question text is required.")
+    if not isinstance(question_type, str) or question_type not in QUESTION_TYPES:
+        raise ValidationError(f"Line {line_number}: unknown question type '{question_type}'.")
+    if not isinstance(choices, list):
+        raise ValidationError(f"Line {line_number}: choices must be a list.")
+
+    normalized = []
+    for choice in choices:
+        if not isinstance(choice, dict):
+            raise ValidationError(f"Line {line_number}: each choice must be an object.")
+        choice_text = str(choice.get('text') or '').strip()
+        if not choice_text:
+            raise ValidationError(f"Line {line_number}: choice text is required.")
+        if len(choice_text) > CHOICE_MAX_LENGTH:
+            raise ValidationError(f"Line {line_number}: choice text is longer than {CHOICE_MAX_LENGTH} characters.")
+        normalized.append({'text': choice_text, 'is_correct': bool(choice.get('is_correct'))})
+
+    if question_type == 'multiple_choice':
+        if len(normalized) < 2:
+            raise ValidationError(f"Line {line_number}: multiple choice questions need at least two choices.")
+        if not any(choice['is_correct'] for choice in normalized):
+            raise ValidationError(f"Line {line_number}: no correct choice given.")
+    elif normalized:
+        raise ValidationError(f"Line {line_number}: essay questions cannot have choices.")
+
+    return {'text': text, 'question_type': question_type, 'choices': normalized}
+
+
+def iter_jsonl_records(lines):
+    """Parse and validate JSONL lines one at a time."""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f"Line {line_number}: invalid JSON ({e.msg}).")
+        yield _validate(record, line_number)
+
+
+def iter_csv_records(lines):
+    """Parse and validate CSV rows one at a time, skipping the header row."""
+    reader = csv.reader(lines)
+    next(reader, None)
+    for row in reader:
+        line_number = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        row += [''] * (3 - len(row))
+        text, question_type, correct = row[0], row[1], row[2]
+        try:
+            correct_positions = {int(position) for position in correct.split(';') if position.strip()}
+        except ValueError:
+            raise ValidationError(f"Line {line_number}: 'correct' must list choice numbers separated by ';'.")
+        choices = [
+            {'text': choice_text, 'is_correct': position in correct_positions}
+            for position, choice_text in enumerate((cell for cell in row[3:] if cell.strip()), start=1)
+        ]
+        yield _validate({'text': text, 'question_type': question_type.strip(), 'choices': choices}, line_number)
+
+
+def _write_batch(question_bank, records):
+    questions = Question.objects.bulk_create([
+        Question(question_bank=question_bank, text=record['text'], question_type=record['question_type'])
+        for record in records
+    ])
+    Choice.objects.bulk_create([
+        Choice(question=question, text=choice['text'], is_correct=choice['is_correct'])
+        for question, record in zip(questions, records)
+        for choice in record['choices']
+    ], batch_size=IMPORT_BATCH_SIZE)
+    return len(questions)
+
+
+def import_question_bank(question_bank, lines, fmt='jsonl', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Stream questions from an iterable of text lines into a question bank.
+
+    Records are validated as they are read and written in batches with
+    bulk_create, so memory stays bounded by the batch size. The whole import
+    runs in one transaction: any invalid line rolls everything back.
+    Returns the number of questions created.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'.")
+    records = iter_jsonl_records(lines) if fmt == 'jsonl' else iter_csv_records(lines)
+
+    created = 0
+    with transaction.atomic():
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                created += _write_batch(question_bank, batch)
+                batch = []
+        if batch:
+            created += _write_batch(question_bank, batch)
+    return created
+
+
+def _iter_questions(question_bank, chunk_size=2000):
+    return question_bank.questions.order_by('pk').prefetch_related('choices').iterator(chunk_size=chunk_size)
+
+
+def _csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+def export_question_bank(question_bank, fmt='jsonl'):
+    """Yield the question bank as JSONL or CSV lines without loading it all into memory."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'.")
+
+    if fmt == 'csv':
+        max_choices = question_bank.questions.annotate(
+            num_choices=Count('choices')
+        ).aggregate(max_choices=Max('num_choices'))['max_choices'] or 0
+        yield _csv_line(['text', 'question_type', 'correct'] + [f'choice_{i}' for i in range(1, max_choices + 1)])
+
+    for question in _iter_questions(question_bank):
+        choices = list(question.choices.all())
+        if fmt == 'jsonl':
+            yield json.dumps({
+                'text': question.text,
+                'question_type': question.question_type,
+                'choices': [{'text': choice.text, 'is_correct': choice.is_correct} for choice in choices],
+            }) + '\n'
+        else:
+            correct = ';'.join(str(position) for position, choice in enumerate(choices, start=1) if choice.is_correct)
+            yield _csv_line([question.text, question.question_type, correct] + [choice.text for choice in choices])
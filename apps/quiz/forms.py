@@ -1,6 +1,6 @@
 from django import forms
-from django.utils import timezone
 from .models import Question, Choice, QuizQuestionAttempt
+from .utils import grade_submission
 
 class QuizTakeForm(forms.Form):
     def __init__(self, *args, **kwargs):
@@ -29,37 +29,14 @@ class QuizTakeForm(forms.Form):
 
     def save(self, submission, question_attempts):
         """
-        Process the form data, save attempts, and calculate the score for MCQs.
-        Returns the score.
+        Grade the cleaned answers and mark the submission as completed.
+        Returns the MCQ score, or None if the submission was already graded.
         """
-        score = 0
-        cleaned_data = self.cleaned_data
-
-        for attempt in question_attempts:
-            question = attempt.question
-            field_name = f'question_{question.id}'
-            answer = cleaned_data.get(field_name)
-
-            if not answer:
-                continue
-
-            if question.question_type == 'multiple_choice':
-                attempt.selected_choice = answer
-                if answer.is_correct:
-                    score += 1
-                    attempt.is_correct = True
-                else:
-                    attempt.is_correct = False
-            elif question.question_type == 'essay':
-                attempt.essay_answer = answer
-            
-            attempt.save()
-
-        # Update submission score and end time
-        submission.mcq_score = score
-        submission.end_time = timezone.now()
-        submission.save()
-        return score
+        answers = {
+            name: value.pk if isinstance(value, Choice) else value
+            for name, value in self.cleaned_data.items()
+        }
+        return grade_submission(submission, answers, question_attempts=list(question_attempts))
 
 class EssayGradeForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,208 @@
+"""
+Item analysis for question banks: difficulty (p-value), point-biserial
+discrimination and distractor frequencies for multiple choice questions.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Choice, QuestionBankAnalysis, QuestionStatistics, QuizQuestionAttempt, QuizSubmission
+
+# Submissions completed within this window are left for the next run, so a
+# grading transaction that has not committed yet is not skipped for good.
+SETTLE_DELAY = timedelta(minutes=1)
+SUBMISSION_CHUNK_SIZE = 5000
+
+
+def build_response_matrix(rows):
+    """
+    Turn (submission_id, question_id, choice_id, is_correct) rows into dense arrays.
+
+    Returns (question_ids, attempted, correct, choice_ids) where attempted and
+    correct are student x question matrices.
+    """
+    data = np.array(
+        [(sub, q, choice or 0, 1 if is_correct else 0) for sub, q, choice, is_correct in rows],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    submission_ids, student_idx = np.unique(data[:, 0], return_inverse=True)
+    question_ids, question_idx = np.unique(data[:, 1], return_inverse=True)
+
+    shape = (len(submission_ids), len(question_ids))
+    attempted = np.zeros(shape, dtype=np.float64)
+    correct = np.zeros(shape, dtype=np.float64)
+    attempted[student_idx, question_idx] = 1.0
+    correct[student_idx, question_idx] = data[:, 3]
+    return question_ids, attempted, correct, data[:, 2]
+
+
+def accumulate(attempted, correct):
+    """
+    Compute per-question sufficient statistics for a chunk of students.
+
+    Each student's score is their proportion of correct answers, so students
+    who drew different subsets of the bank remain comparable.
+    """
+    items_per_student = attempted.sum(axis=1)
+    scores = np.divide(
+        correct.sum(axis=1), items_per_student,
+        out=np.zeros_like(items_per_student), where=items_per_student > 0,
+    )
+    return {
+        'attempts_count': attempted.sum(axis=0),
+        'correct_count': correct.sum(axis=0),
+        'score_sum': scores @ attempted,
+        'score_sq_sum': (scores * scores) @ attempted,
+        'correct_score_sum': scores @ correct,
+    }
+
+
+def finalize(n, n_correct, score_sum, score_sq_sum, correct_score_sum):
+    """Derive p-values and point-biserial discrimination from the running sums."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = n_correct / n
+        mean = score_sum / n
+        std = np.sqrt(np.maximum(score_sq_sum / n - mean * mean, 0.0))
+        mean_correct = correct_score_sum / n_correct
+        mean_incorrect = (score_sum - correct_score_sum) / (n - n_correct)
+        r_pb = (mean_correct - mean_incorrect) / std * np.sqrt(p * (1 - p))
+
+    p = np.where(n > 0, p, np.nan)
+    # Discrimination is undefined if everyone (or no one) got it right, or scores don't vary
+    valid = (n_correct > 0) & (n_correct < n) & (std > 1e-12)
+    r_pb = np.where(valid, r_pb, np.nan)
+    return p, r_pb
+
+
+def _to_optional_float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def analyze_question_bank(question_bank, now=None):
+    """
+    Fold submissions completed since the last run into the bank's question statistics.
+    Returns the number of newly analyzed submissions.
+    """
+    now = now or timezone.now()
+    cutoff = now - SETTLE_DELAY
+
+    with transaction.atomic():
+        analysis, _ = QuestionBankAnalysis.objects.select_for_update().get_or_create(question_bank=question_bank)
+        submissions = QuizSubmission.objects.filter(
+            quiz__question_bank=question_bank,
+            end_time__isnull=False,
+            end_time__lte=cutoff,
+        )
+        if analysis.analyzed_through:
+            submissions = submissions.filter(end_time__gt=analysis.analyzed_through)
+        submission_ids = list(submissions.order_by('pk').values_list('pk', flat=True))
+
+        totals = {}
+        choice_counts = {}
+        for start in range(0, len(submission_ids), SUBMISSION_CHUNK_SIZE):
+            rows = list(
+                QuizQuestionAttempt.objects.filter(
+                    submission_id__in=submission_ids[start:start + SUBMISSION_CHUNK_SIZE],
+                    question__question_type='multiple_choice',
+                ).values_list('submission_id', 'question_id', 'selected_choice_id', 'is_correct')
+            )
+            if not rows:
+                continue
+            question_ids, attempted, correct, choice_ids = build_response_matrix(rows)
+            chunk = accumulate(attempted, correct)
+            for i, question_id in enumerate(question_ids.tolist()):
+                entry = totals.setdefault(question_id, dict.fromkeys(chunk, 0.0))
+                for key, values in chunk.items():
+                    entry[key] += float(values[i])
+
+            # Distractor frequencies: count every selected choice in one vectorized pass
+            selected = choice_ids[choice_ids > 0]
+            for choice_id, count in zip(*np.unique(selected, return_counts=True)):
+                choice_counts[int(choice_id)] = choice_counts.get(int(choice_id), 0) + int(count)
+
+        if totals:
+            _merge_statistics(totals, choice_counts)
+
+        analysis.analyzed_through = cutoff
+        analysis.submissions_analyzed += len(submission_ids)
+        analysis.save()
+    return len(submission_ids)
+
+
+def _merge_statistics(totals, choice_counts):
+    """Add the new sums to the stored statistics and recompute the derived values."""
+    question_ids = list(totals)
+    existing = QuestionStatistics.objects.in_bulk(question_ids, field_name='question_id')
+    stats = [existing.get(qid) or QuestionStatistics(question_id=qid) for qid in question_ids]
+
+    counts_by_question = {}
+    for choice_id, question_id in Choice.objects.filter(pk__in=choice_counts).values_list('pk', 'question_id'):
+        counts_by_question.setdefault(question_id, {})[str(choice_id)] = choice_counts[choice_id]
+
+    for stat in stats:
+        entry = totals[stat.question_id]
+        stat.attempts_count += int(entry['attempts_count'])
+        stat.correct_count += int(entry['correct_count'])
+        stat.score_sum += entry['score_sum']
+        stat.score_sq_sum += entry['score_sq_sum']
+        stat.correct_score_sum += entry['correct_score_sum']
+        counts = dict(stat.choice_counts or {})
+        for choice_id, count in counts_by_question.get(stat.question_id, {}).items():
+            counts[choice_id] = counts.get(choice_id, 0) + count
+        stat.choice_counts = counts
+
+    p_values, discrimination = finalize(
+        np.array([s.attempts_count for s in stats], dtype=np.float64),
+        np.array([s.correct_count for s in stats], dtype=np.float64),
+        np.array([s.score_sum for s in stats]),
+        np.array([s.score_sq_sum for s in stats]),
+        np.array([s.correct_score_sum for s in stats]),
+    )
+    for stat, p, r in zip(stats, p_values, discrimination):
+        stat.p_value = _to_optional_float(p)
+        stat.discrimination = _to_optional_float(r)
+
+    existing_stats = [s for s in stats if s.pk is not None]
+    # bulk_update() skips auto_now, so stamp the rows it rewrites
+    now = timezone.now()
+    for stat in existing_stats:
+        stat.updated_at = now
+    QuestionStatistics.objects.bulk_create([s for s in stats if s.pk is None])
+    QuestionStatistics.objects.bulk_update(
+        existing_stats,
+        ['attempts_count', 'correct_count', 'score_sum', 'score_sq_sum', 'correct_score_sum',
+         'choice_counts', 'p_value', 'discrimination', 'updated_at'],
+    )
+
+
+def item_analysis_report(question_bank):
+    """Serialize the stored statistics of a bank for the JSON endpoint."""
+    questions = question_bank.questions.filter(
+        question_type='multiple_choice'
+    ).select_related('statistics').prefetch_related('choices')
+
+    report = []
+    for question in questions:
+        stat = getattr(question, 'statistics', None)
+        counts = stat.choice_counts if stat else {}
+        attempts = stat.attempts_count if stat else 0
+        report.append({
+            'question_id': question.id,
+            'text': question.text,
+            'attempts': attempts,
+            'p_value': stat.p_value if stat else None,
+            'discrimination': stat.discrimination if stat else None,
+            'choices': [
+                {
+                    'choice_id': choice.id,
+                    'text': choice.text,
+                    'is_correct': choice.is_correct,
+                    'count': counts.get(str(choice.id), 0),
+                    'frequency': round(counts.get(str(choice.id), 0) / attempts, 4) if attempts else None,
+                }
+                for choice in question.choices.all()
+            ],
+        })
+    return report
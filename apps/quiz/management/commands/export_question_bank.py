@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.quiz.bank_io import FORMATS, export_question_bank
+from apps.quiz.models import QuestionBank
+
+
+class Command(BaseCommand):
+    help = 'Export a question bank as JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_bank_id', type=int)
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--output', help='File to write (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            bank = QuestionBank.objects.get(pk=options['question_bank_id'])
+        except QuestionBank.DoesNotExist:
+            raise CommandError(f"Question bank {options['question_bank_id']} does not exist")
+
+        output = options['output']
+        f = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+        try:
+            for line in export_question_bank(bank, fmt=options['format']):
+                f.write(line)
+        finally:
+            if output:
+                f.close()
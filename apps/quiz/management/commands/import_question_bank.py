@@ -0,0 +1,44 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from apps.quiz.bank_io import FORMATS, import_question_bank
+from apps.quiz.models import QuestionBank
+
+
+class Command(BaseCommand):
+    help = 'Import questions into a question bank from a JSONL or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_bank_id', type=int)
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format (defaults to the file extension)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            bank = QuestionBank.objects.get(pk=options['question_bank_id'])
+        except QuestionBank.DoesNotExist:
+            raise CommandError(f"Question bank {options['question_bank_id']} does not exist")
+
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}; pass --format")
+
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as f:
+            try:
+                created = import_question_bank(bank, f, fmt=fmt, batch_size=options['batch_size'])
+            except ValidationError as e:
+                raise CommandError(f"Import aborted, nothing was saved. {' '.join(e.messages)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {created} questions into '{bank.title}' in {time.monotonic() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_remove_quizsubmission_questions_quiz_due_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='is_published',
+            field=models.BooleanField(default=False, help_text='If checked, this quiz will be visible to students.'),
+        ),
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='draft_answers',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='draft_saved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
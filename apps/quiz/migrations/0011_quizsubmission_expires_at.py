@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_quizsubmission_draft_answers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='auto_submitted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, help_text='Deadline computed from start time and quiz duration', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizsubmission',
+            index=models.Index(condition=models.Q(('end_time__isnull', True)), fields=['expires_at'], name='quiz_submission_open_expiry'),
+        ),
+    ]
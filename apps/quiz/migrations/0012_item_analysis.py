@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_quizsubmission_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionBankAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analyzed_through', models.DateTimeField(blank=True, help_text='Submissions completed up to this time are included', null=True)),
+                ('submissions_analyzed', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question_bank', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='quiz.questionbank')),
+            ],
+            options={
+                'verbose_name_plural': 'question bank analyses',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts_count', models.PositiveIntegerField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0, help_text="Sum of attempting students' quiz scores (0-1)")),
+                ('score_sq_sum', models.FloatField(default=0.0)),
+                ('correct_score_sum', models.FloatField(default=0.0, help_text='Sum of quiz scores of students who answered correctly')),
+                ('choice_counts', models.JSONField(blank=True, default=dict, help_text='Selections per choice: {choice_id: count}')),
+                ('p_value', models.FloatField(blank=True, help_text='Difficulty: proportion of correct answers', null=True)),
+                ('discrimination', models.FloatField(blank=True, help_text='Point-biserial correlation with quiz score', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='quiz.question')),
+            ],
+            options={
+                'verbose_name_plural': 'question statistics',
+                'ordering': ['p_value'],
+            },
+        ),
+    ]
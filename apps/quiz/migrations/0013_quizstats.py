@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_item_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submission_count', models.PositiveIntegerField(default=0, help_text='Submissions started')),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.PositiveBigIntegerField(default=0)),
+                ('score_histogram', models.JSONField(blank=True, default=dict, help_text='Completed submissions per total score: {score: count}')),
+                ('mean_score', models.FloatField(blank=True, null=True)),
+                ('median_score', models.FloatField(blank=True, null=True)),
+                ('top_scores', models.JSONField(blank=True, default=list, help_text='Best completed submissions, highest first')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quiz.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'quiz stats',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.courses.models import Course
 
 class QuestionBank(models.Model):
@@ -66,13 +67,27 @@ class QuizSubmission(models.Model):
     total_questions = models.PositiveIntegerField()
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Deadline computed from start time and quiz duration")
+    auto_submitted = models.BooleanField(default=False)
+
+    # Autosaved answers: {"question_<id>": "<choice id or essay text>"}
+    draft_answers = models.JSONField(default=dict, blank=True)
+    draft_saved_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            # Lets the expiry sweep find open sessions past their deadline cheaply
+            models.Index(fields=['expires_at'], condition=models.Q(end_time__isnull=True), name='quiz_submission_open_expiry'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.quiz.title}"
 
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and timezone.now() >= self.expires_at
+
 class QuizQuestionAttempt(models.Model):
     submission = models.ForeignKey(QuizSubmission, on_delete=models.CASCADE, related_name='question_attempts')
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='attempts')
@@ -87,3 +102,69 @@ class QuizQuestionAttempt(models.Model):
 
     def __str__(self):
         return f"{self.submission.student.username}'s attempt on {self.question.text[:50]}"
+
+
+class QuestionBankAnalysis(models.Model):
+    """Tracks how far item analysis has progressed through a bank's submissions."""
+    question_bank = models.OneToOneField(QuestionBank, on_delete=models.CASCADE, related_name='analysis')
+    analyzed_through = models.DateTimeField(null=True, blank=True, help_text="Submissions completed up to this time are included")
+    submissions_analyzed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name_plural = 'question bank analyses'
+
+    def __str__(self):
+        return f"Analysis of {self.question_bank.title}"
+
+
+class QuestionStatistics(models.Model):
+    """
+    Item analysis for a multiple choice question.
+
+    The running sums are sufficient statistics, so new submissions can be
+    folded in without re-reading older attempts.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='statistics')
+    attempts_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0, help_text="Sum of attempting students' quiz scores (0-1)")
+    score_sq_sum = models.FloatField(default=0.0)
+    correct_score_sum = models.FloatField(default=0.0, help_text="Sum of quiz scores of students who answered correctly")
+    choice_counts = models.JSONField(default=dict, blank=True, help_text="Selections per choice: {choice_id: count}")
+    p_value = models.FloatField(null=True, blank=True, help_text="Difficulty: proportion of correct answers")
+    discrimination = models.FloatField(null=True, blank=True, help_text="Point-biserial correlation with quiz score")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['p_value']
+        verbose_name_plural = 'question statistics'
+
+    def __str__(self):
+        return f"Statistics for {self.question}"
+
+
+class QuizStats(models.Model):
+    """
+    Materialized results summary for a quiz.
+
+    Updated incrementally as submissions are completed and essays graded, so
+    quiz pages read one row instead of aggregating every submission.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name='stats')
+    submission_count = models.PositiveIntegerField(default=0, help_text="Submissions started")
+    completed_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveBigIntegerField(default=0)
+    score_histogram = models.JSONField(default=dict, blank=True, help_text="Completed submissions per total score: {score: count}")
+    mean_score = models.FloatField(null=True, blank=True)
+    median_score = models.FloatField(null=True, blank=True)
+    top_scores = models.JSONField(default=list, blank=True, help_text="Best completed submissions, highest first")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name_plural = 'quiz stats'
+
+    def __str__(self):
+        return f"Stats for {self.quiz.title}"
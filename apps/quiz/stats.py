@@ -0,0 +1,149 @@
+"""
+Incremental maintenance of QuizStats, the per-quiz results summary.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import QuizStats, QuizSubmission
+
+LEADERBOARD_SIZE = getattr(settings, 'QUIZ_LEADERBOARD_SIZE', 10)
+
+
+def _median_from_histogram(histogram, count):
+    """Median of the scores described by a {score: count} histogram."""
+    if not count:
+        return None
+    middle = [(count - 1) // 2, count // 2]
+    values = []
+    seen = 0
+    for score in sorted(histogram, key=int):
+        seen += histogram[score]
+        while middle and middle[0] < seen:
+            values.append(int(score))
+            middle.pop(0)
+        if not middle:
+            break
+    return sum(values) / 2
+
+
+def _leaderboard_entry(submission):
+    return {
+        'submission_id': submission.pk,
+        'student_id': submission.student_id,
+        'username': submission.student.username,
+        'score': submission.total_score,
+        'end_time': submission.end_time.isoformat(),
+    }
+
+
+def _place_in_leaderboard(stats, submission):
+    """Insert or refresh a submission's entry in the top-N list."""
+    entries = [entry for entry in stats.top_scores if entry['submission_id'] != submission.pk]
+    entries.append(_leaderboard_entry(submission))
+    entries.sort(key=lambda entry: (-entry['score'], entry['end_time']))
+    stats.top_scores = entries[:LEADERBOARD_SIZE]
+
+
+def _top_scores(quiz):
+    completed = QuizSubmission.objects.filter(quiz=quiz, end_time__isnull=False).select_related('student')
+    return [
+        _leaderboard_entry(submission)
+        for submission in completed.order_by('-total_score', 'end_time')[:LEADERBOARD_SIZE]
+    ]
+
+
+def _refresh_derived(stats):
+    stats.mean_score = round(stats.score_sum / stats.completed_count, 2) if stats.completed_count else None
+    stats.median_score = _median_from_histogram(stats.score_histogram, stats.completed_count)
+
+
+def _fill_from_submissions(stats, quiz):
+    stats.submission_count = QuizSubmission.objects.filter(quiz=quiz).count()
+
+    histogram = {}
+    score_sum = 0
+    completed = QuizSubmission.objects.filter(quiz=quiz, end_time__isnull=False)
+    for score in completed.values_list('total_score', flat=True).iterator():
+        histogram[str(score)] = histogram.get(str(score), 0) + 1
+        score_sum += score
+    stats.score_histogram = histogram
+    stats.score_sum = score_sum
+    stats.completed_count = sum(histogram.values())
+    stats.top_scores = _top_scores(quiz)
+    _refresh_derived(stats)
+    stats.save()
+    return stats
+
+
+def rebuild_quiz_stats(quiz):
+    """Recompute a quiz's stats from its submissions. Used to seed or repair the summary."""
+    stats, _ = QuizStats.objects.get_or_create(quiz=quiz)
+    return _fill_from_submissions(stats, quiz)
+
+
+def get_quiz_stats(quiz):
+    """Return the quiz's stats row, building it on first use."""
+    try:
+        return QuizStats.objects.get(quiz=quiz)
+    except QuizStats.DoesNotExist:
+        return rebuild_quiz_stats(quiz)
+
+
+def _locked_stats(quiz):
+    """
+    Lock the stats row for update, or return None after creating and seeding
+    it from the submissions (which already include the caller's change).
+    Only the caller that creates the row seeds it; a concurrent caller waits
+    for that row and then applies its own change to it.
+    """
+    stats, created = QuizStats.objects.select_for_update().get_or_create(quiz=quiz)
+    if created:
+        _fill_from_submissions(stats, quiz)
+        return None
+    return stats
+
+
+def record_submission_started(quiz):
+    """Count a newly started submission."""
+    if not QuizStats.objects.filter(quiz=quiz).update(submission_count=F('submission_count') + 1):
+        rebuild_quiz_stats(quiz)
+
+
+def record_submission_completed(submission):
+    """Fold a newly completed submission into its quiz's stats."""
+    with transaction.atomic():
+        stats = _locked_stats(submission.quiz)
+        if stats is None:
+            return
+        key = str(submission.total_score)
+        stats.score_histogram[key] = stats.score_histogram.get(key, 0) + 1
+        stats.score_sum += submission.total_score
+        stats.completed_count += 1
+        _place_in_leaderboard(stats, submission)
+        _refresh_derived(stats)
+        stats.save()
+
+
+def record_score_change(submission, old_score):
+    """Move a completed submission from old_score to its current total_score (e.g. after essay grading)."""
+    if submission.total_score == old_score:
+        return
+    with transaction.atomic():
+        stats = _locked_stats(submission.quiz)
+        if stats is None:
+            return
+        old_key, new_key = str(old_score), str(submission.total_score)
+        stats.score_histogram[old_key] = stats.score_histogram.get(old_key, 0) - 1
+        if stats.score_histogram[old_key] <= 0:
+            del stats.score_histogram[old_key]
+        stats.score_histogram[new_key] = stats.score_histogram.get(new_key, 0) + 1
+        stats.score_sum += submission.total_score - old_score
+        was_ranked = any(entry['submission_id'] == submission.pk for entry in stats.top_scores)
+        if submission.total_score < old_score and was_ranked and stats.completed_count > LEADERBOARD_SIZE:
+            # Someone outside the list may now outrank this submission
+            stats.top_scores = _top_scores(submission.quiz)
+        else:
+            _place_in_leaderboard(stats, submission)
+        _refresh_derived(stats)
+        stats.save()
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .item_analysis import analyze_question_bank
+from .models import QuestionBank, QuizSubmission, QuizQuestionAttempt, Choice
+from .utils import get_draft, grade_submission
+
+
+@shared_task
+def auto_submit_expired_quizzes(batch_size=200):
+    """
+    Periodic task to grade quiz sessions whose timer ran out without a submit.
+
+    Expired sessions are found through the partial index on expires_at and
+    graded in batches from their autosaved drafts, with attempts and choices
+    loaded once per batch.
+    """
+    grace = timedelta(seconds=getattr(settings, 'QUIZ_SUBMISSION_GRACE_SECONDS', 30))
+    cutoff = timezone.now() - grace
+    graded = 0
+    last_id = 0
+
+    while True:
+        batch = list(
+            QuizSubmission.objects.filter(
+                end_time__isnull=True,
+                expires_at__lte=cutoff,
+                pk__gt=last_id,
+            ).select_related('quiz', 'student').prefetch_related(
+                Prefetch('question_attempts', queryset=QuizQuestionAttempt.objects.select_related('question'))
+            ).order_by('pk')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].pk
+
+        question_ids = {
+            attempt.question_id
+            for submission in batch
+            for attempt in submission.question_attempts.all()
+        }
+        choices = {choice.pk: choice for choice in Choice.objects.filter(question_id__in=question_ids)}
+
+        for submission in batch:
+            score = grade_submission(
+                submission,
+                get_draft(submission),
+                question_attempts=list(submission.question_attempts.all()),
+                choices=choices,
+                auto_submitted=True,
+            )
+            if score is not None:
+                graded += 1
+
+    return f"Auto-submitted {graded} expired quiz submissions."
+
+
+@shared_task
+def run_item_analysis(question_bank_id=None):
+    """
+    Periodic task to fold newly completed submissions into question statistics.
+    Runs for one bank if question_bank_id is given, otherwise for every bank.
+    """
+    banks = QuestionBank.objects.all()
+    if question_bank_id is not None:
+        banks = banks.filter(pk=question_bank_id)
+
+    analyzed = 0
+    for bank in banks.iterator():
+        analyzed += analyze_question_bank(bank)
+    return f"Item analysis included {analyzed} new submissions."
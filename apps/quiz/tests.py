@@ -1,8 +1,22 @@
+from datetime import timedelta
+import io
+import json
+from unittest import mock
+import numpy as np
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from apps.courses.models import Course
-from .models import Quiz, Question, Choice, QuizSubmission, QuestionBank, QuizQuestionAttempt
+from .models import Quiz, Question, Choice, QuizSubmission, QuestionBank, QuizQuestionAttempt, QuestionStatistics, QuizStats
+from .item_analysis import analyze_question_bank
+from .bank_io import import_question_bank, export_question_bank
+from .stats import rebuild_quiz_stats, record_submission_started, record_submission_completed, record_score_change
+from .tasks import auto_submit_expired_quizzes
+from . import utils
+from .utils import get_draft
 
 User = get_user_model()
 
@@ -115,4 +129,345 @@ class QuizAppTests(TestCase):
         # This test requires a URL named 'quiz_essay_submissions', let's assume it exists.
         # If it doesn't, this test will fail and highlight the need for that URL.
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, 'Grade Essay Questions')
\ No newline at end of file
+        self.assertContains(response, 'Grade Essay Questions')
+
+class QuizAutosaveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='autosavestudent', password='password')
+        self.course = Course.objects.create(title='Autosave Course')
+        self.question_bank = QuestionBank.objects.create(course=self.course, title='Autosave Bank')
+        for i in range(3):
+            question = Question.objects.create(question_bank=self.question_bank, text=f'Question {i}')
+            Choice.objects.create(question=question, text='Correct', is_correct=True)
+            Choice.objects.create(question=question, text='Incorrect', is_correct=False)
+        self.quiz = Quiz.objects.create(
+            course=self.course,
+            question_bank=self.question_bank,
+            title='Autosave Quiz',
+            number_of_questions=3,
+            is_published=True,
+        )
+        self.client.login(username='autosavestudent', password='password')
+        self.client.get(reverse('quiz:quiz_start', kwargs={'pk': self.quiz.pk}))
+        self.submission = QuizSubmission.objects.get(student=self.student, quiz=self.quiz)
+
+    def _correct_answers(self):
+        return {
+            f'question_{attempt.question_id}': attempt.question.choices.get(is_correct=True).id
+            for attempt in self.submission.question_attempts.select_related('question')
+        }
+
+    def test_autosave_stores_draft_without_touching_attempts(self):
+        answers = self._correct_answers()
+        field, value = next(iter(answers.items()))
+        response = self.client.post(
+            reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk}),
+            {field: value, 'question_999999': 'ignored'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['answered'], 1)
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.draft_answers, {field: str(value)})
+        self.assertFalse(self.submission.question_attempts.filter(selected_choice__isnull=False).exists())
+
+    def test_final_submit_grades_from_merged_draft(self):
+        answers = self._correct_answers()
+        fields = list(answers)
+        # Autosave all but the last answer, then submit only the last one
+        self.client.post(
+            reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk}),
+            {field: answers[field] for field in fields[:-1]},
+        )
+        self.client.post(
+            reverse('quiz:quiz_take', kwargs={'pk': self.quiz.pk}),
+            {fields[-1]: answers[fields[-1]]},
+        )
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.mcq_score, 3)
+        self.assertIsNotNone(self.submission.end_time)
+        self.assertEqual(self.submission.draft_answers, {})
+
+    def test_autosave_without_shared_cache_writes_every_time(self):
+        fields = list(self._correct_answers().items())
+        url = reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk})
+        self.assertTrue(self.client.post(url, dict(fields[:1])).json()['persisted'])
+        self.assertTrue(self.client.post(url, dict(fields[1:2])).json()['persisted'])
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.draft_answers, {field: str(value) for field, value in fields[:2]})
+
+    def test_autosave_with_shared_cache_is_throttled(self):
+        fields = list(self._correct_answers().items())
+        url = reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk})
+        with mock.patch('apps.quiz.utils.draft_cache_is_shared', return_value=True):
+            self.assertTrue(self.client.post(url, dict(fields[:1])).json()['persisted'])
+            self.assertFalse(self.client.post(url, dict(fields[1:2])).json()['persisted'])
+            self.submission.refresh_from_db()
+            self.assertEqual(self.submission.draft_answers, {fields[0][0]: str(fields[0][1])})
+            self.assertEqual(get_draft(self.submission), {field: str(value) for field, value in fields[:2]})
+
+    def test_interleaved_autosaves_keep_both_answers(self):
+        (first, first_value), (second, second_value) = list(self._correct_answers().items())[:2]
+        other_request = QuizSubmission.objects.get(pk=self.submission.pk)
+        real_get = cache.get
+        raced = []
+
+        def get_then_race(*args, **kwargs):
+            # Another autosave runs while this one is between its cache read and write
+            value = real_get(*args, **kwargs)
+            if not raced:
+                raced.append(True)
+                utils.merge_draft(other_request, {second: second_value})
+            return value
+
+        with mock.patch('apps.quiz.utils.draft_cache_is_shared', return_value=True), \
+                mock.patch.object(utils, 'cache', wraps=cache) as wrapped:
+            wrapped.get.side_effect = get_then_race
+            utils.merge_draft(self.submission, {first: first_value})
+            self.assertTrue(raced)
+            self.assertEqual(get_draft(self.submission), {first: str(first_value), second: str(second_value)})
+
+    def test_autosave_rejected_after_submission(self):
+        self.submission.end_time = timezone.now()
+        self.submission.save()
+        response = self.client.post(reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk}), {})
+        self.assertEqual(response.status_code, 409)
+
+
+class QuizTimerTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username='timerstudent', password='password')
+        self.course = Course.objects.create(title='Timer Course')
+        self.question_bank = QuestionBank.objects.create(course=self.course, title='Timer Bank')
+        for i in range(2):
+            question = Question.objects.create(question_bank=self.question_bank, text=f'Question {i}')
+            Choice.objects.create(question=question, text='Correct', is_correct=True)
+            Choice.objects.create(question=question, text='Incorrect', is_correct=False)
+        self.quiz = Quiz.objects.create(
+            course=self.course,
+            question_bank=self.question_bank,
+            title='Timed Quiz',
+            number_of_questions=2,
+            duration=10,
+            is_published=True,
+        )
+        self.client.login(username='timerstudent', password='password')
+        self.client.get(reverse('quiz:quiz_start', kwargs={'pk': self.quiz.pk}))
+        self.submission = QuizSubmission.objects.get(student=self.student, quiz=self.quiz)
+
+    def _expire(self):
+        QuizSubmission.objects.filter(pk=self.submission.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=5)
+        )
+
+    def test_start_sets_deadline_from_duration(self):
+        self.assertIsNotNone(self.submission.expires_at)
+        self.assertAlmostEqual(
+            (self.submission.expires_at - self.submission.start_time).total_seconds(), 600, delta=1
+        )
+
+    def test_late_submit_ignores_posted_answers(self):
+        attempt = self.submission.question_attempts.first()
+        correct = attempt.question.choices.get(is_correct=True)
+        self._expire()
+        self.client.post(
+            reverse('quiz:quiz_take', kwargs={'pk': self.quiz.pk}),
+            {f'question_{attempt.question_id}': correct.id},
+        )
+        self.submission.refresh_from_db()
+        self.assertTrue(self.submission.auto_submitted)
+        self.assertEqual(self.submission.mcq_score, 0)
+
+    def test_sweep_grades_expired_sessions_from_draft(self):
+        attempt = self.submission.question_attempts.first()
+        correct = attempt.question.choices.get(is_correct=True)
+        self.client.post(
+            reverse('quiz:quiz_autosave', kwargs={'pk': self.quiz.pk}),
+            {f'question_{attempt.question_id}': correct.id},
+        )
+        self._expire()
+
+        auto_submit_expired_quizzes.delay()
+
+        self.submission.refresh_from_db()
+        self.assertIsNotNone(self.submission.end_time)
+        self.assertTrue(self.submission.auto_submitted)
+        self.assertEqual(self.submission.mcq_score, 1)
+        # A second sweep finds nothing left to grade
+        self.assertEqual(auto_submit_expired_quizzes(), "Auto-submitted 0 expired quiz submissions.")
+
+
+class ItemAnalysisTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='analysisinstructor', password='password', is_instructor=True)
+        self.course = Course.objects.create(title='Analysis Course')
+        self.course.instructors.add(self.instructor)
+        self.question_bank = QuestionBank.objects.create(course=self.course, title='Analysis Bank')
+        self.quiz = Quiz.objects.create(
+            course=self.course, question_bank=self.question_bank, title='Analysis Quiz', number_of_questions=2
+        )
+        self.questions = []
+        for i in range(2):
+            question = Question.objects.create(question_bank=self.question_bank, text=f'Question {i}')
+            question.correct = Choice.objects.create(question=question, text='Correct', is_correct=True)
+            question.wrong = Choice.objects.create(question=question, text='Incorrect', is_correct=False)
+            self.questions.append(question)
+
+    def _submit(self, username, answers, end_time=None):
+        student = User.objects.create_user(username=username, password='password')
+        submission = QuizSubmission.objects.create(
+            student=student, quiz=self.quiz, total_questions=2, end_time=end_time or timezone.now() - timedelta(hours=1)
+        )
+        for question, is_correct in zip(self.questions, answers):
+            QuizQuestionAttempt.objects.create(
+                submission=submission,
+                question=question,
+                selected_choice=question.correct if is_correct else question.wrong,
+                is_correct=is_correct,
+            )
+
+    def test_difficulty_discrimination_and_distractors(self):
+        self._submit('a', [True, True])
+        self._submit('b', [True, False])
+        self._submit('c', [False, False])
+        self._submit('d', [False, False])
+
+        self.assertEqual(analyze_question_bank(self.question_bank), 4)
+
+        stats = QuestionStatistics.objects.get(question=self.questions[0])
+        self.assertEqual(stats.p_value, 0.5)
+        expected = np.corrcoef([1, 1, 0, 0], [1, 0.5, 0, 0])[0, 1]
+        self.assertAlmostEqual(stats.discrimination, expected, places=4)
+        self.assertEqual(stats.choice_counts, {str(self.questions[0].correct.id): 2, str(self.questions[0].wrong.id): 2})
+
+        # New submissions are folded into the stored sums on the next run
+        self._submit('e', [True, True], end_time=timezone.now())
+        first_run_at = stats.updated_at
+        self.assertEqual(analyze_question_bank(self.question_bank, now=timezone.now() + timedelta(minutes=5)), 1)
+        stats.refresh_from_db()
+        self.assertGreater(stats.updated_at, first_run_at)
+        self.assertEqual(stats.attempts_count, 5)
+        self.assertEqual(stats.p_value, 0.6)
+        expected = np.corrcoef([1, 1, 0, 0, 1], [1, 0.5, 0, 0, 1])[0, 1]
+        self.assertAlmostEqual(stats.discrimination, expected, places=4)
+
+    def test_analysis_json_for_instructor(self):
+        self._submit('a', [True, False])
+        analyze_question_bank(self.question_bank)
+        self.client.login(username='analysisinstructor', password='password')
+        response = self.client.get(reverse('quiz:question_bank_analysis', kwargs={'pk': self.question_bank.pk}))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['submissions_analyzed'], 1)
+        self.assertEqual(len(data['questions']), 2)
+
+
+class QuestionBankImportExportTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Import Course')
+        self.question_bank = QuestionBank.objects.create(course=self.course, title='Import Bank')
+
+    def test_jsonl_import_and_round_trip(self):
+        lines = [
+            json.dumps({'text': 'Pick the verb', 'choices': [
+                {'text': 'run', 'is_correct': True}, {'text': 'table', 'is_correct': False},
+            ]}),
+            '',
+            json.dumps({'text': 'Describe your job', 'question_type': 'essay'}),
+        ]
+        self.assertEqual(import_question_bank(self.question_bank, lines, batch_size=1), 2)
+        self.assertEqual(Choice.objects.filter(question__question_bank=self.question_bank).count(), 2)
+
+        other_bank = QuestionBank.objects.create(course=self.course, title='Copy')
+        exported = list(export_question_bank(self.question_bank, fmt='csv'))
+        self.assertEqual(import_question_bank(other_bank, io.StringIO(''.join(exported)), fmt='csv'), 2)
+        self.assertTrue(
+            Choice.objects.filter(question__question_bank=other_bank, text='run', is_correct=True).exists()
+        )
+
+    def test_invalid_line_rolls_back_import(self):
+        lines = [
+            json.dumps({'text': 'Valid', 'choices': [{'text': 'a', 'is_correct': True}, {'text': 'b'}]}),
+            json.dumps({'text': 'No correct answer', 'choices': [{'text': 'a'}, {'text': 'b'}]}),
+        ]
+        with self.assertRaisesMessage(ValidationError, 'Line 2'):
+            import_question_bank(self.question_bank, lines, batch_size=1)
+        self.assertFalse(self.question_bank.questions.exists())
+
+    def test_non_string_question_type_is_rejected(self):
+        for question_type in (['essay'], {'type': 'essay'}, 3):
+            line = json.dumps({'text': 'Odd type', 'question_type': question_type})
+            with self.assertRaisesMessage(ValidationError, 'Line 1: unknown question type'):
+                import_question_bank(self.question_bank, [line])
+        self.assertFalse(self.question_bank.questions.exists())
+
+
+class QuizStatsTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Stats Course')
+        self.question_bank = QuestionBank.objects.create(course=self.course, title='Stats Bank')
+        self.quiz = Quiz.objects.create(
+            course=self.course, question_bank=self.question_bank, title='Stats Quiz',
+            number_of_questions=3, is_published=True,
+        )
+
+    def _complete(self, username, score):
+        student = User.objects.create_user(username=username, password='password')
+        submission = QuizSubmission.objects.create(student=student, quiz=self.quiz, total_questions=3)
+        record_submission_started(self.quiz)
+        submission.total_score = score
+        submission.end_time = timezone.now()
+        submission.save()
+        record_submission_completed(submission)
+        return submission
+
+    def test_incremental_stats_match_rebuild(self):
+        self._complete('s1', 1)
+        self._complete('s2', 3)
+        low = self._complete('s3', 2)
+        low.total_score = 5
+        low.save()
+        record_score_change(low, 2)
+
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual(stats.submission_count, 3)
+        self.assertEqual(stats.completed_count, 3)
+        self.assertEqual(stats.mean_score, 3.0)
+        self.assertEqual(stats.median_score, 3.0)
+        self.assertEqual([entry['username'] for entry in stats.top_scores], ['s3', 's2', 's1'])
+
+        rebuilt = rebuild_quiz_stats(self.quiz)
+        self.assertEqual(rebuilt.score_histogram, stats.score_histogram)
+        self.assertEqual(rebuilt.top_scores, stats.top_scores)
+
+    def test_first_completion_seeds_stats_once(self):
+        submission = self._complete('first', 2)
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.completed_count, stats.score_sum, stats.score_histogram), (1, 2, {'2': 1}))
+        self.assertEqual([entry['submission_id'] for entry in stats.top_scores], [submission.pk])
+
+    def test_regrading_essay_applies_only_the_change(self):
+        instructor = User.objects.create_user(username='grader', password='password', is_instructor=True)
+        self.course.instructors.add(instructor)
+        essay = Question.objects.create(question_bank=self.question_bank, text='Essay', question_type='essay')
+        submission = self._complete('writer', 1)
+        attempt = QuizQuestionAttempt.objects.create(submission=submission, question=essay, essay_answer='Text')
+
+        self.client.login(username='grader', password='password')
+        url = reverse('quiz:quiz_essay_submissions', kwargs={'pk': self.quiz.pk})
+        for points in (4, 3):
+            self.client.post(url, {'attempt_id': attempt.pk, f'attempt_{attempt.pk}-points_earned': points})
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.total_score, 4)
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.score_sum, stats.score_histogram), (4, {'4': 1}))
+
+    def test_leaderboard_page_reads_stats(self):
+        self._complete('leader', 3)
+        self.client.login(username='leader', password='password')
+        response = self.client.get(reverse('quiz:quiz_leaderboard', kwargs={'pk': self.quiz.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'leader')
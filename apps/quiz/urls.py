@@ -6,6 +6,10 @@ app_name = 'quiz'
 urlpatterns = [
     path('<int:pk>/', views.QuizDetailView.as_view(), name='quiz_detail'),
     path('<int:pk>/take/', views.QuizTakeView.as_view(), name='quiz_take'),
+    path('<int:pk>/leaderboard/', views.QuizLeaderboardView.as_view(), name='quiz_leaderboard'),
+    path('<int:pk>/autosave/', views.QuizAutosaveView.as_view(), name='quiz_autosave'),
     path('<int:pk>/start/', views.QuizStartView.as_view(), name='quiz_start'),
     path('<int:pk>/essays/', views.QuizEssaySubmissionsView.as_view(), name='quiz_essay_submissions'),
+    path('bank/<int:pk>/export/', views.QuestionBankExportView.as_view(), name='question_bank_export'),
+    path('bank/<int:pk>/analysis/', views.QuestionBankAnalysisView.as_view(), name='question_bank_analysis'),
 ]
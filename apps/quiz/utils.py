@@ -0,0 +1,200 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics.utils import log_student_activity
+from apps.gamification.events import enqueue_points
+from .models import QuizSubmission, QuizQuestionAttempt, Choice
+from .stats import record_submission_completed
+
+DRAFT_CACHE_TIMEOUT = 60 * 60 * 24  # Keep drafts around for a day
+MAX_ANSWER_LENGTH = 10000
+
+
+def _draft_cache_key(submission_id, name):
+    return f'quiz:draft:{submission_id}:{name}'
+
+
+def draft_cache_is_shared():
+    """
+    Whether every process sees the same cached drafts. A per-process
+    (LocMemCache) or dummy cache is not shared, so autosaves served by one
+    worker would be invisible to a submit served by another.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _draft_fields(submission, shared):
+    """Return the submission's answer field names, cached alongside the draft."""
+    key = _draft_cache_key(submission.pk, 'fields')
+    fields = cache.get(key) if shared else None
+    if fields is None:
+        fields = [
+            f'question_{question_id}'
+            for question_id in submission.question_attempts.values_list('question_id', flat=True)
+        ]
+        if shared:
+            cache.set(key, fields, DRAFT_CACHE_TIMEOUT)
+    return fields
+
+
+def _cached_draft(submission, fields):
+    """The draft column overlaid with the answers cached since it was last written."""
+    answers = dict(submission.draft_answers or {})
+    cached = cache.get_many([_draft_cache_key(submission.pk, field_name) for field_name in fields])
+    for field_name in fields:
+        key = _draft_cache_key(submission.pk, field_name)
+        if key in cached:
+            answers[field_name] = cached[key]
+    return answers
+
+
+def get_draft(submission):
+    """Return the merged draft answers for a submission as {field_name: value}."""
+    if draft_cache_is_shared():
+        return _cached_draft(submission, _draft_fields(submission, shared=True))
+    return dict(submission.draft_answers or {})
+
+
+def merge_draft(submission, answers):
+    """
+    Merge partial answers into the submission's draft.
+
+    Each answer is cached under its own key, so concurrent autosaves of
+    different questions never overwrite each other. The merged draft is
+    written to the draft_answers column at most once every
+    QUIZ_AUTOSAVE_FLUSH_INTERVAL seconds (whoever adds the flush marker
+    writes it), so rapid autosaves cost a cache round trip instead of a
+    database write. Without a shared cache every autosave is written to the
+    column, which is then the only copy of the draft.
+    Returns a (merged_answers, persisted) tuple.
+    """
+    shared = draft_cache_is_shared()
+    fields = _draft_fields(submission, shared)
+    allowed = set(fields)
+    updates = {
+        field_name: str(value)[:MAX_ANSWER_LENGTH]
+        for field_name, value in answers.items() if field_name in allowed
+    }
+
+    if shared:
+        cache.set_many(
+            {_draft_cache_key(submission.pk, field_name): value for field_name, value in updates.items()},
+            DRAFT_CACHE_TIMEOUT,
+        )
+        merged = _cached_draft(submission, fields)
+        interval = getattr(settings, 'QUIZ_AUTOSAVE_FLUSH_INTERVAL', 30)
+        persisted = interval <= 0 or cache.add(_draft_cache_key(submission.pk, 'flushed'), True, interval)
+    else:
+        merged = {**(submission.draft_answers or {}), **updates}
+        persisted = True
+
+    if persisted:
+        QuizSubmission.objects.filter(pk=submission.pk, end_time__isnull=True).update(
+            draft_answers=merged,
+            draft_saved_at=timezone.now(),
+        )
+    return merged, persisted
+
+
+def clear_draft(submission):
+    """Drop the cached draft once the submission has been graded."""
+    names = ['fields', 'flushed', *_draft_fields(submission, draft_cache_is_shared())]
+    cache.delete_many([_draft_cache_key(submission.pk, name) for name in names])
+    submission.draft_answers = {}
+
+
+def compute_expiry(quiz, start_time):
+    """Return the submission deadline for a quiz started at start_time, or None if untimed."""
+    if not quiz.duration:
+        return None
+    return start_time + timedelta(minutes=quiz.duration)
+
+
+def is_past_deadline(submission, now=None):
+    """Check the deadline, allowing QUIZ_SUBMISSION_GRACE_SECONDS for network latency."""
+    if submission.expires_at is None:
+        return False
+    now = now or timezone.now()
+    grace = timedelta(seconds=getattr(settings, 'QUIZ_SUBMISSION_GRACE_SECONDS', 30))
+    return now > submission.expires_at + grace
+
+
+def grade_submission(submission, answers, question_attempts=None, choices=None, auto_submitted=False):
+    """
+    Grade a submission from a {"question_<id>": value} answer mapping.
+
+    The submission is claimed with a conditional UPDATE on end_time, so a
+    manual submit racing the expiry sweep is only graded once. Callers grading
+    many submissions can pass prefetched question_attempts and a {choice_id:
+    Choice} map to avoid per-submission queries.
+    Returns the MCQ score, or None if the submission was already graded.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = QuizSubmission.objects.filter(pk=submission.pk, end_time__isnull=True).update(
+            end_time=now,
+            auto_submitted=auto_submitted,
+        )
+        if not claimed:
+            return None
+
+        if question_attempts is None:
+            question_attempts = list(submission.question_attempts.select_related('question'))
+        if choices is None:
+            choices = {
+                choice.pk: choice
+                for choice in Choice.objects.filter(question_id__in=[a.question_id for a in question_attempts])
+            }
+
+        score = 0
+        for attempt in question_attempts:
+            value = answers.get(f'question_{attempt.question_id}')
+            if attempt.question.question_type == 'multiple_choice':
+                try:
+                    choice = choices.get(int(value))
+                except (TypeError, ValueError):
+                    choice = None
+                if choice is not None and choice.question_id != attempt.question_id:
+                    choice = None
+                attempt.selected_choice = choice
+                attempt.is_correct = bool(choice and choice.is_correct)
+                if attempt.is_correct:
+                    score += 1
+            elif value:
+                attempt.essay_answer = value
+        QuizQuestionAttempt.objects.bulk_update(
+            question_attempts, ['selected_choice', 'essay_answer', 'is_correct']
+        )
+
+        submission.mcq_score = score
+        submission.total_score += score
+        submission.end_time = now
+        submission.auto_submitted = auto_submitted
+        clear_draft(submission)
+        submission.save(update_fields=['mcq_score', 'total_score', 'end_time', 'auto_submitted', 'draft_answers'])
+        record_submission_completed(submission)
+        log_student_activity(
+            submission.student, 'quiz_attempt', course=submission.quiz.course,
+            quiz_id=submission.quiz_id, submission_id=submission.pk, score=score,
+        )
+
+        _award_quiz_points(submission, score)
+    return score
+
+
+def _award_quiz_points(submission, score):
+    points_earned = score * submission.quiz.points_per_question
+    if points_earned > 0:
+        enqueue_points(
+            submission.student,
+            points_earned,
+            idempotency_key=f'quiz:{submission.pk}',
+            source='quiz',
+            course_id=submission.quiz.course_id,
+        )
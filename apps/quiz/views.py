@@ -2,15 +2,18 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse, Http404
 from django.utils import timezone
 import random
 from django.db import transaction
 
 from apps.courses.models import Lesson
-from .models import Quiz, QuizSubmission, Question, QuizQuestionAttempt
+from .models import Quiz, QuizSubmission, Question, QuizQuestionAttempt, QuestionBank
+from .item_analysis import item_analysis_report
+from .bank_io import FORMATS, export_question_bank
+from .stats import get_quiz_stats, record_submission_started, record_score_change
 from .forms import QuizTakeForm, EssayGradeForm
-from apps.gamification.models import UserPoints
-from apps.gamification.utils import check_badges
+from .utils import get_draft, merge_draft, compute_expiry, is_past_deadline, grade_submission
 
 class QuizDetailView(LoginRequiredMixin, DetailView):
     model = Quiz
@@ -25,7 +28,7 @@ class QuizDetailView(LoginRequiredMixin, DetailView):
         
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        quiz = self.get_object()
+        quiz = self.object
         
         # Get the user's submission for this quiz
         submission = QuizSubmission.objects.filter(
@@ -36,9 +39,11 @@ class QuizDetailView(LoginRequiredMixin, DetailView):
         ).first()
 
         context['submission'] = submission
+        context['stats'] = get_quiz_stats(quiz)
         if submission:
             question_attempts = submission.question_attempts.select_related('question').all()
-            context['form'] = QuizTakeForm(question_attempts=question_attempts)
+            initial = get_draft(submission) if not submission.end_time else {}
+            context['form'] = QuizTakeForm(question_attempts=question_attempts, initial=initial)
         return context
 
 class QuizStartView(LoginRequiredMixin, View):
@@ -49,13 +54,16 @@ class QuizStartView(LoginRequiredMixin, View):
             
         quiz = get_object_or_404(qs, pk=pk)
         
+        now = timezone.now()
         submission, created = QuizSubmission.objects.get_or_create(
             student=request.user, 
             quiz=quiz,
-            defaults={'start_time': timezone.now()}
+            defaults={'start_time': now, 'expires_at': compute_expiry(quiz, now), 'total_questions': 0}
         )
 
-        if not created and submission.end_time:
+        if created:
+            record_submission_started(quiz)
+        elif submission.end_time:
             messages.info(request, "You have already completed this quiz.")
             return redirect('quiz:quiz_detail', pk=pk)
 
@@ -83,29 +91,72 @@ class QuizTakeView(LoginRequiredMixin, View):
              messages.error(request, "You have already completed this quiz.")
              return redirect('quiz:quiz_detail', pk=pk)
 
+        # Grade from the autosaved draft, with the final POST taking precedence
+        answers = get_draft(submission)
+        if is_past_deadline(submission):
+            # Answers posted after the deadline are ignored; grade what was saved in time
+            score = grade_submission(submission, answers, auto_submitted=True)
+            if score is not None:
+                messages.warning(request, f"Time is up! Your saved answers were submitted. You scored {score}/{submission.total_questions} on multiple choice questions.")
+            return redirect('quiz:quiz_detail', pk=pk)
+        answers.update(request.POST.dict())
+
         question_attempts = submission.question_attempts.select_related('question').all()
-        form = QuizTakeForm(request.POST, question_attempts=question_attempts)
+        form = QuizTakeForm(answers, question_attempts=question_attempts)
         if form.is_valid():
             score = form.save(submission=submission, question_attempts=question_attempts)
-            submission.mcq_score = score
-            submission.total_score += score # Add MCQ score to total
-            submission.end_time = timezone.now() # Mark as completed
-            submission.save()
-
-            # Award Points
-            points_earned = score * quiz.points_per_question
-            if points_earned > 0:
-                user_points, _ = UserPoints.objects.get_or_create(user=request.user)
-                user_points.total_points += points_earned
-                user_points.save()
-                check_badges(request.user)
-            
+            if score is None:
+                messages.error(request, "You have already completed this quiz.")
+                return redirect('quiz:quiz_detail', pk=pk)
             messages.success(request, f"Quiz submitted! You scored {score}/{submission.total_questions} on multiple choice questions. Essay questions will be graded separately.")
+        elif submission.is_expired:
+            # Timer ran out with questions left unanswered; grade what we have
+            score = grade_submission(submission, answers, auto_submitted=True)
+            if score is not None:
+                messages.warning(request, f"Time is up! You scored {score}/{submission.total_questions} on multiple choice questions.")
         else:
             messages.error(request, "There was an error with your submission. Please check your answers.")
 
         return redirect('quiz:quiz_detail', pk=pk)
 
+class QuizLeaderboardView(LoginRequiredMixin, DetailView):
+    """Per-quiz ranking, read from the materialized QuizStats row."""
+    model = Quiz
+    template_name = 'quiz/quiz_leaderboard.html'
+
+    def get_queryset(self):
+        qs = Quiz.objects.select_related('course')
+        if not getattr(self.request.user, 'is_instructor', False):
+            qs = qs.filter(is_published=True)
+        return qs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['stats'] = get_quiz_stats(self.object)
+        return context
+
+class QuizAutosaveView(LoginRequiredMixin, View):
+    """Merge partial answers into the submission's draft without touching attempts."""
+
+    def post(self, request, pk):
+        submission = QuizSubmission.objects.filter(student=request.user, quiz_id=pk).only(
+            'id', 'end_time', 'expires_at', 'draft_answers', 'draft_saved_at'
+        ).first()
+        if submission is None:
+            return JsonResponse({'status': 'error', 'message': 'Quiz not started'}, status=404)
+        if submission.end_time:
+            return JsonResponse({'status': 'error', 'message': 'Quiz already submitted'}, status=409)
+        if is_past_deadline(submission):
+            return JsonResponse({'status': 'error', 'message': 'Time is up'}, status=409)
+
+        answers = {key: value for key, value in request.POST.items() if key.startswith('question_')}
+        draft, persisted = merge_draft(submission, answers)
+        return JsonResponse({
+            'status': 'success',
+            'answered': len(draft),
+            'persisted': persisted,
+        })
+
 class QuizEssaySubmissionsView(LoginRequiredMixin, View):
     def get(self, request, pk):
         quiz = get_object_or_404(Quiz.objects.select_related('course'), pk=pk)
@@ -138,16 +189,55 @@ class QuizEssaySubmissionsView(LoginRequiredMixin, View):
             return redirect('quiz:quiz_essay_submissions', pk=pk)
 
         attempt = get_object_or_404(QuizQuestionAttempt, pk=attempt_id)
+        # Validating the form updates the instance, so keep the previous grade first
+        previous_points = attempt.points_earned or 0
         form = EssayGradeForm(request.POST, instance=attempt, prefix=f'attempt_{attempt.id}')
 
         if form.is_valid():
             form.save()
-            # Update the total score of the submission
+            # Update the total score of the submission by the change in this essay's grade
             submission = attempt.submission
-            submission.total_score += attempt.points_earned
+            old_score = submission.total_score
+            submission.total_score += (attempt.points_earned or 0) - previous_points
             submission.save()
+            if submission.end_time:
+                record_score_change(submission, old_score)
             messages.success(request, f"Score updated for {attempt.submission.student.username}'s essay.")
         else:
             messages.error(request, "Invalid score submitted.")
 
         return redirect('quiz:quiz_essay_submissions', pk=pk)
+
+class QuestionBankAnalysisView(LoginRequiredMixin, View):
+    """Item analysis statistics for a question bank as JSON, for the course's instructors."""
+
+    def get(self, request, pk):
+        bank = get_object_or_404(QuestionBank.objects.select_related('course', 'analysis'), pk=pk)
+        if not request.user.is_instructor or not bank.course.instructors.filter(pk=request.user.pk).exists():
+            return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+        analysis = getattr(bank, 'analysis', None)
+        return JsonResponse({
+            'question_bank': bank.id,
+            'title': bank.title,
+            'analyzed_through': analysis.analyzed_through.isoformat() if analysis and analysis.analyzed_through else None,
+            'submissions_analyzed': analysis.submissions_analyzed if analysis else 0,
+            'questions': item_analysis_report(bank),
+        })
+
+class QuestionBankExportView(LoginRequiredMixin, View):
+    """Stream a question bank as JSONL or CSV to the course's instructors."""
+
+    def get(self, request, pk):
+        bank = get_object_or_404(QuestionBank.objects.select_related('course'), pk=pk)
+        if not request.user.is_instructor or not bank.course.instructors.filter(pk=request.user.pk).exists():
+            return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+        fmt = request.GET.get('format', 'jsonl')
+        if fmt not in FORMATS:
+            raise Http404("Unsupported export format")
+
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_question_bank(bank, fmt=fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="question_bank_{bank.pk}.{fmt}"'
+        return response
@@ -100,11 +100,39 @@ TEMPLATES = [
 #WSGI_APPLICATION = 'english_professional.wsgi.application'
 ASGI_APPLICATION = 'english_professional.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# Channel layer, chosen by CHANNEL_LAYER_URL:
+#   redis://host:6379/1      Redis (production, multiple Daphne processes)
+#   sqlite:///path/to/file   SQLite file shared by processes on one machine
+#   unset                    in-memory, single process only
+CHANNEL_LAYER_URL = os.environ.get('CHANNEL_LAYER_URL', '')
+if CHANNEL_LAYER_URL.startswith(('redis://', 'rediss://')):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_LAYER_URL],
+            },
+        }
     }
-}
+elif CHANNEL_LAYER_URL.startswith('sqlite://'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'apps.chat.layers.SQLiteChannelLayer',
+            'CONFIG': {
+                'path': CHANNEL_LAYER_URL[len('sqlite://'):],
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
+    }
+
+# Chat read state is one cursor per (user, thread). Set this to also write a
+# MessageReadReceipt for every message read, where exact receipts are needed.
+CHAT_PER_MESSAGE_READ_RECEIPTS = os.environ.get('CHAT_PER_MESSAGE_READ_RECEIPTS', 'False').lower() in ('true', '1', 'yes')
 
 
 # Database
@@ -199,6 +227,41 @@ ACCOUNT_SIGNUP_FIELDS = [
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@englishprofessional.com')
 
+# Cache Configuration
+# Uses Redis when CACHE_URL is set, otherwise a per-process local memory cache.
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Chat presence and typing keys live in this cache; without one (or with a
+# dummy cache) they fall back to a per-process store.
+CHAT_PRESENCE_CACHE = os.environ.get('CHAT_PRESENCE_CACHE', 'default')
+
+# Leaderboards are Redis sorted sets when LEADERBOARD_REDIS_URL is set,
+# otherwise an in-process index (fine for development and tests only) that
+# each process re-seeds from the database after LEADERBOARD_LOCAL_TTL seconds.
+LEADERBOARD_REDIS_URL = os.environ.get('LEADERBOARD_REDIS_URL')
+LEADERBOARD_LOCAL_TTL = int(os.environ.get('LEADERBOARD_LOCAL_TTL', 30))
+
+# Quiz autosave: drafts are merged in the cache and written to the database
+# at most once per interval (seconds) for each submission. This needs a shared
+# cache (CACHE_URL); with the per-process default every autosave is written.
+QUIZ_AUTOSAVE_FLUSH_INTERVAL = int(os.environ.get('QUIZ_AUTOSAVE_FLUSH_INTERVAL', 30))
+
+# Late quiz submits are accepted for this many seconds after the timer expires.
+QUIZ_SUBMISSION_GRACE_SECONDS = int(os.environ.get('QUIZ_SUBMISSION_GRACE_SECONDS', 30))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://127.0.0.1:6379/0")
@@ -207,6 +270,52 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Run tasks locally and synchronously (no broker needed) for tests and when DEBUG
+# is on; set CELERY_TASK_ALWAYS_EAGER=false to use a broker in development.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', str(TESTING or DEBUG)).lower() in ('true', '1', 'yes')
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Chat translation backend (dotted path). The local backend is deterministic
+# and offline; translations are memoized in an in-process LRU of this size
+# in front of the TranslationCache table.
+CHAT_TRANSLATION_BACKEND = os.environ.get(
+    'CHAT_TRANSLATION_BACKEND',
+    'apps.chat.translation.LocalTranslationBackend' if TESTING else 'apps.chat.translation.GoogleTranslationBackend',
+)
+CHAT_TRANSLATION_LRU_SIZE = int(os.environ.get('CHAT_TRANSLATION_LRU_SIZE', 4096))
+
+CELERY_BEAT_SCHEDULE = {
+    'auto-submit-expired-quizzes': {
+        'task': 'apps.quiz.tasks.auto_submit_expired_quizzes',
+        'schedule': 60.0,
+    },
+    'run-item-analysis': {
+        'task': 'apps.quiz.tasks.run_item_analysis',
+        'schedule': 60.0 * 60,
+    },
+    'process-gamification-events': {
+        'task': 'apps.gamification.tasks.process_gamification_events',
+        'schedule': 10.0,
+    },
+    'evaluate-daily-challenges': {
+        'task': 'apps.gamification.tasks.evaluate_daily_challenges',
+        'schedule': 60.0 * 15,
+    },
+    'reconcile-points-ledger': {
+        'task': 'apps.gamification.tasks.reconcile_points_ledger',
+        'schedule': 60.0 * 60 * 24,
+    },
+    'translate-chat-messages': {
+        'task': 'apps.chat.tasks.translate_chat_messages',
+        'schedule': 10.0,
+    },
+    'reconcile-chat-unread-counters': {
+        'task': 'apps.chat.tasks.reconcile_chat_unread_counters',
+        'schedule': 60.0 * 60,
+    },
+}
+
 # Production Security Settings
 # These settings are activated when DEBUG is False.
 if not DEBUG: